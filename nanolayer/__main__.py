@@ -1,9 +1,14 @@
+import atexit
 import os
 
 import typer
 
+from nanolayer.cli.cache import app as cache_app
+from nanolayer.cli.inspect import app as inspect_app
 from nanolayer.cli.install import app as install_app
 from nanolayer.utils.analytics import setup_analytics
+from nanolayer.utils.command_trace import CommandTrace
+from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.settings import NanolayerSettings
 from nanolayer.utils.version import (
     resolve_own_package_version,
@@ -17,6 +22,8 @@ if "__file__" not in globals():
 
 app = typer.Typer(pretty_exceptions_show_locals=False, pretty_exceptions_short=False)
 app.add_typer(install_app, name="install")
+app.add_typer(cache_app, name="cache")
+app.add_typer(inspect_app, name="inspect")
 
 
 def version_callback(value: bool) -> None:
@@ -40,9 +47,21 @@ def version(
         None, "--release-version", callback=release_version_callback, is_eager=True
     ),
 ):
-    if NanolayerSettings().enable_analytics:
+    settings = NanolayerSettings()
+    if settings.enable_analytics:
         setup_analytics()
 
+    if settings.trace:
+        CommandTrace.reset(enabled=True, trace_file=settings.trace_file or None)
+        atexit.register(CommandTrace.log_summary)
+
+    if settings.invoker_mode:
+        Invoker.set_backend(
+            Invoker.mode_backend(
+                settings.invoker_mode, fixture_file=settings.invoker_fixture
+            )
+        )
+
     return
 
 
@@ -0,0 +1,52 @@
+import logging
+from typing import Optional
+
+import typer
+
+from nanolayer.utils.blob_cache import BlobCache
+
+logger = logging.getLogger(__name__)
+
+app = typer.Typer(pretty_exceptions_show_locals=False, pretty_exceptions_short=False)
+
+
+def _human_readable_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def _get_blob_cache() -> BlobCache:
+    blob_cache = BlobCache.from_settings()
+    if blob_cache is None:
+        raise typer.BadParameter(
+            "the nanolayer cache is disabled (see NANOLAYER_CACHE_DIR and NANOLAYER_ENABLE_CACHE)"
+        )
+    return blob_cache
+
+
+@app.command("stats")
+def cache_stats() -> None:
+    stats = _get_blob_cache().stats()
+    typer.echo(f"location: {stats.location}")
+    typer.echo(f"entries: {stats.entries}")
+    typer.echo(
+        f"size: {_human_readable_size(stats.size)} (max {_human_readable_size(stats.max_size)})"
+    )
+
+
+@app.command("prune")
+def cache_prune(
+    max_size: Optional[int] = typer.Option(
+        None, help="size in bytes to prune the cache down to (default: cache budget)"
+    ),
+    all: bool = typer.Option(False, "--all", help="remove every cache entry"),
+) -> None:
+    removed_entries, removed_bytes = _get_blob_cache().prune(
+        max_size=0 if all else max_size
+    )
+    typer.echo(
+        f"removed {removed_entries} entries ({_human_readable_size(removed_bytes)})"
+    )
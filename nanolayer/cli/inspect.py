@@ -0,0 +1,15 @@
+import logging
+
+import typer
+
+from nanolayer.installers.devcontainer_feature.oci_feature import OCIFeature
+
+logger = logging.getLogger(__name__)
+
+app = typer.Typer(pretty_exceptions_show_locals=False, pretty_exceptions_short=False)
+
+
+@app.command("devcontainer-feature")
+def inspect_devcontainer_feature(feature: str) -> None:
+    feature_obj = OCIFeature.inspect(oci_feature_ref=feature)
+    typer.echo(feature_obj.json(indent=4, exclude_none=True))
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 
 import typer
 
@@ -7,6 +7,9 @@ from nanolayer.installers.apk.apk_installer import ApkInstaller
 from nanolayer.installers.apt.apt_installer import AptInstaller
 from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
 from nanolayer.installers.aptitude.aptitude_installer import AptitudeInstaller
+from nanolayer.installers.devcontainer_feature.devcontainer_json import (
+    DevcontainerJson,
+)
 from nanolayer.installers.devcontainer_feature.oci_feature_installer import (
     OCIFeatureInstaller,
 )
@@ -28,6 +31,37 @@ def _validate_args(value: Optional[List[str]]) -> Optional[List[str]]:
     return value
 
 
+def _strip_if_wrapped_around(value: str, char: str) -> str:
+    if len(char) > 1:
+        raise ValueError("For clarity sake, will only strip one character at a time")
+
+    if len(value) >= 2 and value[0] == char and value[-1] == char:
+        return value.strip(char)
+    return value
+
+
+def _key_val_arg_to_dict(args: Optional[List[str]]) -> Dict[str, str]:
+    if args is None:
+        return {}
+
+    args_dict = {}
+    for single_arg in args:
+        single_arg = _strip_if_wrapped_around(single_arg, '"')
+        arg_name = single_arg.split("=")[0]
+        arg_value = single_arg[len(arg_name) + 1 :]
+        arg_value = _strip_if_wrapped_around(arg_value, '"')
+        args_dict[arg_name] = arg_value
+    return args_dict
+
+
+def _report_file(report: Optional[str], report_file: str) -> Optional[str]:
+    if report is None:
+        return None
+    if report != "json":
+        raise typer.BadParameter("only json reports are supported")
+    return report_file
+
+
 @app.command("devcontainer-feature")
 def install_devcontainer_feature(
     feature: str,
@@ -36,30 +70,20 @@ def install_devcontainer_feature(
     env: Optional[List[str]] = typer.Option(None, callback=_validate_args),
     verbose: bool = False,
     invoke_entrypoint: bool = False,
+    reinstall: bool = typer.Option(
+        False, help="install even if already installed with the same options"
+    ),
+    env_snapshot: bool = typer.Option(
+        False,
+        help="run install scripts in a non-interactive bash with a captured login environment",
+    ),
+    report: Optional[str] = typer.Option(
+        None, help="write a per-phase timing report, in the given format (json)"
+    ),
+    report_file: str = typer.Option(
+        "nanolayer-report.json", help="where the report is written"
+    ),
 ) -> None:
-    def _key_val_arg_to_dict(args: Optional[List[str]]) -> Dict[str, str]:
-        if args is None:
-            return {}
-
-        args_dict = {}
-        for single_arg in args:
-            single_arg = _strip_if_wrapped_around(single_arg, '"')
-            arg_name = single_arg.split("=")[0]
-            arg_value = single_arg[len(arg_name) + 1 :]
-            arg_value = _strip_if_wrapped_around(arg_value, '"')
-            args_dict[arg_name] = arg_value
-        return args_dict
-
-    def _strip_if_wrapped_around(value: str, char: str) -> str:
-        if len(char) > 1:
-            raise ValueError(
-                "For clarity sake, will only strip one character at a time"
-            )
-
-        if len(value) >= 2 and value[0] == char and value[-1] == char:
-            return value.strip(char)
-        return value
-
     options_dict = _key_val_arg_to_dict(option)
     envs_dict = _key_val_arg_to_dict(env)
 
@@ -70,6 +94,103 @@ def install_devcontainer_feature(
         remote_user=remote_user,
         verbose=verbose,
         invoke_entrypoint=invoke_entrypoint,
+        reinstall=reinstall,
+        env_snapshot=env_snapshot,
+        report_file=_report_file(report, report_file),
+    )
+
+
+@app.command("devcontainer-features")
+def install_devcontainer_features(
+    features: List[str],
+    option: Optional[List[str]] = typer.Option(
+        None,
+        callback=_validate_args,
+        help="formatted as 'feature.key=value', where feature is the last part of the feature ref (eg. 'node' for ghcr.io/devcontainers/features/node:1)",
+    ),
+    remote_user: Optional[str] = typer.Option(None, callback=_validate_args),
+    env: Optional[List[str]] = typer.Option(None, callback=_validate_args),
+    verbose: bool = False,
+    invoke_entrypoint: bool = False,
+    reinstall: bool = typer.Option(
+        False, help="install even if already installed with the same options"
+    ),
+    env_snapshot: bool = typer.Option(
+        False,
+        help="run install scripts in a non-interactive bash with a captured login environment",
+    ),
+    report: Optional[str] = typer.Option(
+        None, help="write a per-phase timing report, in the given format (json)"
+    ),
+    report_file: str = typer.Option(
+        "nanolayer-report.json", help="where the report is written"
+    ),
+) -> None:
+    features_options: Dict[str, Dict[str, Union[str, bool]]] = {
+        feature: {} for feature in features
+    }
+
+    for option_name, option_value in _key_val_arg_to_dict(option).items():
+        feature_name, _, option_name = option_name.rpartition(".")
+        matching_features = [
+            feature
+            for feature in features
+            if OCIFeatureInstaller.feature_resource(feature).rsplit("/", 1)[-1]
+            == feature_name
+        ]
+        if len(matching_features) != 1:
+            raise typer.BadParameter(
+                f"option {feature_name}.{option_name} should match exactly one feature"
+            )
+        features_options[matching_features[0]][option_name] = option_value
+
+    OCIFeatureInstaller.install_many(
+        features=list(features_options.items()),
+        envs=_key_val_arg_to_dict(env),
+        remote_user=remote_user,
+        verbose=verbose,
+        invoke_entrypoint=invoke_entrypoint,
+        reinstall=reinstall,
+        env_snapshot=env_snapshot,
+        report_file=_report_file(report, report_file),
+    )
+
+
+@app.command("devcontainer-json")
+def install_devcontainer_json(
+    path: str = typer.Argument(..., help="path to a devcontainer.json"),
+    remote_user: Optional[str] = typer.Option(
+        None, help="defaults to the remoteUser (or containerUser) of devcontainer.json"
+    ),
+    env: Optional[List[str]] = typer.Option(None, callback=_validate_args),
+    verbose: bool = False,
+    invoke_entrypoint: bool = False,
+    reinstall: bool = typer.Option(
+        False, help="install even if already installed with the same options"
+    ),
+    env_snapshot: bool = typer.Option(
+        False,
+        help="run install scripts in a non-interactive bash with a captured login environment",
+    ),
+    report: Optional[str] = typer.Option(
+        None, help="write a per-phase timing report, in the given format (json)"
+    ),
+    report_file: str = typer.Option(
+        "nanolayer-report.json", help="where the report is written"
+    ),
+) -> None:
+    config = DevcontainerJson.load(path)
+
+    OCIFeatureInstaller.install_many(
+        features=DevcontainerJson.features(config),
+        envs=_key_val_arg_to_dict(env),
+        remote_user=remote_user or DevcontainerJson.remote_user(config),
+        verbose=verbose,
+        invoke_entrypoint=invoke_entrypoint,
+        reinstall=reinstall,
+        env_snapshot=env_snapshot,
+        report_file=_report_file(report, report_file),
+        install_order=DevcontainerJson.install_order(config),
     )
 
 
@@ -1,11 +1,13 @@
-import tempfile
 from typing import List
 
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
 from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
 
 class ApkInstaller:
+    CACHE_DIR = "/var/cache/apk"
+
     @classmethod
     def is_alpine(cls) -> bool:
         return (
@@ -25,16 +27,8 @@ class ApkInstaller:
     ) -> None:
         assert cls.is_alpine(), "apk should be used on alpine linux distribution"
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            Invoker.invoke(command=f"cp -p -R /var/cache/apk {tempdir}")
-
-            try:
-                Invoker.invoke(command="apk update")
-
-                Invoker.invoke(command=f"apk add --no-cache {' '.join(packages)}")
+        # the index cache is restored to its previous state afterwards
+        with DirectorySnapshot.preserved(cls.CACHE_DIR), Invoker.session():
+            Invoker.invoke(command="apk update")
 
-            finally:
-                # Note: not using dir/* syntax as that doesnt work on 'sh' shell (alpine)
-                Invoker.invoke(
-                    command=f"rm -r /var/cache/apk && mv {tempdir}/apk /var/cache/apk"
-                )
+            Invoker.invoke(command=f"apk add --no-cache {' '.join(packages)}")
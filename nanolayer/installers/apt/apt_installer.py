@@ -1,10 +1,15 @@
-import tempfile
+import logging
 from typing import Dict, List, Optional
 
+from nanolayer.installers.apt_get.apt_archive_cache import AptArchiveCache
 from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
 from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
+logger = logging.getLogger(__name__)
+
 
 class AptInstaller:
     @staticmethod
@@ -34,15 +39,21 @@ class AptInstaller:
             cls.is_debian_like()
         ), "apt should be used on debian-like linux distribution (debian, ubuntu, raspian  etc)"
 
+        # packages already installed are left alone, and when none is missing
+        # neither the lists nor the ppas are needed
+        missing_packages = DpkgStatus.missing(packages)
+        if not missing_packages:
+            logger.warning("already installed: %s", " ".join(packages))
+            return
+        packages = missing_packages
+
         support_packages_installed: List[str] = []
         installed_ppas: List[str] = []
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            # preserving previuse cache
-            Invoker.invoke(command=f"cp -p -R /var/lib/apt/lists {tempdir}")
-
+        # the lists cache is restored to its previous state afterwards
+        with DirectorySnapshot.preserved(AptGetInstaller.LISTS_DIR), Invoker.session():
             try:
-                Invoker.invoke(command="apt update -y")
+                AptGetInstaller.update(command="apt update -y")
 
                 if ppas:
                     (
@@ -54,9 +65,10 @@ class AptInstaller:
                         force_ppas_on_non_ubuntu=force_ppas_on_non_ubuntu,
                     )
 
-                Invoker.invoke(
-                    command=f"apt install -y --no-install-recommends {' '.join(packages)}"
-                )
+                with AptArchiveCache.archives_for(packages) as apt_options:
+                    Invoker.invoke(
+                        command=f"apt install -y --no-install-recommends {' '.join(apt_options + packages)}"
+                    )
 
             finally:
                 # remove ppa indexes
@@ -67,10 +79,3 @@ class AptInstaller:
 
                 # remove archives cache
                 Invoker.invoke(command="apt clean")
-
-                # restore lists cache
-                # Note: The reason for not using the dir/* syntax is because
-                # that doesnt work on ash based shell (alpine)
-                Invoker.invoke(
-                    command=f"rm -r /var/lib/apt/lists && mv {tempdir}/lists /var/lib/apt/lists"
-                )
@@ -0,0 +1,183 @@
+import contextlib
+import logging
+import os
+import pwd
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from nanolayer.installers.apt_get.deb_prefetcher import DebPrefetcher
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class AptArchiveCache:
+    """
+    Keeps the .deb files apt downloads in a directory outside of the image,
+    typically a build cache mount (eg. RUN --mount=type=cache), shared by
+    the builds of the host: apt is pointed at it with Dir::Cache::archives,
+    so files already there are not downloaded again, and `apt-get clean`
+    (which cleans the default archives) leaves it alone.
+    Files needed by an install are touched, and the least recently used are
+    evicted once the cache grows past max_size bytes.
+    """
+
+    PARTIAL_DIR = "partial"
+    APT_USER = "_apt"
+
+    def __init__(self, location: Union[str, Path], max_size: int) -> None:
+        self.location = Path(location)
+        self.max_size = max_size
+        self.hits: List[DebPrefetcher.Download] = []
+        self.misses: List[DebPrefetcher.Download] = []
+
+    @classmethod
+    def from_settings(cls) -> Optional["AptArchiveCache"]:
+        settings = NanolayerSettings()
+        if not settings.apt_cache_dir:
+            return None
+        return cls(
+            location=settings.apt_cache_dir, max_size=settings.apt_cache_max_size
+        )
+
+    @staticmethod
+    def archives_options(archives_dir: Union[str, Path]) -> List[str]:
+        # apt (unlike apt-get) removes what it downloaded after installing it
+        # unless told to keep it
+        return [
+            f"-o Dir::Cache::archives={Path(archives_dir).as_posix()}/",
+            "-o APT::Keep-Downloaded-Packages=true",
+        ]
+
+    def apt_options(self) -> List[str]:
+        return self.archives_options(self.location)
+
+    def prepare(self) -> None:
+        partial_dir = self.location.joinpath(self.PARTIAL_DIR)
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            # apt downloads as _apt, and falls back to root (with a warning)
+            # when it may not write there
+            apt_user = pwd.getpwnam(self.APT_USER)
+            os.chown(partial_dir, apt_user.pw_uid, -1)
+        except (KeyError, PermissionError):
+            pass
+
+    def _is_cached(self, download: DebPrefetcher.Download) -> bool:
+        try:
+            return (
+                self.location.joinpath(download.filename).stat().st_size
+                == download.size
+            )
+        except OSError:
+            return False
+
+    def lookup(self, packages: List[str]) -> List[DebPrefetcher.Download]:
+        """
+        Splits the files needed to install the packages into hits and
+        misses, and returns them all.
+        """
+        with tempfile.TemporaryDirectory() as archives_dir:
+            # an empty archives dir, for apt to print every needed file
+            Path(archives_dir, self.PARTIAL_DIR).mkdir()
+            downloads = DebPrefetcher.print_uris(
+                packages, apt_options=" ".join(self.archives_options(archives_dir))
+            )
+
+        for download in downloads:
+            if self._is_cached(download):
+                self.hits.append(download)
+            else:
+                self.misses.append(download)
+        return downloads
+
+    def touch(self, downloads: List[DebPrefetcher.Download]) -> None:
+        # apt sets the modification time of downloaded files to their
+        # Last-Modified, so the time of use is set afterwards
+        for download in downloads:
+            try:
+                os.utime(self.location.joinpath(download.filename))
+            except FileNotFoundError:
+                pass
+
+    def prune(self) -> Tuple[int, int]:
+        """
+        Evicts the least recently used files until the cache fits max_size,
+        returns the number of removed files and bytes.
+        """
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.location):
+            if not entry.is_file(follow_symlinks=False) or not entry.name.endswith(
+                ".deb"
+            ):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        removed_entries = 0
+        removed_bytes = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            removed_entries += 1
+            removed_bytes += size
+        return removed_entries, removed_bytes
+
+    def report(self, evicted: int) -> None:
+        logger.warning(
+            "apt cache %s: %d hits (%d bytes), %d misses (%d bytes), %d evicted",
+            self.location,
+            len(self.hits),
+            sum(download.size for download in self.hits),
+            len(self.misses),
+            sum(download.size for download in self.misses),
+            evicted,
+        )
+
+    @contextlib.contextmanager
+    def used_for(self, packages: List[str]) -> Iterator[List[str]]:
+        """
+        Yields the options pointing apt at the cache for installing the
+        packages, the misses being prefetched into it first when
+        NANOLAYER_APT_PREFETCH_WORKERS is set.
+        """
+        # when commands are not run the cache is left as it is
+        executes = Invoker.executes()
+        if executes:
+            self.prepare()
+        downloads = self.lookup(packages)
+        DebPrefetcher.prefetch(
+            packages, archives_dir=self.location, downloads=self.misses
+        )
+        try:
+            yield self.apt_options()
+        finally:
+            if executes:
+                self.touch(downloads)
+                evicted, _ = self.prune()
+                self.report(evicted)
+
+    @classmethod
+    @contextlib.contextmanager
+    def archives_for(cls, packages: List[str]) -> Iterator[List[str]]:
+        """
+        Yields the options to add to the install command of the packages,
+        none when NANOLAYER_APT_CACHE_DIR is not set: the files are then
+        prefetched (when enabled) into the default archives.
+        """
+        cache = cls.from_settings()
+        if cache is None:
+            DebPrefetcher.prefetch(packages)
+            yield []
+            return
+        with cache.used_for(packages) as apt_options:
+            yield apt_options
@@ -1,14 +1,20 @@
-import tempfile
+import logging
 import warnings
 from typing import List, Optional, Tuple
 
+from nanolayer.installers.apt_get.apt_archive_cache import AptArchiveCache
+from nanolayer.installers.apt_get.apt_lists_cache import AptListsCache
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.installers.apt_get.ppa_source import PpaSource
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
 from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
+logger = logging.getLogger(__name__)
+
 
 class AptGetInstaller:
-    PPA_SUPPORT_PACKAGES = ("software-properties-common",)
-    PPA_SUPPORT_PACKAGES_DEBIAN = ("python3-launchpadlib",)
+    LISTS_DIR = "/var/lib/apt/lists"
 
     @staticmethod
     def normalize_ppas(ppas: List[str]) -> List[str]:
@@ -32,14 +38,23 @@ class AptGetInstaller:
             == LinuxInformationDesk.LinuxReleaseID.debian
         )
 
+    @classmethod
+    def update(cls, command: str = "apt-get update -y") -> None:
+        """
+        Runs an apt update, unless lists of the same sources younger than
+        NANOLAYER_APT_LISTS_MAX_AGE seconds can be reused.
+        """
+        lists_cache = AptListsCache.from_settings(cls.LISTS_DIR)
+        if lists_cache is None:
+            Invoker.invoke(command=command)
+        else:
+            lists_cache.update(command=command)
+
     @classmethod
     def _clean_ppas(
         cls, ppas: List[str], purge_packages: Optional[List[str]] = None
     ) -> None:
-        normalized_ppas = cls.normalize_ppas(ppas)
-
-        for ppa in normalized_ppas:
-            Invoker.invoke(command=f"add-apt-repository -y --remove {ppa}")
+        PpaSource.remove(cls.normalize_ppas(ppas))
 
         if purge_packages is not None:
             for package in purge_packages:
@@ -52,10 +67,10 @@ class AptGetInstaller:
         update: bool = True,
         force_ppas_on_non_ubuntu: bool = False,
     ) -> Tuple[List[str], List[str]]:
-        installed_ppas: List[str] = []
-
-        installed_ppa_support_packages: List[str] = []
-
+        """
+        Returns the added ppas, and the packages installed to add them, which
+        are none since ppas are written directly (see PpaSource).
+        """
         if ppas is None:
             ppas = []
 
@@ -66,32 +81,19 @@ class AptGetInstaller:
             ppas = []
 
         if not ppas:
-            return [], installed_ppa_support_packages
+            return [], []
 
         normalized_ppas = cls.normalize_ppas(ppas)
-
-        required_ppa_support_package = (
-            cls.PPA_SUPPORT_PACKAGES
-            if cls.is_ubuntu()
-            else cls.PPA_SUPPORT_PACKAGES + cls.PPA_SUPPORT_PACKAGES_DEBIAN
-        )
-
-        for ppa_support_package in required_ppa_support_package:
-            if (
-                Invoker.invoke(f"dpkg -s {ppa_support_package}", raise_on_failure=False)
-                != 0
-            ):
-                Invoker.invoke(command=f"apt-get install -y {ppa_support_package}")
-                installed_ppa_support_packages.append(ppa_support_package)
-
-        for ppa in normalized_ppas:
-            Invoker.invoke(command=f"add-apt-repository -y {ppa}")
-            installed_ppas.append(ppa)
+        try:
+            PpaSource.add(normalized_ppas)
+        except BaseException:
+            PpaSource.remove(normalized_ppas)
+            raise
 
         if update:
-            Invoker.invoke(command="apt-get update -y")
+            cls.update(command=PpaSource.update_command())
 
-        return installed_ppas, installed_ppa_support_packages
+        return normalized_ppas, []
 
     @classmethod
     def install(
@@ -107,23 +109,30 @@ class AptGetInstaller:
             cls.is_debian_like()
         ), "apt-get should be used on debian-like linux distribution (debian, ubuntu, raspian  etc)"
 
+        # packages already installed are left alone, and when none is missing
+        # neither the lists nor the ppas are needed
+        missing_packages = DpkgStatus.missing(packages)
+        if not missing_packages:
+            logger.warning("already installed: %s", " ".join(packages))
+            return
+        packages = missing_packages
+
         support_packages_installed: List[str] = []
         installed_ppas: List[str] = []
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            # preserving previuse cache
-            Invoker.invoke(command=f"cp -p -R /var/lib/apt/lists {tempdir}")
-
+        # the lists cache is restored to its previous state afterwards
+        with DirectorySnapshot.preserved(cls.LISTS_DIR), Invoker.session():
             try:
-                Invoker.invoke(command="apt-get update -y")
+                cls.update()
 
                 installed_ppas, support_packages_installed = cls._add_ppas(
                     ppas, update=True, force_ppas_on_non_ubuntu=force_ppas_on_non_ubuntu
                 )
 
-                Invoker.invoke(
-                    command=f"apt-get install -y --no-install-recommends {' '.join(packages)}"
-                )
+                with AptArchiveCache.archives_for(packages) as apt_options:
+                    Invoker.invoke(
+                        command=f"apt-get install -y --no-install-recommends {' '.join(apt_options + packages)}"
+                    )
 
             finally:
                 # remove ppa indexes
@@ -134,10 +143,3 @@ class AptGetInstaller:
 
                 # remove archives cache
                 Invoker.invoke(command="apt-get clean")
-
-                # restore lists cache
-                # Note: The reason for not using the dir/* syntax is because
-                # that doesnt work on ash based shell (alpine)
-                Invoker.invoke(
-                    command=f"rm -r /var/lib/apt/lists && mv {tempdir}/lists /var/lib/apt/lists"
-                )
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class AptListsCache:
+    """
+    Lets an apt update be skipped when the same sources were updated less
+    than max_age seconds ago: the lists resulting from each update are kept
+    (hardlinked) under <state dir>/apt-lists/<sources fingerprint>, and
+    linked back in place of the lists directory instead of updating again.
+    The fingerprint covers the content of sources.list and sources.list.d,
+    so adding a repository (eg. a ppa) always updates.
+    Kept lists count in the image size unless the state dir is on a mount.
+    """
+
+    LISTS_CACHE_DIR = "apt-lists"
+    STATE_FILE = "state.json"
+    SOURCES = ("/etc/apt/sources.list", "/etc/apt/sources.list.d")
+
+    class State(BaseModel):
+        # sources fingerprint -> time of the update
+        updated_at: Dict[str, float] = {}
+
+    def __init__(
+        self,
+        location: Union[str, Path],
+        lists_dir: Union[str, Path],
+        max_age: float,
+        sources: Sequence[Union[str, Path]] = SOURCES,
+    ) -> None:
+        self.location = Path(location)
+        self.lists_dir = Path(lists_dir)
+        self.max_age = max_age
+        self.sources = [Path(source) for source in sources]
+
+    @classmethod
+    def from_settings(cls, lists_dir: Union[str, Path]) -> Optional["AptListsCache"]:
+        settings = NanolayerSettings()
+        if settings.apt_lists_max_age <= 0:
+            return None
+        return cls(
+            location=Path(settings.state_dir).joinpath(cls.LISTS_CACHE_DIR),
+            lists_dir=lists_dir,
+            max_age=settings.apt_lists_max_age,
+            sources=cls.SOURCES,
+        )
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for source in self.sources:
+            source_files = (
+                sorted(path for path in source.iterdir() if path.is_file())
+                if source.is_dir()
+                else [source]
+            )
+            for source_file in source_files:
+                if not source_file.is_file():
+                    continue
+                digest.update(source_file.as_posix().encode() + b"\0")
+                digest.update(source_file.read_bytes() + b"\0")
+        return digest.hexdigest()
+
+    def _read_state(self) -> "AptListsCache.State":
+        state_file = self.location.joinpath(self.STATE_FILE)
+        if not state_file.is_file():
+            return AptListsCache.State()
+        try:
+            return AptListsCache.State.parse_file(state_file)
+        except ValueError:
+            logger.warning("ignoring corrupted apt lists state %s", state_file)
+            return AptListsCache.State()
+
+    def _write_state(self, state: "AptListsCache.State") -> None:
+        AtomicFile.write_text(self.location.joinpath(self.STATE_FILE), state.json())
+
+    def update(self, command: str = "apt-get update -y") -> None:
+        if not Invoker.executes():
+            # neither reused nor kept, the update is only shown (or replayed)
+            Invoker.invoke(command=command)
+            return
+
+        fingerprint = self.fingerprint()
+        entry_dir = self.location.joinpath(fingerprint)
+        state = self._read_state()
+
+        updated_at = state.updated_at.get(fingerprint)
+        if updated_at is not None and entry_dir.is_dir():
+            age = time.time() - updated_at
+            if age <= self.max_age:
+                logger.warning(
+                    "reusing apt lists updated %ds ago instead of running: %s",
+                    age,
+                    command,
+                )
+                if self.lists_dir.exists():
+                    shutil.rmtree(self.lists_dir)
+                DirectorySnapshot.clone(entry_dir, self.lists_dir)
+                return
+
+        Invoker.invoke(command=command)
+
+        self.location.mkdir(parents=True, exist_ok=True)
+        temp_dir = self.location.joinpath(f".{fingerprint}.{uuid.uuid4().hex}")
+        try:
+            DirectorySnapshot.clone(self.lists_dir, temp_dir)
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.rename(temp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        now = time.time()
+        state.updated_at[fingerprint] = now
+        # lists too old to be reused are dropped
+        for stale_fingerprint, stale_updated_at in list(state.updated_at.items()):
+            if now - stale_updated_at > self.max_age:
+                del state.updated_at[stale_fingerprint]
+                shutil.rmtree(
+                    self.location.joinpath(stale_fingerprint), ignore_errors=True
+                )
+        self._write_state(state)
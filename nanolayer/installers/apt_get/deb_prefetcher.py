@@ -0,0 +1,210 @@
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import shlex
+import tempfile
+import uuid
+from pathlib import Path
+from typing import List, Optional, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.http_client import HttpClient
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class DebPrefetcher:
+    """
+    Downloads the .deb files an apt install is about to fetch concurrently,
+    into the apt archives directory, so that the install itself finds them
+    there: apt downloads them mostly one after the other.
+    What to fetch comes from `apt-get install --print-uris`, with the size
+    and hash of each file from the indexes, both checked before a file is
+    moved into the archives. Files that can't be prefetched are left for
+    apt to download.
+    """
+
+    ARCHIVES_DIR = "/var/cache/apt/archives"
+    PARTIAL_DIR = "partial"
+    READ_CHUNK_SIZE = 1024 * 1024
+
+    # eg. 'http://deb.debian.org/debian/pool/main/n/neovim/neovim_0.7.2-7_amd64.deb' neovim_0.7.2-7_amd64.deb 1403888 SHA256:0b9a...
+    URI_PATTERN = re.compile(
+        r"^'(?P<uri>[^']+)' (?P<filename>\S+) (?P<size>\d+)(?: (?P<hash>\S+))?$"
+    )
+    HASH_ALGORITHMS = {
+        "SHA512": "sha512",
+        "SHA256": "sha256",
+        "SHA1": "sha1",
+        "MD5Sum": "md5",
+        "MD5": "md5",
+    }
+
+    class DebPrefetchError(Exception):
+        pass
+
+    class Download(BaseModel):
+        uri: str
+        filename: str
+        size: int
+        hash_algorithm: Optional[str] = None
+        hash_value: Optional[str] = None
+
+    @classmethod
+    def parse_uris(cls, output: str) -> List["DebPrefetcher.Download"]:
+        downloads = []
+        for line in output.splitlines():
+            match = cls.URI_PATTERN.match(line.strip())
+            if match is None:
+                continue
+            hash_algorithm = hash_value = None
+            if match.group("hash"):
+                name, _, hash_value = match.group("hash").partition(":")
+                hash_algorithm = cls.HASH_ALGORITHMS.get(name)
+                if hash_algorithm is None:
+                    hash_value = None
+            downloads.append(
+                DebPrefetcher.Download(
+                    uri=match.group("uri"),
+                    filename=match.group("filename"),
+                    size=int(match.group("size")),
+                    hash_algorithm=hash_algorithm,
+                    hash_value=hash_value,
+                )
+            )
+        return downloads
+
+    @classmethod
+    def print_uris(
+        cls, packages: List[str], apt_options: str = ""
+    ) -> List["DebPrefetcher.Download"]:
+        """
+        The files apt would download to install the packages, which leaves
+        out those already in its archives.
+        """
+        with tempfile.TemporaryDirectory() as tempdir:
+            uris_file = Path(tempdir, "uris")
+            options = f"{apt_options} " if apt_options else ""
+            Invoker.invoke(
+                command=f"apt-get install -y -qq --no-install-recommends {options}--print-uris {' '.join(packages)} > {shlex.quote(uris_file.as_posix())}"
+            )
+            if not uris_file.exists():
+                return []
+            return cls.parse_uris(uris_file.read_text())
+
+    @classmethod
+    def download(
+        cls, download: "DebPrefetcher.Download", archives_dir: Union[str, Path]
+    ) -> None:
+        if "/" in download.filename or download.filename.startswith("."):
+            raise DebPrefetcher.DebPrefetchError(
+                f"invalid file name: {download.filename}"
+            )
+        target = Path(archives_dir).joinpath(download.filename)
+        partial_file = Path(archives_dir).joinpath(
+            cls.PARTIAL_DIR, f"{download.filename}.{uuid.uuid4().hex}"
+        )
+        partial_file.parent.mkdir(parents=True, exist_ok=True)
+
+        digest = (
+            hashlib.new(download.hash_algorithm)
+            if download.hash_algorithm is not None
+            else None
+        )
+        size = 0
+        try:
+            with HttpClient.request(download.uri) as response, partial_file.open(
+                "wb"
+            ) as f:
+                while True:
+                    chunk = response.read(cls.READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > download.size:
+                        break
+                    if digest is not None:
+                        digest.update(chunk)
+                    f.write(chunk)
+
+            if size != download.size:
+                raise DebPrefetcher.DebPrefetchError(
+                    f"{download.uri}: expected {download.size} bytes, got {size}"
+                )
+            if digest is not None and digest.hexdigest() != download.hash_value:
+                raise DebPrefetcher.DebPrefetchError(
+                    f"{download.uri}: {download.hash_algorithm} mismatch"
+                )
+            partial_file.chmod(0o644)
+            os.replace(partial_file, target)
+        except BaseException:
+            partial_file.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def fetch(
+        cls,
+        downloads: List["DebPrefetcher.Download"],
+        archives_dir: Union[str, Path],
+        max_workers: int,
+    ) -> int:
+        """
+        Returns how many files were prefetched, failures are only logged.
+        """
+        downloads = [
+            download
+            for download in downloads
+            if download.uri.startswith(("http://", "https://"))
+        ]
+        if not downloads:
+            return 0
+
+        fetched = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(downloads))
+        ) as executor:
+            futures = {
+                executor.submit(cls.download, download, archives_dir): download
+                for download in downloads
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                    fetched += 1
+                except Exception as e:
+                    logger.warning(
+                        "could not prefetch %s, leaving it to apt: %s",
+                        futures[future].uri,
+                        str(e),
+                    )
+        return fetched
+
+    @classmethod
+    def prefetch(
+        cls,
+        packages: List[str],
+        archives_dir: Optional[Union[str, Path]] = None,
+        downloads: Optional[List["DebPrefetcher.Download"]] = None,
+    ) -> None:
+        """
+        Prefetches the files to install the given packages (or the given
+        downloads when already known) when NANOLAYER_APT_PREFETCH_WORKERS is
+        set.
+        """
+        max_workers = NanolayerSettings().apt_prefetch_workers
+        if max_workers <= 0 or not packages:
+            return
+
+        if downloads is None:
+            downloads = cls.print_uris(packages)
+        fetched = cls.fetch(
+            downloads,
+            archives_dir=archives_dir or cls.ARCHIVES_DIR,
+            max_workers=max_workers,
+        )
+        logger.warning("prefetched %d of %d packages", fetched, len(downloads))
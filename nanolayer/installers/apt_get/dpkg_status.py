@@ -0,0 +1,101 @@
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class DpkgStatus:
+    """
+    Index of the installed packages (name -> version) read straight from the
+    dpkg status file, instead of running `dpkg -s` once per package.
+    The index is built once and rebuilt only when the status file changes
+    (eg. after an apt-get install).
+    """
+
+    STATUS_FILE = "/var/lib/dpkg/status"
+
+    # a package name, optionally qualified with an architecture and a version,
+    # anything else (releases, globs, removals) is left for apt to resolve
+    PACKAGE_PATTERN = re.compile(
+        r"^(?P<name>[a-z0-9][a-z0-9+.-]*[a-z0-9+.])(?::(?P<arch>[a-z0-9-]+))?(?:=(?P<version>\S+))?$"
+    )
+
+    FIELDS_PATTERN = re.compile(
+        r"^(Package|Status|Version|Architecture): *(.*)$", re.MULTILINE
+    )
+
+    _cache: Dict[str, Tuple[Tuple[int, int], Dict[str, str]]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def parse(content: str) -> Dict[str, str]:
+        installed: Dict[str, str] = {}
+        for stanza in content.split("\n\n"):
+            # continuation lines of multiline fields start with a space
+            fields = dict(DpkgStatus.FIELDS_PATTERN.findall(stanza))
+            name = fields.get("Package", "").rstrip()
+            version = fields.get("Version", "").rstrip()
+            if not name or not version:
+                continue
+            # eg. "install ok installed", but not "deinstall ok config-files"
+            if not fields.get("Status", "").rstrip().endswith(" installed"):
+                continue
+            installed[name] = version
+            arch = fields.get("Architecture", "").rstrip()
+            if arch:
+                installed[f"{name}:{arch}"] = version
+        return installed
+
+    @classmethod
+    def installed(
+        cls, status_file: Optional[Union[str, Path]] = None
+    ) -> Dict[str, str]:
+        status_file = str(status_file or cls.STATUS_FILE)
+        try:
+            stat = os.stat(status_file)
+        except FileNotFoundError:
+            # not a dpkg based distro, or nothing was ever installed
+            return {}
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with cls._lock:
+            cached = cls._cache.get(status_file)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+        with open(status_file, encoding="utf-8", errors="replace") as f:
+            installed = cls.parse(f.read())
+        with cls._lock:
+            cls._cache[status_file] = (key, installed)
+        return installed
+
+    @classmethod
+    def is_installed(
+        cls, package: str, status_file: Optional[Union[str, Path]] = None
+    ) -> bool:
+        match = cls.PACKAGE_PATTERN.match(package)
+        if match is None:
+            return False
+
+        name = match.group("name")
+        if match.group("arch") is not None:
+            name = f"{name}:{match.group('arch')}"
+        installed_version = cls.installed(status_file).get(name)
+        if installed_version is None:
+            return False
+        return match.group("version") in (None, installed_version)
+
+    @classmethod
+    def missing(
+        cls, packages: List[str], status_file: Optional[Union[str, Path]] = None
+    ) -> List[str]:
+        """
+        The given packages (as passed to apt-get install) which are not
+        installed already. Virtual packages are always considered missing.
+        """
+        return [
+            package
+            for package in packages
+            if not cls.is_installed(package, status_file=status_file)
+        ]
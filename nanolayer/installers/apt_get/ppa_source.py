@@ -0,0 +1,201 @@
+import base64
+import hashlib
+import logging
+import urllib.parse
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.http_client import HttpClient
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.linux_information_desk import EnvFile, LinuxInformationDesk
+
+logger = logging.getLogger(__name__)
+
+
+class PpaSource:
+    """
+    Sets up launchpad ppas (ppa:owner/name) without add-apt-repository, and
+    so without installing software-properties-common: the signing key
+    fingerprint of the ppa is looked up with the launchpad api, its key
+    fetched from the keyserver, checked against that fingerprint and written
+    (dearmored) to a keyring, and all ppas go to a single sources.list.d
+    file. That file can then be updated alone, see update_command().
+    """
+
+    LAUNCHPAD_API = "https://api.launchpad.net/1.0"
+    KEYSERVER = "https://keyserver.ubuntu.com"
+    PPA_URL = "https://ppa.launchpadcontent.net"
+
+    KEYRINGS_DIR = "/etc/apt/keyrings"
+    SOURCES_FILE = "/etc/apt/sources.list.d/nanolayer-ppas.list"
+
+    ARMOR_BEGIN = "-----BEGIN PGP PUBLIC KEY BLOCK-----"
+    ARMOR_END = "-----END PGP PUBLIC KEY BLOCK-----"
+
+    class PpaSourceError(Exception):
+        pass
+
+    @staticmethod
+    def parse(ppa: str) -> Tuple[str, str]:
+        owner, _, name = ppa[len("ppa:") :].partition("/")
+        if not ppa.startswith("ppa:") or not owner or "/" in name:
+            raise PpaSource.PpaSourceError(f"invalid ppa: {ppa}")
+        # ppa:owner is the owner's ppa named "ppa"
+        return owner, name or "ppa"
+
+    @classmethod
+    def codename(cls) -> str:
+        os_release = EnvFile.parse(LinuxInformationDesk.OS_RELEASE_PATH)
+        codename = os_release.get("UBUNTU_CODENAME") or os_release.get(
+            "VERSION_CODENAME"
+        )
+        if not codename:
+            raise PpaSource.PpaSourceError(
+                f"could not resolve the release codename from {LinuxInformationDesk.OS_RELEASE_PATH}"
+            )
+        return codename.strip().strip('"')
+
+    @classmethod
+    def signing_key_fingerprint(cls, owner: str, name: str) -> str:
+        archive = HttpClient.get_json(
+            f"{cls.LAUNCHPAD_API}/~{urllib.parse.quote(owner)}/+archive/ubuntu/{urllib.parse.quote(name)}"
+        )
+        fingerprint = archive.get("signing_key_fingerprint")
+        if not fingerprint:
+            raise PpaSource.PpaSourceError(
+                f"ppa:{owner}/{name} has no signing key (yet)"
+            )
+        return fingerprint.upper()
+
+    @staticmethod
+    def _crc24(data: bytes) -> int:
+        # the armor checksum, RFC 4880 section 6.1
+        crc = 0xB704CE
+        for byte in data:
+            crc ^= byte << 16
+            for _ in range(8):
+                crc <<= 1
+                if crc & 0x1000000:
+                    crc ^= 0x1864CFB
+        return crc & 0xFFFFFF
+
+    @classmethod
+    def dearmor(cls, armored: str) -> bytes:
+        lines = [line.strip() for line in armored.strip().splitlines()]
+        try:
+            begin = lines.index(cls.ARMOR_BEGIN)
+            end = lines.index(cls.ARMOR_END, begin)
+            # armor headers (eg. Comment:) end at the first empty line
+            body_start = lines.index("", begin)
+        except ValueError:
+            raise PpaSource.PpaSourceError("not an armored public key") from None
+
+        body = lines[body_start + 1 : end]
+        checksum = None
+        if body and body[-1].startswith("="):
+            checksum = body.pop()[1:]
+        key = base64.b64decode("".join(body))
+        if checksum is not None and base64.b64decode(checksum) != cls._crc24(
+            key
+        ).to_bytes(3, "big"):
+            raise PpaSource.PpaSourceError("corrupted armored public key")
+        return key
+
+    @staticmethod
+    def primary_key_fingerprint(key: bytes) -> Optional[str]:
+        """
+        The v4 fingerprint of the first (primary) key packet, None for keys
+        of other versions.
+        """
+        if len(key) < 2 or not key[0] & 0x80:
+            raise PpaSource.PpaSourceError("not an openpgp key")
+
+        if key[0] & 0x40:
+            # new format packet
+            tag = key[0] & 0x3F
+            if key[1] < 192:
+                length, offset = key[1], 2
+            elif key[1] < 224:
+                length, offset = ((key[1] - 192) << 8) + key[2] + 192, 3
+            else:
+                length, offset = int.from_bytes(key[2:6], "big"), 6
+        else:
+            tag = (key[0] >> 2) & 0x0F
+            length_size = {0: 1, 1: 2, 2: 4}.get(key[0] & 0x03)
+            if length_size is None:
+                raise PpaSource.PpaSourceError("unsupported openpgp packet length")
+            length = int.from_bytes(key[1 : 1 + length_size], "big")
+            offset = 1 + length_size
+
+        body = key[offset : offset + length]
+        if tag != 6 or not body or len(body) != length:
+            raise PpaSource.PpaSourceError("not an openpgp public key")
+        if body[0] != 4:
+            return None
+        return (
+            hashlib.sha1(b"\x99" + length.to_bytes(2, "big") + body)  # nosec
+            .hexdigest()
+            .upper()
+        )
+
+    @classmethod
+    def fetch_key(cls, fingerprint: str) -> bytes:
+        with HttpClient.request(
+            f"{cls.KEYSERVER}/pks/lookup?op=get&options=mr&search=0x{fingerprint}"
+        ) as response:
+            key = cls.dearmor(response.read().decode())
+
+        # a key which can't be checked is not trusted either
+        key_fingerprint = cls.primary_key_fingerprint(key)
+        if key_fingerprint is None:
+            raise PpaSource.PpaSourceError(
+                f"the keyserver returned a key whose fingerprint can't be checked against {fingerprint}"
+            )
+        if key_fingerprint != fingerprint:
+            raise PpaSource.PpaSourceError(
+                f"the keyserver returned key {key_fingerprint} instead of {fingerprint}"
+            )
+        return key
+
+    @classmethod
+    def keyring_path(cls, owner: str, name: str) -> Path:
+        return Path(cls.KEYRINGS_DIR).joinpath(f"nanolayer-ppa-{owner}-{name}.gpg")
+
+    @classmethod
+    def add(cls, ppas: List[str]) -> None:
+        if not Invoker.executes():
+            logger.warning("not adding %s, commands are not run", " ".join(ppas))
+            return
+
+        codename = cls.codename()
+        entries = []
+        for ppa in ppas:
+            owner, name = cls.parse(ppa)
+            key = cls.fetch_key(cls.signing_key_fingerprint(owner, name))
+            keyring_path = cls.keyring_path(owner, name)
+            AtomicFile.write_bytes(keyring_path, key, mode=0o644)
+            entries.append(
+                f"deb [signed-by={keyring_path}] {cls.PPA_URL}/{owner}/{name}/ubuntu {codename} main"
+            )
+            logger.warning("added %s", ppa)
+
+        AtomicFile.write_text(
+            Path(cls.SOURCES_FILE), "\n".join(entries) + "\n", mode=0o644
+        )
+
+    @classmethod
+    def remove(cls, ppas: List[str]) -> None:
+        if not Invoker.executes():
+            return
+        for ppa in ppas:
+            cls.keyring_path(*cls.parse(ppa)).unlink(missing_ok=True)
+        Path(cls.SOURCES_FILE).unlink(missing_ok=True)
+
+    @classmethod
+    def update_command(cls) -> str:
+        # only the ppas are updated, and the lists of the other sources kept
+        return (
+            f"apt-get update -y -o Dir::Etc::sourcelist={cls.SOURCES_FILE} "
+            "-o Dir::Etc::sourceparts=- -o APT::Get::List-Cleanup=0"
+        )
@@ -1,10 +1,15 @@
-import tempfile
+import logging
 from typing import Dict, List, Optional
 
+from nanolayer.installers.apt_get.apt_archive_cache import AptArchiveCache
 from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
 from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
+logger = logging.getLogger(__name__)
+
 
 class AptitudeInstaller:
     @classmethod
@@ -25,19 +30,25 @@ class AptitudeInstaller:
             cls.is_debian_like()
         ), "aptitude should be used on debian-like linux distribution (debian, ubuntu, raspian  etc)"
 
+        # packages already installed are left alone, and when none is missing
+        # neither the lists nor the ppas are needed
+        missing_packages = DpkgStatus.missing(packages)
+        if not missing_packages:
+            logger.warning("already installed: %s", " ".join(packages))
+            return
+        packages = missing_packages
+
         support_packages_installed: List[str] = []
         installed_ppas: List[str] = []
         aptitude_installed = False
 
-        with tempfile.TemporaryDirectory() as tempdir:
+        # the lists cache is restored to its previous state afterwards
+        with DirectorySnapshot.preserved(AptGetInstaller.LISTS_DIR), Invoker.session():
             try:
-                # preserving previuse cache
-                Invoker.invoke(command=f"cp -p -R /var/lib/apt/lists {tempdir}")
-
-                Invoker.invoke(command="apt-get update -y")
+                AptGetInstaller.update()
 
                 # ensure aptitude existance
-                if Invoker.invoke("dpkg -s aptitude", raise_on_failure=False) != 0:
+                if not DpkgStatus.is_installed("aptitude"):
                     AptGetInstaller.install(
                         packages=["aptitude"],
                     )
@@ -53,7 +64,10 @@ class AptitudeInstaller:
                         force_ppas_on_non_ubuntu=force_ppas_on_non_ubuntu,
                     )
 
-                Invoker.invoke(command=f"aptitude install -y {' '.join(packages)}")
+                with AptArchiveCache.archives_for(packages) as apt_options:
+                    Invoker.invoke(
+                        command=f"aptitude install -y {' '.join(apt_options + packages)}"
+                    )
 
             finally:
                 AptGetInstaller._clean_ppas(
@@ -65,10 +79,3 @@ class AptitudeInstaller:
 
                 if aptitude_installed:
                     Invoker.invoke(command="apt-get -y purge aptitude --auto-remove")
-
-                # restore lists cache
-                # Note: The reason for not using the dir/* syntax is because
-                # that doesnt work on ash based shell (alpine)
-                Invoker.invoke(
-                    command=f"rm -r /var/lib/apt/lists && mv {tempdir}/lists /var/lib/apt/lists"
-                )
@@ -0,0 +1,137 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from nanolayer.utils.oci_layout import OCILayout
+
+
+class DevcontainerJson:
+    """
+    Reads the features (and the user to install them for) declared in a
+    devcontainer.json, which is JSON with comments and trailing commas.
+    """
+
+    class DevcontainerJsonError(Exception):
+        pass
+
+    @staticmethod
+    def _strip_jsonc(content: str) -> str:
+        stripped = []
+        idx = 0
+        in_string = False
+        while idx < len(content):
+            char = content[idx]
+            if in_string:
+                stripped.append(char)
+                if char == "\\":
+                    stripped.append(content[idx + 1 : idx + 2])
+                    idx += 1
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+                stripped.append(char)
+            elif content.startswith("//", idx):
+                end = content.find("\n", idx)
+                idx = len(content) if end == -1 else end
+                continue
+            elif content.startswith("/*", idx):
+                end = content.find("*/", idx + 2)
+                if end == -1:
+                    raise DevcontainerJson.DevcontainerJsonError("unterminated comment")
+                idx = end + 2
+                continue
+            elif char in "]}":
+                # drop a trailing comma before the closing bracket
+                for back_idx in range(len(stripped) - 1, -1, -1):
+                    if stripped[back_idx].isspace():
+                        continue
+                    if stripped[back_idx] == ",":
+                        del stripped[back_idx]
+                    break
+                stripped.append(char)
+            else:
+                stripped.append(char)
+            idx += 1
+        return "".join(stripped)
+
+    @staticmethod
+    def parse(content: str) -> Dict[str, Any]:
+        try:
+            return json.loads(DevcontainerJson._strip_jsonc(content))
+        except ValueError as e:
+            raise DevcontainerJson.DevcontainerJsonError(
+                f"invalid devcontainer.json: {str(e)}"
+            ) from e
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> Dict[str, Any]:
+        return DevcontainerJson.parse(Path(path).read_text())
+
+    @staticmethod
+    def features(
+        config: Dict[str, Any],
+    ) -> List[Tuple[str, Dict[str, Union[str, bool]]]]:
+        """
+        Returns the (feature ref, options) pairs of the features map, in
+        overrideFeatureInstallOrder first when given, then in declared order.
+        """
+        features = []
+        for feature_ref, value in (config.get("features") or {}).items():
+            if not OCILayout.is_layout_ref(feature_ref) and (
+                "/" not in feature_ref
+                or feature_ref.startswith((".", "/", "http://", "https://"))
+            ):
+                # local feature directories, tarball urls and deprecated short ids
+                raise DevcontainerJson.DevcontainerJsonError(
+                    f"{feature_ref}: only features published to an OCI registry are supported"
+                )
+
+            options: Dict[str, Union[str, bool]] = {}
+            if isinstance(value, str):
+                # "feature": "1.2" is a shorthand for its version option
+                options["version"] = value
+            elif isinstance(value, dict):
+                for option_name, option_value in value.items():
+                    options[option_name] = (
+                        option_value
+                        if isinstance(option_value, (bool, str))
+                        else str(option_value)
+                    )
+            elif value is not True:
+                continue
+
+            features.append((feature_ref, options))
+
+        override_order = [
+            DevcontainerJson._without_version(feature_ref)
+            for feature_ref in config.get("overrideFeatureInstallOrder") or []
+        ]
+
+        def _order(feature: Tuple[str, Dict[str, Union[str, bool]]]) -> int:
+            resource = DevcontainerJson._without_version(feature[0])
+            if resource in override_order:
+                return override_order.index(resource)
+            return len(override_order)
+
+        # sorted is stable, the rest keep their declared order
+        return sorted(features, key=_order)
+
+    @staticmethod
+    def install_order(config: Dict[str, Any]) -> List[str]:
+        """
+        The features to install first, in that order, overriding their
+        installsAfter.
+        """
+        return list(config.get("overrideFeatureInstallOrder") or [])
+
+    @staticmethod
+    def _without_version(feature_ref: str) -> str:
+        feature_ref = feature_ref.split("@")[0]
+        if feature_ref.rfind(":") > feature_ref.rfind("/"):
+            feature_ref = feature_ref.rsplit(":", 1)[0]
+        return feature_ref
+
+    @staticmethod
+    def remote_user(config: Dict[str, Any]) -> Optional[str]:
+        return config.get("remoteUser") or config.get("containerUser")
@@ -0,0 +1,162 @@
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureEnvProfile:
+    """
+    Single profile script exporting the containerEnv of every installed feature.
+    The containerEnv of each feature is kept in a keyed index
+    (<state dir>/container-env.json, in install order) from which the profile
+    is regenerated, and atomically replaced, whenever a feature is installed.
+    PATH-style variables (values referencing themselves, eg.
+    "PATH": "/usr/local/go/bin:${PATH}") are merged across features with
+    ordered de-duplication, and are not extended again when the profile is
+    sourced more than once.
+    """
+
+    PROFILE_FILE = "nanolayer-features.sh"
+    INDEX_FILE = "container-env.json"
+    # one file per feature, as written by previous nanolayer versions
+    LEGACY_PROFILE_FILE = "nanolayer-{feature_id}.sh"
+
+    class Variable(BaseModel):
+        # value set by the last feature assigning it plainly, if any
+        value: Optional[str] = None
+        prepend: List[str] = []
+        append: List[str] = []
+
+    def __init__(
+        self, profile_dir: Union[str, Path], state_dir: Union[str, Path]
+    ) -> None:
+        self.profile_dir = Path(profile_dir)
+        self.state_dir = Path(state_dir)
+
+    @classmethod
+    def from_settings(cls, profile_dir: Union[str, Path]) -> "FeatureEnvProfile":
+        return cls(profile_dir=profile_dir, state_dir=NanolayerSettings().state_dir)
+
+    @property
+    def profile_file(self) -> Path:
+        return self.profile_dir.joinpath(self.PROFILE_FILE)
+
+    def _index_file(self) -> Path:
+        return self.state_dir.joinpath(self.INDEX_FILE)
+
+    def load_index(self) -> Dict[str, Dict[str, str]]:
+        index_file = self._index_file()
+        if not index_file.is_file():
+            return {}
+        try:
+            return dict(json.loads(index_file.read_text()))
+        except ValueError:
+            logger.warning("ignoring corrupted environment index %s", index_file)
+            return {}
+
+    def update(self, feature_id: str, container_env: Dict[str, str]) -> None:
+        index = self.load_index()
+        if container_env:
+            index[feature_id] = dict(container_env)
+        elif feature_id not in index:
+            return
+        else:
+            del index[feature_id]
+
+        AtomicFile.write_text(self._index_file(), json.dumps(index, indent=4))
+        AtomicFile.write_text(self.profile_file, self.render(index))
+
+        self.profile_dir.joinpath(
+            self.LEGACY_PROFILE_FILE.format(feature_id=feature_id)
+        ).unlink(missing_ok=True)
+
+    @staticmethod
+    def _self_reference(name: str) -> Pattern[str]:
+        return re.compile(rf"^\$(\{{{name}\}}|{name})$")
+
+    @classmethod
+    def merge(
+        cls, index: Dict[str, Dict[str, str]]
+    ) -> Dict[str, "FeatureEnvProfile.Variable"]:
+        variables: Dict[str, FeatureEnvProfile.Variable] = {}
+
+        for container_env in index.values():
+            for name, value in container_env.items():
+                variable = variables.setdefault(name, FeatureEnvProfile.Variable())
+                entries = value.split(":")
+                self_reference = cls._self_reference(name)
+                position = next(
+                    (
+                        idx
+                        for idx, entry in enumerate(entries)
+                        if self_reference.match(entry)
+                    ),
+                    None,
+                )
+
+                if position is None:
+                    # a plain assignment overrides whatever came before it
+                    variables[name] = FeatureEnvProfile.Variable(value=value)
+                    continue
+
+                prepend = [entry for entry in entries[:position] if entry]
+                append = [
+                    entry
+                    for entry in entries[position + 1 :]
+                    if entry and not self_reference.match(entry)
+                ]
+
+                # entries of later features end up in front, as they would have
+                # when their values were applied one after the other
+                variable.prepend = cls._deduplicate(prepend + variable.prepend)
+                variable.append = cls._deduplicate(variable.append + append)
+
+        return variables
+
+    @staticmethod
+    def _deduplicate(entries: List[str]) -> List[str]:
+        return list(dict.fromkeys(entries))
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        # keeps variable references expanding, as they would in containerEnv
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    @classmethod
+    def render(cls, index: Dict[str, Dict[str, str]]) -> str:
+        variables = cls.merge(index)
+
+        lines = ["# generated by nanolayer, do not edit"]
+
+        # plain values first, path-style entries may reference them
+        for name, variable in variables.items():
+            if variable.value is not None:
+                lines.append(f"export {name}={cls._quote(variable.value)}")
+
+        # a single guarded assignment per variable keeps sourcing cheap, and
+        # idempotent when nested shells source the profile again
+        for name, variable in variables.items():
+            if variable.prepend:
+                entries = cls._quote(":".join(variable.prepend))
+                lines.append(
+                    f'case ":${{{name}}}:" in *:{entries}:*) ;; '
+                    f'*) {name}={entries}"${{{name}:+:${{{name}}}}}" ;; esac'
+                )
+            if variable.append:
+                entries = cls._quote(":".join(variable.append))
+                lines.append(
+                    f'case ":${{{name}}}:" in *:{entries}:*) ;; '
+                    f'*) {name}="${{{name}:+${{{name}}}:}}"{entries} ;; esac'
+                )
+            if variable.prepend or variable.append:
+                lines.append(f"export {name}")
+
+        return "\n".join(lines) + "\n"
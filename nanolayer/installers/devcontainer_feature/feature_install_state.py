@@ -0,0 +1,75 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+from nanolayer.installers.devcontainer_feature.models.devcontainer_feature import (
+    Feature,
+)
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureInstallState:
+    """
+    Records of the features installed on this machine, one file per feature id
+    under <state dir>/features. A record holds the manifest digest the feature
+    was installed from and its options once resolved against their defaults,
+    so rerunning the same install can be skipped.
+    """
+
+    FEATURES_DIR = "features"
+
+    class Record(BaseModel):
+        id: str
+        feature_ref: str
+        manifest_digest: str
+        options: Dict[str, str]
+        feature: Feature
+
+    def __init__(self, location: Union[str, Path]) -> None:
+        self.location = Path(location)
+
+    @classmethod
+    def from_settings(cls) -> "FeatureInstallState":
+        return cls(location=NanolayerSettings().state_dir)
+
+    @staticmethod
+    def normalize_options(options: Dict[str, Union[str, bool]]) -> Dict[str, str]:
+        # options are compared the way install.sh receives them
+        return {
+            name: ("true" if value else "false") if isinstance(value, bool) else value
+            for name, value in options.items()
+        }
+
+    def _record_path(self, feature_id: str) -> Path:
+        if "/" in feature_id or feature_id.startswith("."):
+            raise ValueError(f"invalid feature id: {feature_id}")
+        return self.location.joinpath(self.FEATURES_DIR, f"{feature_id}.json")
+
+    def records(self) -> List["FeatureInstallState.Record"]:
+        features_dir = self.location.joinpath(self.FEATURES_DIR)
+        if not features_dir.is_dir():
+            return []
+
+        records = []
+        for record_path in sorted(features_dir.glob("*.json")):
+            try:
+                records.append(FeatureInstallState.Record.parse_file(record_path))
+            except ValueError:
+                logger.warning("ignoring corrupted install record %s", record_path)
+        return records
+
+    def find(self, manifest_digest: str) -> Optional["FeatureInstallState.Record"]:
+        for record in self.records():
+            if record.manifest_digest == manifest_digest:
+                return record
+        return None
+
+    def put(self, record: "FeatureInstallState.Record") -> None:
+        AtomicFile.write_text(
+            self._record_path(record.id), record.json(exclude_none=True)
+        )
@@ -1,7 +1,7 @@
 import os
 import tempfile
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Optional, Union
 
 from nanolayer.installers.devcontainer_feature.models.devcontainer_feature import (
     Feature,
@@ -12,6 +12,11 @@ from nanolayer.utils.oci_registry import OCIRegistry
 class OCIFeature:
     DEVCONTAINER_JSON_FILENAME = "devcontainer-feature.json"
     DEVCONTAINER_FILE_NAME_ANNOTATION = "org.opencontainers.image.title"
+    # devcontainer-feature.json content, as published by the devcontainers cli
+    DEVCONTAINER_METADATA_ANNOTATION = "dev.containers.metadata"
+
+    class FeatureMetadataNotFound(Exception):
+        pass
 
     @staticmethod
     def download(oci_feature_ref: str, output_dir: Union[str, Path]) -> str:
@@ -43,10 +48,21 @@ class OCIFeature:
 
     @staticmethod
     def download_and_extract(
-        oci_feature_ref: str, output_dir: Union[str, Path]
+        oci_feature_ref: str,
+        output_dir: Union[str, Path],
+        manifest: Optional[Dict[str, Any]] = None,
     ) -> None:
         OCIRegistry.download_and_extract_layer(
-            oci_input=oci_feature_ref, layer_num=0, output_dir=output_dir
+            oci_input=oci_feature_ref,
+            layer_num=0,
+            output_dir=output_dir,
+            manifest=manifest,
+        )
+
+    @staticmethod
+    def parse_devcontainer_feature(extraction_dir: Union[str, Path]) -> Feature:
+        return Feature.parse_file(
+            os.path.join(extraction_dir, OCIFeature.DEVCONTAINER_JSON_FILENAME)
         )
 
     @staticmethod
@@ -56,6 +72,30 @@ class OCIFeature:
                 oci_feature_ref=oci_feature_ref, output_dir=extraction_dir
             )
 
-            return Feature.parse_file(
-                os.path.join(extraction_dir, OCIFeature.DEVCONTAINER_JSON_FILENAME)
+            return OCIFeature.parse_devcontainer_feature(extraction_dir)
+
+    @staticmethod
+    def inspect(oci_feature_ref: str) -> Feature:
+        """
+        Returns the feature metadata without installing (or downloading) the
+        whole feature: it is taken from the manifest annotations when published
+        there, otherwise devcontainer-feature.json is read off the layer stream.
+        """
+        manifest = OCIRegistry.get_manifest(oci_feature_ref)
+
+        metadata = manifest.get("annotations", {}).get(
+            OCIFeature.DEVCONTAINER_METADATA_ANNOTATION
+        )
+        if metadata is not None:
+            return Feature.parse_raw(metadata)
+
+        feature_json = OCIRegistry.read_layer_member(
+            oci_input=oci_feature_ref,
+            layer_num=0,
+            member_name=OCIFeature.DEVCONTAINER_JSON_FILENAME,
+        )
+        if feature_json is None:
+            raise OCIFeature.FeatureMetadataNotFound(
+                f"{OCIFeature.DEVCONTAINER_JSON_FILENAME} was not found in {oci_feature_ref}"
             )
+        return Feature.parse_raw(feature_json)
@@ -1,17 +1,30 @@
+import concurrent.futures
 import logging
 import os
 import pwd
 import sys
 import tempfile
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
+from pydantic import BaseModel
+
+from nanolayer.installers.devcontainer_feature.feature_env_profile import (
+    FeatureEnvProfile,
+)
+from nanolayer.installers.devcontainer_feature.feature_install_state import (
+    FeatureInstallState,
+)
 from nanolayer.installers.devcontainer_feature.models.devcontainer_feature import (
     Feature,
 )
 from nanolayer.installers.devcontainer_feature.oci_feature import OCIFeature
+from nanolayer.utils.env_snapshot import EnvSnapshot
 from nanolayer.utils.invoker import Invoker
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+from nanolayer.utils.oci_layout import OCILayout
+from nanolayer.utils.oci_registry import OCIRegistry
+from nanolayer.utils.phase_report import PhaseReport
 from nanolayer.utils.settings import (
     ENV_CLI_LOCATION,
     ENV_FORCE_CLI_INSTALLATION,
@@ -30,6 +43,11 @@ class OCIFeatureInstaller:
     class OCIFeatureInstallerError(Exception):
         pass
 
+    class PrefetchedFeature(BaseModel):
+        feature: Feature
+        manifest_digest: str
+        already_installed: bool
+
     _ORDERED_BASE_REMOTE_USERS = ("vscode", "node", "codespace")
     _FALLBACK_USER_ID_A = (
         1000  # user 1000 (mostly the base user of the contianer eg. "ubuntu" etc)
@@ -43,6 +61,8 @@ class OCIFeatureInstaller:
 
     _PROFILE_DIR = "/etc/profile.d"
 
+    _MAX_PREFETCH_WORKERS = 8
+
     @classmethod
     def install(
         cls,
@@ -52,26 +72,321 @@ class OCIFeatureInstaller:
         remote_user: Optional[str] = None,
         verbose: bool = False,
         invoke_entrypoint: bool = False,
+        reinstall: bool = False,
+        env_snapshot: bool = False,
+        report_file: Optional[Union[str, Path]] = None,
+    ) -> None:
+        cls.install_many(
+            features=[(feature_ref, options or {})],
+            envs=envs,
+            remote_user=remote_user,
+            verbose=verbose,
+            invoke_entrypoint=invoke_entrypoint,
+            reinstall=reinstall,
+            env_snapshot=env_snapshot,
+            report_file=report_file,
+        )
+
+    @classmethod
+    def install_many(
+        cls,
+        features: List[Tuple[str, Dict[str, Union[str, bool]]]],
+        envs: Optional[Dict[str, str]] = None,
+        remote_user: Optional[str] = None,
+        verbose: bool = False,
+        invoke_entrypoint: bool = False,
+        max_workers: Optional[int] = None,
+        reinstall: bool = False,
+        env_snapshot: bool = False,
+        report_file: Optional[Union[str, Path]] = None,
+        install_order: Optional[List[str]] = None,
     ) -> None:
+        """
+        Installs the given (feature ref, options) pairs.
+        All features are downloaded and extracted concurrently, while their
+        install scripts run one at a time: a feature is installed once it is
+        on disk and every other requested feature listed in its installsAfter
+        was installed, ties broken by the order they were given in.
+        Features matching install_order (refs without a version, or ids, eg.
+        the overrideFeatureInstallOrder of a devcontainer.json) are installed
+        first, in that order, regardless of installsAfter.
+        Features already installed from the same manifest digest with the same
+        resolved options are skipped (neither downloaded nor reinstalled, nor
+        their entrypoint invoked), unless reinstall is set.
+        With env_snapshot (or NANOLAYER_ENV_SNAPSHOT), install scripts run in a
+        non-interactive bash given the environment of an interactive one,
+        captured once and only taken again after profile or rc files changed.
+        A summary of the time spent in each phase is printed at the end, and
+        written as json to report_file when given.
+        """
         if not LinuxInformationDesk.has_root_privileges():
             raise cls.NoPremissions(
                 "Installer must be run as root. Use sudo, su, or add 'USER root' to your Dockerfile before running this command."
             )
 
+        PhaseReport.reset()
+
+        resources = [cls.feature_resource(feature_ref) for feature_ref, _ in features]
+        if len(set(resources)) != len(resources):
+            raise cls.OCIFeatureInstallerError(
+                f"features were requested more than once: {', '.join(resources)}"
+            )
+
+        if max_workers is None:
+            max_workers = min(cls._MAX_PREFETCH_WORKERS, max(len(features), 1))
+
+        ordered: List[int] = []
+        for entry in install_order or []:
+            for idx, resource in enumerate(resources):
+                if idx not in ordered and cls._satisfies(entry, resource, None):
+                    ordered.append(idx)
+
+        install_state = FeatureInstallState.from_settings()
+        login_env_snapshot = (
+            EnvSnapshot.for_profile_dir(cls._PROFILE_DIR)
+            if env_snapshot or NanolayerSettings().env_snapshot
+            else None
+        )
+        installed_features: List[Feature] = []
+
+        with tempfile.TemporaryDirectory() as tempdir, concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            extraction_dirs = [
+                Path(tempdir).joinpath(str(idx)) for idx in range(len(features))
+            ]
+            # a single download serves both the feature metadata and the
+            # install script
+            futures = {
+                executor.submit(
+                    cls._prefetch_feature,
+                    feature_ref,
+                    extraction_dirs[idx],
+                    options,
+                    None if reinstall else install_state,
+                ): idx
+                for idx, (feature_ref, options) in enumerate(features)
+            }
+
+            prefetched: Dict[int, OCIFeatureInstaller.PrefetchedFeature] = {}
+            extracted: Dict[int, Feature] = {}
+            pending = list(range(len(features)))
+            try:
+                while pending:
+                    for future, idx in futures.items():
+                        if idx not in prefetched and future.done():
+                            prefetched[idx] = future.result()
+                            extracted[idx] = prefetched[idx].feature
+
+                    for idx in list(pending):
+                        if idx in prefetched and prefetched[idx].already_installed:
+                            logger.warning(
+                                "%s is already installed with the same options, skipping (use --reinstall to install it anyway)",
+                                features[idx][0],
+                            )
+                            pending.remove(idx)
+
+                    if not pending:
+                        break
+
+                    next_idx = cls._next_installable(
+                        pending, resources, extracted, ordered
+                    )
+                    if next_idx is None:
+                        downloading = [
+                            future for future in futures if not future.done()
+                        ]
+                        if not downloading:
+                            raise cls.OCIFeatureInstallerError(
+                                "circular installsAfter dependency between: "
+                                + ", ".join(features[idx][0] for idx in pending)
+                            )
+                        concurrent.futures.wait(
+                            downloading, return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        continue
+
+                    feature_ref, options = features[next_idx]
+                    logger.info("installing %s", feature_ref)
+                    with PhaseReport.feature(feature_ref):
+                        login_env = None
+                        if login_env_snapshot is not None:
+                            with PhaseReport.phase("env_snapshot"):
+                                login_env = login_env_snapshot.get()
+
+                        resolved_options = cls._install_extracted_feature(
+                            feature_obj=extracted[next_idx],
+                            extraction_dir=extraction_dirs[next_idx],
+                            options=dict(options),
+                            envs=dict(envs or {}),
+                            remote_user=remote_user,
+                            verbose=verbose,
+                            login_env=login_env,
+                        )
+                    cls._record_installation(
+                        install_state,
+                        feature_ref,
+                        prefetched[next_idx],
+                        resolved_options,
+                    )
+                    installed_features.append(extracted[next_idx])
+                    pending.remove(next_idx)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if invoke_entrypoint:
+            for feature_obj in installed_features:
+                if feature_obj.entrypoint is not None:
+                    Invoker.invoke(feature_obj.entrypoint)
+
+        token_stats = OCIRegistry.token_cache().stats
+        logger.warning(
+            "registry tokens: %d fetched, %d fetches avoided",
+            token_stats.fetches,
+            token_stats.fetches_avoided,
+        )
+
+        logger.warning("install report:\n%s", PhaseReport.summary())
+        if report_file is not None:
+            PhaseReport.write_json(report_file)
+
+    @classmethod
+    def _prefetch_feature(
+        cls,
+        feature_ref: str,
+        extraction_dir: Path,
+        options: Dict[str, Union[str, bool]],
+        install_state: Optional[FeatureInstallState],
+    ) -> "OCIFeatureInstaller.PrefetchedFeature":
+        with PhaseReport.feature(feature_ref):
+            manifest, manifest_digest = OCIRegistry.get_manifest_and_digest(feature_ref)
+
+            if install_state is not None:
+                record = install_state.find(manifest_digest)
+                if record is not None and record.options == (
+                    FeatureInstallState.normalize_options(
+                        cls._resolve_options(record.feature, dict(options))
+                    )
+                ):
+                    return OCIFeatureInstaller.PrefetchedFeature(
+                        feature=record.feature,
+                        manifest_digest=manifest_digest,
+                        already_installed=True,
+                    )
+
+            OCIFeature.download_and_extract(
+                oci_feature_ref=feature_ref,
+                output_dir=extraction_dir,
+                manifest=manifest,
+            )
+            return OCIFeatureInstaller.PrefetchedFeature(
+                feature=OCIFeature.parse_devcontainer_feature(extraction_dir),
+                manifest_digest=manifest_digest,
+                already_installed=False,
+            )
+
+    @classmethod
+    def _record_installation(
+        cls,
+        install_state: FeatureInstallState,
+        feature_ref: str,
+        prefetched: "OCIFeatureInstaller.PrefetchedFeature",
+        resolved_options: Dict[str, Union[str, bool]],
+    ) -> None:
+        try:
+            install_state.put(
+                FeatureInstallState.Record(
+                    id=prefetched.feature.id,
+                    feature_ref=feature_ref,
+                    manifest_digest=prefetched.manifest_digest,
+                    options=FeatureInstallState.normalize_options(resolved_options),
+                    feature=prefetched.feature,
+                )
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(
+                "could not record the installation of %s: %s", feature_ref, str(e)
+            )
+
+    @classmethod
+    def feature_resource(cls, feature_ref: str) -> str:
+        # the feature ref without its tag or digest
+        if OCILayout.is_layout_ref(feature_ref):
+            layout_dir, _ = OCILayout.parse(feature_ref)
+            return layout_dir.as_posix()
+        return OCIRegistry.parse_oci(feature_ref).resource
+
+    @classmethod
+    def _satisfies(
+        cls, dependency: str, resource: str, feature_id: Optional[str]
+    ) -> bool:
+        # installsAfter entries are feature refs without a version, or plain ids.
+        # Until a feature is downloaded its id is assumed to be the last part
+        # of its ref, as it is for every published feature
+        if "/" in dependency:
+            dependency = OCIRegistry.parse_oci(dependency).resource
+            if dependency.lower() == resource.lower():
+                return True
+        if feature_id is None:
+            feature_id = resource.rsplit("/", 1)[-1]
+        return dependency.rsplit("/", 1)[-1] == feature_id
+
+    @classmethod
+    def _next_installable(
+        cls,
+        pending: List[int],
+        resources: List[str],
+        extracted: Dict[int, Feature],
+        ordered: Optional[List[int]] = None,
+    ) -> Optional[int]:
+        for idx in ordered or []:
+            if idx in pending:
+                # before any other feature, whatever their installsAfter
+                return idx if idx in extracted else None
+
+        for idx in pending:
+            if idx not in extracted:
+                continue
+            blocked = any(
+                cls._satisfies(
+                    dependency,
+                    resources[other_idx],
+                    extracted[other_idx].id if other_idx in extracted else None,
+                )
+                for dependency in extracted[idx].installsAfter or []
+                for other_idx in pending
+                if other_idx != idx
+            )
+            if not blocked:
+                return idx
+        return None
+
+    @classmethod
+    def _install_extracted_feature(
+        cls,
+        feature_obj: Feature,
+        extraction_dir: Union[str, Path],
+        options: Optional[Dict[str, Union[str, bool]]] = None,
+        envs: Optional[Dict[str, str]] = None,
+        remote_user: Optional[str] = None,
+        verbose: bool = False,
+        login_env: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Union[str, bool]]:
         if options is None:
             options = {}
 
         if envs is None:
             envs = {}
 
-        feature_obj = OCIFeature.get_devcontainer_feature_obj(
-            oci_feature_ref=feature_ref
-        )
-
-        options = cls._resolve_options(feature_obj=feature_obj, options=options)
-        logger.info("resolved options: %s", str(options))
+        with PhaseReport.phase("options"):
+            options = cls._resolve_options(feature_obj=feature_obj, options=options)
+            logger.info("resolved options: %s", str(options))
 
-        remote_user_struct: pwd.struct_passwd = cls._resolve_remote_user(remote_user)
+            remote_user_struct: pwd.struct_passwd = cls._resolve_remote_user(
+                remote_user
+            )
         remote_user_name = remote_user_struct.pw_name
         remote_user_home = remote_user_struct.pw_dir
         logger.info("resolved remote user: %s", remote_user)
@@ -112,62 +427,35 @@ class OCIFeatureInstaller:
             ]
         )
 
-        with tempfile.TemporaryDirectory() as tempdir:
-            OCIFeature.download_and_extract(
-                oci_feature_ref=feature_ref, output_dir=tempdir
-            )
-
-            command = f"cd {tempdir} && chmod +x -R . && {env_variables_cmd} bash "
+        command = f"cd {extraction_dir} && chmod +x -R . && {env_variables_cmd} bash "
 
+        if login_env is None:
             # will make sure it will get the env variable that are
             # defined in various rc files
             command += " -i "
 
-            # most scripts assume non interactive (plain #!/bin/bash shebang),
-            # disabling history expansion will make scripts behave closer to non-interactive way
-            command += " +H "
+        # most scripts assume non interactive (plain #!/bin/bash shebang),
+        # disabling history expansion will make scripts behave closer to non-interactive way
+        command += " +H "
 
-            command += " -x " if verbose else ""
+        command += " -x " if verbose else ""
 
-            command += f"./{cls._FEATURE_ENTRYPOINT}"
+        command += f"./{cls._FEATURE_ENTRYPOINT}"
 
-            Invoker.invoke(command)
+        with PhaseReport.phase("install_script"):
+            Invoker.invoke(command, envs=login_env)
 
+        with PhaseReport.phase("set_envs"):
             cls._set_envs(feature_obj)
 
-        if invoke_entrypoint and feature_obj.entrypoint is not None:
-            Invoker.invoke(feature_obj.entrypoint)
+        return options
 
     @classmethod
     def _set_envs(cls, feature: Feature) -> None:
-        if feature.containerEnv is None and feature.entrypoint is None:
-            return
-
-        feature_profile_dir = Path(cls._PROFILE_DIR)
-        feature_profile_dir.mkdir(exist_ok=True, parents=True)
-        feature_profile_file = feature_profile_dir.joinpath(
-            f"nanolayer-{feature.id}.sh"
+        FeatureEnvProfile.from_settings(cls._PROFILE_DIR).update(
+            feature.id, feature.containerEnv or {}
         )
 
-        if not feature_profile_file.exists():
-            feature_profile_file.touch()
-
-        with open(feature_profile_file, "r") as f:
-            current_content = f.read()
-
-        modified = False
-
-        if feature.containerEnv is not None:
-            for env_name, env_value in feature.containerEnv.items():
-                statement = f"export {env_name}={env_value}"
-                if statement not in current_content:
-                    current_content += f"\n{statement}"
-                    modified = True
-
-        if modified:
-            with open(feature_profile_file, "w") as f:
-                f.write(current_content)
-
     @classmethod
     def _escape_quotes(cls, value: str) -> str:
         return value.replace('"', '\\"')
@@ -3,7 +3,6 @@ import os
 import platform
 import shutil
 import tempfile
-import urllib
 from pathlib import Path
 from typing import Dict, List, Optional, Union
 
@@ -11,6 +10,7 @@ from nanolayer.installers.gh_release.resolvers.asset_resolver import AssetResolv
 from nanolayer.installers.gh_release.resolvers.binary_resolver import BinaryResolver
 from nanolayer.installers.gh_release.resolvers.release_resolver import ReleaseResolver
 from nanolayer.installers.gh_release.utils.archive import Archive
+from nanolayer.utils.http_client import HttpClient
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
 logger = logging.getLogger(__name__)
@@ -32,20 +32,8 @@ class GHReleaseInstaller:
 
     @classmethod
     def _get_asset(cls, url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
-        if not url.startswith("http"):
-            raise ValueError("only http/https links are permited")
-
-        if headers is None:
-            headers = {}
-
-        if "User-Agent" not in headers:
-            headers["User-Agent"] = "nanolayer"
-
-        request = urllib.request.Request(url=url, headers=headers)
-
-        response = urllib.request.urlopen(request)  # nosec
-
-        return response.read()
+        with HttpClient.request(url, headers=headers) as response:
+            return response.read()
 
     @classmethod
     def _download_asset(cls, url: str, target: Path) -> None:
@@ -55,8 +43,8 @@ class GHReleaseInstaller:
 
         target.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(target, "wb") as f:
-            f.write(cls._get_asset(url))
+        with HttpClient.request(url) as response, open(target, "wb") as f:
+            shutil.copyfileobj(response, f)
 
     @classmethod
     def _resolve_and_validate_dir(
@@ -1,7 +1,5 @@
-import json
 import logging
 import re
-import urllib
 from copy import deepcopy
 from enum import Enum
 from typing import Any, Dict, List, Optional
@@ -9,6 +7,7 @@ from urllib.error import HTTPError
 
 from pydantic import BaseModel, Extra
 
+from nanolayer.utils.http_client import HttpClient
 from nanolayer.utils.linux_information_desk import LinuxInformationDesk
 
 logger = logging.getLogger(__name__)
@@ -125,16 +124,15 @@ class AssetResolver:
     @classmethod
     def _get_release_dict(cls, repo: str, tag: str) -> Dict[str, Any]:
         try:
-            response = urllib.request.urlopen(
+            return HttpClient.get_json(
                 f"https://api.github.com/repos/{repo}/releases/tags/{tag}"
-            )  # nosec
+            )
         except HTTPError as e:
             if e.code == 404:
                 raise cls.NoReleaseError(
                     f"no release exists for repo:{repo} and tag: {tag}"
                 ) from e
             raise e
-        return json.loads(response.read())
 
     @classmethod
     def _get_release_assets(
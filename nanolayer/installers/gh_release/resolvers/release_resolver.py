@@ -1,13 +1,13 @@
-import json
 import logging
 import re
-import urllib
 from typing import Any, Dict, List, Optional
 import distutils.spawn
 
 import invoke
 from natsort import natsorted
 
+from nanolayer.utils.http_client import HttpClient
+
 logger = logging.getLogger(__name__)
 
 
@@ -73,10 +73,9 @@ class ReleaseResolver:
     def get_latest_release_tag(
         cls, repo: str, release_tag_regex: Optional[str] = None
     ) -> str:
-        response = urllib.request.urlopen(
+        release_dicts = HttpClient.get_json(
             f"https://api.github.com/repos/{repo}/releases"
-        )  # nosec
-        release_dicts = json.loads(response.read())
+        )
         release_tags = [release_dict["tag_name"] for release_dict in release_dicts]
         if release_tag_regex is not None:
             release_tags = cls._filter_tags_by_regex(release_tags, release_tag_regex)
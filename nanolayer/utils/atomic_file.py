@@ -0,0 +1,57 @@
+import contextlib
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+
+class AtomicFile:
+    """
+    Writes files through a hidden sibling temp file renamed over them once
+    complete, so readers (or a concurrent build) never see a partial file.
+    The temp file is removed if writing it fails.
+    """
+
+    @staticmethod
+    @contextlib.contextmanager
+    def temp_path(target: Path) -> Iterator[Path]:
+        """
+        Yields the path to write the content of target to, which is moved
+        into place if the block exits without an exception.
+        """
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = target.parent.joinpath(f".{target.name}.{uuid.uuid4().hex}.partial")
+        try:
+            yield temp_file
+            os.replace(temp_file, target)
+        except BaseException:
+            temp_file.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    @contextlib.contextmanager
+    def writer(target: Path, mode: Optional[int] = None) -> Iterator[BinaryIO]:
+        """
+        Yields a file to write the content of target to. Unless mode is given
+        the file gets the default permissions, otherwise it has them from its
+        creation on (regardless of the umask).
+        """
+        with AtomicFile.temp_path(target) as temp_file:
+            fd = os.open(
+                temp_file,
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o666 if mode is None else mode,
+            )
+            if mode is not None:
+                os.fchmod(fd, mode)
+            with os.fdopen(fd, "wb") as f:
+                yield f
+
+    @staticmethod
+    def write_bytes(target: Path, content: bytes, mode: Optional[int] = None) -> None:
+        with AtomicFile.writer(target, mode=mode) as f:
+            f.write(content)
+
+    @staticmethod
+    def write_text(target: Path, content: str, mode: Optional[int] = None) -> None:
+        AtomicFile.write_bytes(target, content.encode(), mode=mode)
@@ -0,0 +1,143 @@
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class BlobCache:
+    """
+    Content addressed on-disk cache of OCI blobs, stored as
+    <location>/blobs/<algorithm>/<hex digest>.
+    Entries are verified against their digest whenever they are read, and the
+    least recently used ones are evicted once the cache exceeds its byte budget.
+    """
+
+    BLOBS_DIR = "blobs"
+    READ_CHUNK_SIZE = 1024 * 1024
+
+    class CacheStats(BaseModel):
+        location: str
+        entries: int
+        size: int
+        max_size: int
+
+    def __init__(self, location: Union[str, Path], max_size: int) -> None:
+        self.location = Path(location)
+        self.max_size = max_size
+
+    @classmethod
+    def from_settings(cls) -> Optional["BlobCache"]:
+        settings = NanolayerSettings()
+        # opt-in: a default location would leave the blobs in the image layer
+        if not settings.enable_cache or not settings.cache_dir:
+            return None
+        return cls(location=settings.cache_dir, max_size=settings.cache_max_size)
+
+    def _entry_path(self, digest: str) -> Path:
+        algorithm, _, hexdigest = digest.partition(":")
+        if not algorithm or not hexdigest or "/" in digest:
+            raise ValueError(f"invalid digest: {digest}")
+        return self.location.joinpath(self.BLOBS_DIR, algorithm, hexdigest)
+
+    def _entries(self) -> List[Path]:
+        blobs_dir = self.location.joinpath(self.BLOBS_DIR)
+        if not blobs_dir.is_dir():
+            return []
+        return [
+            entry
+            for algorithm_dir in blobs_dir.iterdir()
+            if algorithm_dir.is_dir()
+            for entry in algorithm_dir.iterdir()
+            if entry.is_file() and not entry.name.startswith(".")
+        ]
+
+    def _verify(self, entry: Path, digest: str) -> bool:
+        algorithm, _, hexdigest = digest.partition(":")
+        hasher = hashlib.new(algorithm)
+        with open(entry, "rb") as f:
+            while True:
+                chunk = f.read(self.READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        return hasher.hexdigest() == hexdigest
+
+    def get(self, digest: str) -> Optional[Path]:
+        entry = self._entry_path(digest)
+        if not entry.is_file():
+            return None
+
+        if not self._verify(entry, digest):
+            logger.warning("removing corrupted cache entry %s", entry)
+            entry.unlink(missing_ok=True)
+            return None
+
+        # mtime doubles as the "last used" timestamp for LRU eviction
+        os.utime(entry)
+        return entry
+
+    def put(self, digest: str, source_file: Union[str, Path]) -> Path:
+        entry = self._entry_path(digest)
+        with AtomicFile.temp_path(entry) as temp_file:
+            try:
+                os.link(source_file, temp_file)
+            except OSError:
+                shutil.copyfile(source_file, temp_file)
+
+        self.prune()
+        return entry
+
+    @contextlib.contextmanager
+    def writer(self, digest: str) -> Iterator[BinaryIO]:
+        """
+        Yields a file to stream the blob into. The entry is only committed if
+        the block exits without an exception, so callers are expected to verify
+        the digest of what they wrote before leaving it.
+        """
+        with AtomicFile.writer(self._entry_path(digest)) as f:
+            yield f
+
+        self.prune()
+
+    def stats(self) -> "BlobCache.CacheStats":
+        entries = self._entries()
+        return BlobCache.CacheStats(
+            location=self.location.as_posix(),
+            entries=len(entries),
+            size=sum(entry.stat().st_size for entry in entries),
+            max_size=self.max_size,
+        )
+
+    def prune(self, max_size: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Evicts least recently used entries until the cache fits in max_size
+        bytes (defaults to the cache budget).
+        Returns the amount of removed entries and removed bytes.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = [(entry, entry.stat()) for entry in self._entries()]
+        total_size = sum(entry_stat.st_size for _, entry_stat in entries)
+
+        removed_entries = 0
+        removed_bytes = 0
+        for entry, entry_stat in sorted(entries, key=lambda item: item[1].st_mtime):
+            if total_size <= max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total_size -= entry_stat.st_size
+            removed_entries += 1
+            removed_bytes += entry_stat.st_size
+
+        return removed_entries, removed_bytes
@@ -0,0 +1,90 @@
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class CommandTrace:
+    """
+    Process wide record of every command run through the Invoker: when it
+    started and ended, its return code, and its cpu time and peak rss when the
+    backend it ran on knows them. When a trace file is set, each command is
+    also appended to it as a json line as soon as it ends.
+    Nothing is recorded until tracing is enabled (with NANOLAYER_TRACE).
+    """
+
+    class Command(BaseModel):
+        command: str
+        started_at: float
+        ended_at: float
+        wall_time: float
+        return_code: int
+        user_time: Optional[float] = None
+        system_time: Optional[float] = None
+        max_rss: Optional[int] = None  # kilobytes
+
+    _commands: List[Command] = []
+    _enabled = False
+    _trace_file: Optional[Path] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def reset(
+        cls, enabled: bool = False, trace_file: Optional[Union[str, Path]] = None
+    ) -> None:
+        with cls._lock:
+            cls._commands = []
+            cls._enabled = enabled
+            cls._trace_file = Path(trace_file) if trace_file else None
+
+    @classmethod
+    def record(cls, command: "CommandTrace.Command") -> None:
+        if not cls._enabled:
+            return
+        with cls._lock:
+            cls._commands.append(command)
+            if cls._trace_file is not None:
+                with cls._trace_file.open("a") as f:
+                    f.write(command.json() + "\n")
+
+    @classmethod
+    def commands(cls) -> List["CommandTrace.Command"]:
+        with cls._lock:
+            return list(cls._commands)
+
+    @staticmethod
+    def _shorten(command: str, width: int) -> str:
+        command = " ".join(command.split())
+        if len(command) > width:
+            return command[: width - 3] + "..."
+        return command
+
+    @classmethod
+    def summary(cls, width: int = 60) -> str:
+        commands = sorted(cls.commands(), key=lambda c: c.wall_time, reverse=True)
+
+        lines = [f"{'command':<{width}}{'rc':>5}{'wall':>10}{'cpu':>10}{'max rss':>12}"]
+        for command in commands:
+            if command.user_time is None or command.system_time is None:
+                cpu = "-"
+            else:
+                cpu = f"{command.user_time + command.system_time:.2f}s"
+            max_rss = "-" if command.max_rss is None else f"{command.max_rss}KB"
+            lines.append(
+                f"{cls._shorten(command.command, width):<{width}}"
+                f"{command.return_code:>5}{command.wall_time:>9.2f}s"
+                f"{cpu:>10}{max_rss:>12}"
+            )
+        lines.append(
+            f"{len(commands)} commands, {sum(c.wall_time for c in commands):.2f}s"
+        )
+        return "\n".join(lines)
+
+    @classmethod
+    def log_summary(cls) -> None:
+        if cls.commands():
+            logger.warning("commands by duration:\n%s", cls.summary())
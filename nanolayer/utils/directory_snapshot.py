@@ -0,0 +1,122 @@
+import contextlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from nanolayer.utils.invoker import Invoker
+
+
+class DirectorySnapshot:
+    """
+    Puts a directory (eg. /var/lib/apt/lists) back the way it was after
+    commands modified it, without copying its content when possible.
+    The snapshot is taken next to the directory, so on the same filesystem,
+    out of hardlinks to its files: package managers replace their files by
+    renaming new ones over them, which leaves the linked ones untouched.
+    Restoring renames the snapshot over the directory.
+    Files which can't be hardlinked (eg. when the snapshot had to be taken on
+    another filesystem) are copied.
+    Nothing is taken nor restored when commands are not run (eg. in plan mode),
+    as they don't modify the directory then.
+    """
+
+    SNAPSHOT_PREFIX = ".nanolayer-snapshot-"
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.linked_files = 0
+        self.copied_files = 0
+        self._snapshot_root: Optional[Path] = None
+
+    @property
+    def snapshot_path(self) -> Optional[Path]:
+        if self._snapshot_root is None:
+            return None
+        return self._snapshot_root.joinpath(self.path.name)
+
+    @staticmethod
+    def _chown_like(path: Path, stat: os.stat_result) -> None:
+        try:
+            os.chown(path, stat.st_uid, stat.st_gid, follow_symlinks=False)
+        except PermissionError:
+            # like cp -p, ownership is only kept when we may set it
+            pass
+
+    def _clone(self, source: Path, target: Path) -> None:
+        target.mkdir()
+        for entry in os.scandir(source):
+            target_entry = target.joinpath(entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target_entry)
+            elif entry.is_dir():
+                self._clone(Path(entry.path), target_entry)
+            else:
+                try:
+                    os.link(entry.path, target_entry)
+                    self.linked_files += 1
+                except OSError:
+                    shutil.copy2(entry.path, target_entry)
+                    self._chown_like(target_entry, entry.stat())
+                    self.copied_files += 1
+
+        shutil.copystat(source, target)
+        self._chown_like(target, source.stat())
+
+    @classmethod
+    def clone(cls, source: Union[str, Path], target: Union[str, Path]) -> None:
+        """
+        Hardlinks (or copies) the tree at source into target, which must not
+        exist yet.
+        """
+        cls(source)._clone(Path(source), Path(target))
+
+    def take(self) -> None:
+        if not self.path.is_dir():
+            # restoring removes whatever is created in the meantime
+            return
+
+        try:
+            snapshot_root = tempfile.mkdtemp(
+                prefix=self.SNAPSHOT_PREFIX, dir=self.path.parent
+            )
+        except OSError:
+            snapshot_root = tempfile.mkdtemp(prefix=self.SNAPSHOT_PREFIX)
+        self._snapshot_root = Path(snapshot_root)
+
+        try:
+            self._clone(self.path, self.snapshot_path)
+        except BaseException:
+            self.discard()
+            raise
+
+    def restore(self) -> None:
+        if self.path.is_symlink() or self.path.is_file():
+            self.path.unlink()
+        elif self.path.exists():
+            shutil.rmtree(self.path)
+
+        if self.snapshot_path is not None:
+            # a rename when the snapshot is on the same filesystem
+            shutil.move(self.snapshot_path.as_posix(), self.path.as_posix())
+        self.discard()
+
+    def discard(self) -> None:
+        if self._snapshot_root is not None:
+            shutil.rmtree(self._snapshot_root, ignore_errors=True)
+            self._snapshot_root = None
+
+    @classmethod
+    @contextlib.contextmanager
+    def preserved(cls, path: Union[str, Path]) -> Iterator["DirectorySnapshot"]:
+        snapshot = cls(path)
+        if not Invoker.executes():
+            yield snapshot
+            return
+
+        snapshot.take()
+        try:
+            yield snapshot
+        finally:
+            snapshot.restore()
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class EnvSnapshot:
+    """
+    Environment of an interactive bash (with every rc and profile file
+    sourced), captured once and reused to run scripts with a plain
+    non-interactive bash instead.
+    The snapshot is taken again whenever one of the watched files (or the
+    content of a watched directory) changed since it was captured.
+    """
+
+    DEFAULT_WATCHED_PATHS = (
+        "/etc/environment",
+        "/etc/profile",
+        "/etc/bash.bashrc",
+        "/etc/bashrc",
+        "~/.profile",
+        "~/.bash_profile",
+        "~/.bashrc",
+    )
+
+    # belong to the capturing shell itself, not to the environment
+    _SHELL_VARIABLES = ("_", "SHLVL", "PWD", "OLDPWD")
+
+    class EnvSnapshotError(Exception):
+        pass
+
+    def __init__(self, watched_paths: List[Union[str, Path]]) -> None:
+        self.watched_paths = [Path(os.path.expanduser(path)) for path in watched_paths]
+        self._env: Optional[Dict[str, str]] = None
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def for_profile_dir(cls, profile_dir: Union[str, Path]) -> "EnvSnapshot":
+        return cls(watched_paths=[*cls.DEFAULT_WATCHED_PATHS, profile_dir])
+
+    def fingerprint(self) -> str:
+        hasher = hashlib.sha256()
+        for watched_path in self.watched_paths:
+            paths = [watched_path]
+            if watched_path.is_dir():
+                paths += sorted(watched_path.iterdir())
+            for path in paths:
+                try:
+                    stat = path.stat()
+                except OSError:
+                    hasher.update(f"{path}:missing\n".encode())
+                    continue
+                hasher.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+        return hasher.hexdigest()
+
+    @classmethod
+    def capture(cls) -> Dict[str, str]:
+        result = subprocess.run(  # nosec
+            ["bash", "-i", "-c", "env -0"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            env={**os.environ, "HISTFILE": "/dev/null"},
+        )
+        if result.returncode != 0:
+            raise cls.EnvSnapshotError(
+                f"could not capture the shell environment: {result.stderr.decode(errors='replace')}"
+            )
+
+        env = {}
+        for entry in result.stdout.decode(errors="replace").split("\0"):
+            name, separator, value = entry.partition("=")
+            if separator and name not in cls._SHELL_VARIABLES:
+                env[name] = value
+        return env
+
+    def get(self) -> Dict[str, str]:
+        fingerprint = self.fingerprint()
+        if self._env is None or fingerprint != self._fingerprint:
+            logger.info("capturing the shell environment")
+            self._env = self.capture()
+            self._fingerprint = fingerprint
+        return dict(self._env)
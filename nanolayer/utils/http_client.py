@@ -0,0 +1,279 @@
+import gzip
+import http.client
+import io
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import urllib
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Shared http(s) client used for every network call nanolayer makes.
+    Connections are kept alive and reused per host (and per thread), JSON
+    endpoints are asked for gzip encoded responses, and failed requests are
+    retried with jittered exponential backoff.
+    Errors are raised as urllib.error.HTTPError so callers can treat them the
+    same way they treat urllib errors. Hosts that have to be reached through
+    a proxy are delegated to urllib, which already knows how to talk to them.
+    """
+
+    USER_AGENT = "nanolayer"
+    DEFAULT_TIMEOUT = 30
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.5
+    MAX_REDIRECTS = 5
+
+    REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    RETRY_EXCEPTIONS = (
+        ConnectionError,
+        socket.timeout,
+        http.client.HTTPException,
+    )
+
+    _pool = threading.local()
+
+    class Response:
+        def __init__(
+            self,
+            url: str,
+            response: Any,
+            release: Optional[Callable[[bool], None]] = None,
+        ) -> None:
+            self.url = url
+            self.status: int = response.status
+            self.headers: http.client.HTTPMessage = response.headers
+            self._response = response
+            self._release = release
+            self._reader: BinaryIO = response
+            if (self.headers.get("Content-Encoding") or "").lower() == "gzip":
+                self._reader = gzip.GzipFile(fileobj=response)  # type: ignore
+
+        def _fully_consumed(self) -> bool:
+            return self._response.isclosed()
+
+        def _release_connection(self) -> None:
+            if self._release is not None:
+                release, self._release = self._release, None
+                release(self._fully_consumed())
+
+        def read(self, amt: Optional[int] = None) -> bytes:
+            data = self._reader.read() if amt is None else self._reader.read(amt)
+            HttpClient._count_received(len(data))
+            if self._fully_consumed():
+                self._release_connection()
+            return data
+
+        def close(self) -> None:
+            self._release_connection()
+            self._response.close()
+
+        def __enter__(self) -> "HttpClient.Response":
+            return self
+
+        def __exit__(self, *args: Any) -> None:
+            self.close()
+
+    @classmethod
+    def _count_received(cls, size: int) -> None:
+        cls._pool.bytes_received = cls.bytes_received() + size
+
+    @classmethod
+    def bytes_received(cls) -> int:
+        """
+        Response body bytes read so far by the calling thread.
+        """
+        return getattr(cls._pool, "bytes_received", 0)
+
+    @classmethod
+    def _connections(cls) -> Dict[Tuple[str, str], http.client.HTTPConnection]:
+        if not hasattr(cls._pool, "connections"):
+            cls._pool.connections = {}
+        return cls._pool.connections
+
+    @classmethod
+    def _acquire_connection(
+        cls, scheme: str, netloc: str, timeout: float
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        connection = cls._connections().pop((scheme, netloc), None)
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=timeout), False
+        return http.client.HTTPConnection(netloc, timeout=timeout), False
+
+    @classmethod
+    def _release_connection(
+        cls,
+        scheme: str,
+        netloc: str,
+        connection: http.client.HTTPConnection,
+        reusable: bool,
+    ) -> None:
+        connections = cls._connections()
+        if reusable and (scheme, netloc) not in connections:
+            connections[(scheme, netloc)] = connection
+        else:
+            connection.close()
+
+    @classmethod
+    def close_connections(cls) -> None:
+        connections = cls._connections()
+        while connections:
+            _, connection = connections.popitem()
+            connection.close()
+
+    @staticmethod
+    def _uses_proxy(scheme: str, host: str) -> bool:
+        return scheme in urllib.request.getproxies() and not (
+            urllib.request.proxy_bypass(host)
+        )
+
+    @classmethod
+    def _send(
+        cls, url: str, headers: Dict[str, str], method: str, timeout: float
+    ) -> "HttpClient.Response":
+        parsed_url = urllib.parse.urlsplit(url)
+        scheme, netloc = parsed_url.scheme, parsed_url.netloc
+
+        if cls._uses_proxy(scheme, parsed_url.hostname or ""):
+            request = urllib.request.Request(url=url, headers=headers, method=method)
+            return HttpClient.Response(
+                url, urllib.request.urlopen(request, timeout=timeout)  # nosec
+            )
+
+        target = parsed_url.path or "/"
+        if parsed_url.query:
+            target += f"?{parsed_url.query}"
+
+        connection, reused = cls._acquire_connection(scheme, netloc, timeout)
+        try:
+            connection.request(method, target, headers=headers)
+            response = connection.getresponse()
+        except cls.RETRY_EXCEPTIONS:
+            connection.close()
+            if not reused:
+                raise
+            # the server dropped the idle keep-alive connection, retry once on
+            # a fresh one without counting it as a failed attempt
+            connection, _ = cls._acquire_connection(scheme, netloc, timeout)
+            try:
+                connection.request(method, target, headers=headers)
+                response = connection.getresponse()
+            except BaseException:
+                connection.close()
+                raise
+
+        def release(reusable: bool) -> None:
+            cls._release_connection(
+                scheme, netloc, connection, reusable and not response.will_close
+            )
+
+        return HttpClient.Response(url, response, release)
+
+    @classmethod
+    def request(
+        cls,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        method: str = "GET",
+        timeout: Optional[float] = None,
+        accept_gzip: bool = False,
+        retries: Optional[int] = None,
+    ) -> "HttpClient.Response":
+        if not url.startswith("http"):
+            raise ValueError("only http/https links are permited")
+
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", cls.USER_AGENT)
+        if accept_gzip:
+            headers.setdefault("Accept-Encoding", "gzip")
+
+        if timeout is None:
+            timeout = cls.DEFAULT_TIMEOUT
+        if retries is None:
+            retries = cls.MAX_RETRIES
+
+        attempt = 0
+        redirects = 0
+        while True:
+            try:
+                response = cls._send(url, headers, method, timeout)
+            except urllib.error.HTTPError as e:
+                # only raised when delegating to urllib
+                if e.code not in cls.RETRY_STATUS_CODES or attempt >= retries:
+                    raise
+                logger.warning("request to %s returned %d, retrying", url, e.code)
+                cls._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+            except cls.RETRY_EXCEPTIONS as e:
+                if attempt >= retries:
+                    raise
+                logger.warning("request to %s failed (%s), retrying", url, str(e))
+                cls._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+
+            if 200 <= response.status < 300:
+                return response
+
+            body = response.read()
+            response.close()
+
+            if response.status in cls.REDIRECT_STATUS_CODES:
+                location = response.headers.get("Location")
+                if location is None or redirects >= cls.MAX_REDIRECTS:
+                    raise urllib.error.HTTPError(
+                        url, response.status, "bad redirect", response.headers, None
+                    )
+                redirected_url = urllib.parse.urljoin(url, location)
+                if (
+                    urllib.parse.urlsplit(redirected_url).netloc
+                    != urllib.parse.urlsplit(url).netloc
+                ):
+                    # credentials are never forwarded to another host
+                    headers.pop("Authorization", None)
+                url = redirected_url
+                redirects += 1
+                continue
+
+            if response.status in cls.RETRY_STATUS_CODES and attempt < retries:
+                logger.warning(
+                    "request to %s returned %d, retrying", url, response.status
+                )
+                cls._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+
+            raise urllib.error.HTTPError(
+                url,
+                response.status,
+                http.client.responses.get(response.status, ""),
+                response.headers,
+                io.BytesIO(body),
+            )
+
+    @classmethod
+    def _sleep_before_retry(cls, attempt: int) -> None:
+        # full jitter, so concurrent builds hitting the same failure spread out
+        time.sleep(random.uniform(0, cls.RETRY_BACKOFF * (2**attempt)))  # nosec
+
+    @classmethod
+    def get_json(cls, url: str, headers: Optional[Dict[str, str]] = None) -> Any:
+        with cls.request(url, headers=headers, accept_gzip=True) as response:
+            return json.loads(response.read())
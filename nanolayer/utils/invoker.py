@@ -1,8 +1,21 @@
+import contextlib
 import os
 import sys
-from typing import Dict, Optional, Type
+import threading
+import time
+from typing import Dict, Iterator, Optional, Type
 
-import invoke
+from nanolayer.utils.command_trace import CommandTrace
+from nanolayer.utils.invoker_backends import (
+    InvokerBackend,
+    PlanBackend,
+    PtyBackend,
+    RecordingBackend,
+    ReplayBackend,
+    ShellSessionBackend,
+    SubprocessBackend,
+)
+from nanolayer.utils.settings import NanolayerSettings
 
 sys.stdout.reconfigure(
     encoding="utf-8"
@@ -13,13 +26,28 @@ sys.stderr.reconfigure(
 
 
 class Invoker:
+    # how much of the output of a command is kept for its error message
+    OUTPUT_TAIL_SIZE = 16 * 1024
+
+    _local = threading.local()
+    _backend_override: Optional[InvokerBackend] = None
+
+    class InvokerMode:
+        plan = "plan"
+        record = "record"
+        replay = "replay"
+
     class InvokerException(Exception):
-        def __init__(self, command: str, error: str) -> None:
+        def __init__(self, command: str, error: str, output_tail: str = "") -> None:
             self.command = command
             self.error = error
+            self.output_tail = output_tail
 
         def __str__(self):
-            return f"The command '{self.command}' failed. error: {self.error}. see logs for details."
+            message = f"The command '{self.command}' failed. error: {self.error}. see logs for details."
+            if self.output_tail:
+                message += f"\nlast output:\n{self.output_tail}"
+            return message
 
     @staticmethod
     def check_root_privileges() -> None:
@@ -34,8 +62,11 @@ class Invoker:
         exception_class: Type["Invoker.InvokerException"] = InvokerException,
         clean_history: bool = True,
         envs: Optional[Dict[str, str]] = None,
+        pty: Optional[bool] = None,
     ) -> int:
-        Invoker.check_root_privileges()
+        backend = Invoker.backend(pty=pty)
+        if backend.requires_root:
+            Invoker.check_root_privileges()
 
         if envs is None:
             envs = {}
@@ -45,19 +76,111 @@ class Invoker:
         if "DEBIAN_FRONTEND" not in envs:
             envs["DEBIAN_FRONTEND"] = "noninteractive"
 
-        response = invoke.run(
-            command,
-            out_stream=sys.stdout,
-            err_stream=sys.stderr,
-            pty=True,
-            warn=True,
-            echo=True,
-            env=envs,
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            result = backend.run(command, envs=envs)
+        except ShellSessionBackend.SessionClosed as e:
+            raise exception_class(command=command, error=str(e)) from e
+        CommandTrace.record(
+            CommandTrace.Command(
+                command=command,
+                started_at=started_at,
+                ended_at=time.time(),
+                wall_time=time.perf_counter() - start,
+                return_code=result.return_code,
+                user_time=result.user_time,
+                system_time=result.system_time,
+                max_rss=result.max_rss,
+            )
         )
 
-        if raise_on_failure and not response.ok:
+        if raise_on_failure and result.return_code != 0:
             raise exception_class(
-                command=command, error=f"Return Code: {response.return_code}"
+                command=command,
+                error=f"Return Code: {result.return_code}",
+                output_tail=result.output_tail,
             )
 
-        return response.return_code
+        return result.return_code
+
+    @staticmethod
+    def backend(pty: Optional[bool] = None) -> InvokerBackend:
+        """
+        Commands run without a pty unless asked to (or NANOLAYER_INVOKER_PTY is
+        set), in which case they run through invoke as they used to.
+        A backend set with use_backend() (or NANOLAYER_INVOKER_MODE) takes
+        precedence.
+        """
+        if Invoker._backend_override is not None:
+            return Invoker._backend_override
+        if pty is None:
+            pty = NanolayerSettings().invoker_pty
+        if pty:
+            return PtyBackend(tail_size=Invoker.OUTPUT_TAIL_SIZE)
+        session: Optional[ShellSessionBackend] = getattr(
+            Invoker._local, "session", None
+        )
+        if session is not None:
+            return session
+        return SubprocessBackend(tail_size=Invoker.OUTPUT_TAIL_SIZE)
+
+    @staticmethod
+    def executes() -> bool:
+        """
+        False when invoked commands are not actually run (eg. in plan or
+        replay mode), in which case nothing else must be changed either.
+        """
+        return Invoker.backend().executes
+
+    @staticmethod
+    @contextlib.contextmanager
+    def session() -> Iterator[None]:
+        """
+        Within this block, commands invoked (without a pty) on this thread run
+        one after the other in a single long-lived shell instead of a new one
+        each. Every command still gets its own return code, so failures are
+        reported per command as usual. Sessions don't nest, an inner block
+        reuses the outer session.
+        """
+        if getattr(Invoker._local, "session", None) is not None:
+            yield
+            return
+
+        session = ShellSessionBackend(tail_size=Invoker.OUTPUT_TAIL_SIZE)
+        Invoker._local.session = session
+        try:
+            yield
+        finally:
+            Invoker._local.session = None
+            session.close()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def use_backend(backend: InvokerBackend) -> Iterator[InvokerBackend]:
+        """
+        Within this block, every invoked command (on any thread) runs on the
+        given backend, eg. a ReplayBackend to exercise installers without
+        running anything.
+        """
+        previous = Invoker._backend_override
+        Invoker.set_backend(backend)
+        try:
+            yield backend
+        finally:
+            Invoker.set_backend(previous)
+
+    @staticmethod
+    def set_backend(backend: Optional[InvokerBackend]) -> None:
+        Invoker._backend_override = backend
+
+    @staticmethod
+    def mode_backend(mode: str, fixture_file: str = "") -> InvokerBackend:
+        if mode == Invoker.InvokerMode.plan:
+            return PlanBackend()
+        if not fixture_file:
+            raise ValueError(f"invoker mode {mode} requires a fixture file")
+        if mode == Invoker.InvokerMode.record:
+            return RecordingBackend(Invoker.backend(), fixture_file=fixture_file)
+        if mode == Invoker.InvokerMode.replay:
+            return ReplayBackend(fixture_file=fixture_file)
+        raise ValueError(f"unknown invoker mode: {mode}")
@@ -0,0 +1,471 @@
+import codecs
+import os
+import re
+import resource
+import selectors
+import shlex
+import subprocess
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple, Union
+
+import invoke
+from pydantic import BaseModel
+
+
+class OutputTail:
+    """
+    Ring buffer keeping the last max_size bytes written to it.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data[-self.max_size :]
+        if len(self._buffer) > self.max_size:
+            del self._buffer[: len(self._buffer) - self.max_size]
+
+    def getvalue(self) -> str:
+        return self._buffer.decode(errors="replace")
+
+
+class InvokerBackend:
+    """
+    Runs a shell command, streaming its output to ours, and returns its
+    return code with the tail of its output (for error messages).
+    """
+
+    class Result(BaseModel):
+        return_code: int
+        output_tail: str = ""
+        # cpu seconds and peak rss (in kilobytes) of the command, when known
+        user_time: Optional[float] = None
+        system_time: Optional[float] = None
+        max_rss: Optional[int] = None
+
+    requires_root = True
+    # False for backends which don't actually run commands, around which
+    # the changes nanolayer makes itself (eg. to files) must be skipped too
+    executes = True
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> "InvokerBackend.Result":
+        raise NotImplementedError()
+
+
+class SubprocessBackend(InvokerBackend):
+    """
+    Runs commands through bash (sh when bash is missing, eg. on alpine)
+    without a pty. Output is forwarded chunk by chunk as it arrives, and only
+    its last tail_size bytes are retained.
+    """
+
+    READ_CHUNK_SIZE = 64 * 1024
+    # how often the command is checked for having exited while its output
+    # is read, and how much of what is left in the pipes is then read
+    POLL_INTERVAL = 0.1
+    DRAIN_MAX_SIZE = 1024 * 1024
+    BASH_LOCATION = "/bin/bash"
+
+    def __init__(self, tail_size: int) -> None:
+        self.tail_size = tail_size
+
+    @staticmethod
+    def _forward(
+        data: bytes, target: IO[str], decoder: codecs.IncrementalDecoder
+    ) -> None:
+        target_buffer = getattr(target, "buffer", None)
+        if target_buffer is not None:
+            # whatever was printed through the text layer goes out first
+            target.flush()
+            target_buffer.write(data)
+        else:
+            target.write(decoder.decode(data))
+        target.flush()
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        if echo:
+            print(f"\033[1;37m{command}\033[0m", flush=True)
+
+        executable = self.BASH_LOCATION if os.path.exists(self.BASH_LOCATION) else None
+        process = subprocess.Popen(  # nosec
+            command,
+            shell=True,
+            executable=executable,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, **envs},
+        )
+        assert process.stdout is not None and process.stderr is not None
+
+        tail = OutputTail(self.tail_size)
+        targets = {
+            process.stdout.fileno(): (
+                sys.stdout,
+                codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            ),
+            process.stderr.fileno(): (
+                sys.stderr,
+                codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            ),
+        }
+
+        def read(fileno: int) -> int:
+            data = os.read(fileno, self.READ_CHUNK_SIZE)
+            if not data:
+                selector.unregister(fileno)
+                return 0
+            target, decoder = targets[fileno]
+            self._forward(data, target, decoder)
+            tail.write(data)
+            return len(data)
+
+        pid = 0
+        with selectors.DefaultSelector() as selector:
+            for fileno in targets:
+                selector.register(fileno, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select(timeout=self.POLL_INTERVAL):
+                    read(key.fd)
+                # wait4 rather than wait, for the rusage of this very child
+                pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+                if pid:
+                    break
+
+            # processes the command left running in the background may hold
+            # the pipes open: once it exited, only what it already wrote is
+            # read (bounded, as they may keep writing)
+            drained = 0
+            while selector.get_map() and drained < self.DRAIN_MAX_SIZE:
+                ready = selector.select(timeout=0)
+                if not ready:
+                    break
+                for key, _ in ready:
+                    drained += read(key.fd)
+
+        process.stdout.close()
+        process.stderr.close()
+        if not pid:
+            _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = (
+            -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        )
+        return InvokerBackend.Result(
+            return_code=process.returncode,
+            output_tail=tail.getvalue(),
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss=rusage.ru_maxrss,
+        )
+
+
+class PtyBackend(InvokerBackend):
+    """
+    Runs commands in a pty through invoke, for programs that only behave
+    (eg. show progress) when attached to a terminal. invoke keeps the whole
+    output of the command in memory, and doesn't expose the rusage of the
+    command, so its cpu time is taken from all our children (which includes
+    those running concurrently on other threads).
+    """
+
+    def __init__(self, tail_size: int) -> None:
+        self.tail_size = tail_size
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        start_rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        response = invoke.run(
+            command,
+            out_stream=sys.stdout,
+            err_stream=sys.stderr,
+            pty=True,
+            warn=True,
+            echo=echo,
+            env=envs,
+        )
+        end_rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        output: Optional[str] = response.stdout
+        return InvokerBackend.Result(
+            return_code=response.return_code,
+            output_tail=(output or "")[-self.tail_size :],
+            user_time=end_rusage.ru_utime - start_rusage.ru_utime,
+            system_time=end_rusage.ru_stime - start_rusage.ru_stime,
+        )
+
+
+class ShellSessionBackend(SubprocessBackend):
+    """
+    Runs every command in the same long-lived shell instead of starting one
+    per command. Each command is evaluated in a subshell (so `exit`, `cd` or
+    a syntax error only affect it) with stdin closed, followed by a trailer
+    on stdout carrying its exit code and the output of `times`, and a
+    sentinel line on stderr, so the output of consecutive commands is never
+    mixed. The cpu time of a command is the growth of the children times of
+    the shell, its peak rss is not known.
+    """
+
+    class SessionClosed(Exception):
+        pass
+
+    # "0m0.004s" in bash, "0m 0.00s" in busybox sh
+    TIMES_PATTERN = re.compile(r"(\d+)m\s*(\d+(?:\.\d+)?)s")
+
+    def __init__(self, tail_size: int) -> None:
+        super().__init__(tail_size=tail_size)
+        self._process: Optional[subprocess.Popen] = None
+        self._children_times = (0.0, 0.0)
+
+    def start(self) -> None:
+        shell = self.BASH_LOCATION if os.path.exists(self.BASH_LOCATION) else "sh"
+        self._children_times = (0.0, 0.0)
+        self._process = subprocess.Popen(  # nosec
+            [shell],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        assert process.stdin is not None
+        process.stdin.close()
+        process.wait()
+        for stream in (process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        if self._process is None:
+            self.start()
+        process = self._process
+        assert process is not None
+        assert process.stdin is not None
+        assert process.stdout is not None and process.stderr is not None
+
+        if echo:
+            print(f"\033[1;37m{command}\033[0m", flush=True)
+
+        sentinel = f"__nanolayer_{uuid.uuid4().hex}__"
+        exports = "".join(
+            f"export {name}={shlex.quote(value)}; " for name, value in envs.items()
+        )
+        process.stdin.write(
+            (
+                f"( {exports}eval {shlex.quote(command)} ) </dev/null\n"
+                f"__nanolayer_rc=$?\n"
+                f"printf '%s %d\\n' {sentinel} $__nanolayer_rc\n"
+                f"times\n"
+                f"printf '%s-end\\n' {sentinel}\n"
+                f"printf '%s-end\\n' {sentinel} >&2\n"
+            ).encode()
+        )
+        process.stdin.flush()
+
+        tail = OutputTail(self.tail_size)
+        sentinel_bytes = sentinel.encode()
+        end_bytes = f"{sentinel}-end\n".encode()
+        # bytes that might be the beginning of the sentinel are held back
+        pending = {process.stdout.fileno(): b"", process.stderr.fileno(): b""}
+        targets = {
+            process.stdout.fileno(): (
+                sys.stdout,
+                codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            ),
+            process.stderr.fileno(): (
+                sys.stderr,
+                codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            ),
+        }
+        trailer: Optional[str] = None
+
+        with selectors.DefaultSelector() as selector:
+            for fileno in targets:
+                selector.register(fileno, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    data = os.read(key.fd, self.READ_CHUNK_SIZE)
+                    if not data:
+                        self.close()
+                        raise ShellSessionBackend.SessionClosed(
+                            f"the shell session exited while running: {command}"
+                        )
+                    buffered = pending[key.fd] + data
+                    target, decoder = targets[key.fd]
+
+                    sentinel_idx = buffered.find(sentinel_bytes)
+                    end_idx = buffered.find(end_bytes, max(sentinel_idx, 0))
+                    if sentinel_idx == -1:
+                        keep = len(sentinel_bytes)
+                        output, pending[key.fd] = buffered[:-keep], buffered[-keep:]
+                    elif end_idx == -1:
+                        output = buffered[:sentinel_idx]
+                        pending[key.fd] = buffered[sentinel_idx:]
+                    else:
+                        output, pending[key.fd] = buffered[:sentinel_idx], b""
+                        if key.fd == process.stdout.fileno():
+                            trailer = buffered[sentinel_idx:end_idx].decode()
+                        selector.unregister(key.fd)
+
+                    if output:
+                        self._forward(output, target, decoder)
+                        tail.write(output)
+
+        assert trailer is not None
+        sentinel_line, _, times = trailer.partition("\n")
+        user_time, system_time = self._children_times_delta(times)
+        return InvokerBackend.Result(
+            return_code=int(sentinel_line.split()[1]),
+            output_tail=tail.getvalue(),
+            user_time=user_time,
+            system_time=system_time,
+        )
+
+    def _children_times_delta(
+        self, times: str
+    ) -> Tuple[Optional[float], Optional[float]]:
+        # times prints the user and system times of the shell, then of its children
+        matches = self.TIMES_PATTERN.findall(times)
+        if len(matches) != 4:
+            return None, None
+        children_times = tuple(
+            int(minutes) * 60 + float(seconds) for minutes, seconds in matches[2:]
+        )
+        user_time = children_times[0] - self._children_times[0]
+        system_time = children_times[1] - self._children_times[1]
+        self._children_times = (children_times[0], children_times[1])
+        return user_time, system_time
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+class RecordingBackend(InvokerBackend):
+    """
+    Runs commands on another backend, appending each command and its result
+    to a fixture file (json lines) to be replayed by ReplayBackend.
+    Temporary directories in commands are recorded as <tempdir>, as they
+    differ from run to run.
+    """
+
+    class Entry(BaseModel):
+        command: str
+        return_code: int
+        output_tail: str = ""
+
+    TEMPDIR_PLACEHOLDER = "<tempdir>"
+
+    def __init__(self, backend: InvokerBackend, fixture_file: Union[str, Path]) -> None:
+        self.backend = backend
+        self.fixture_file = Path(fixture_file)
+
+    @classmethod
+    def normalize_command(cls, command: str) -> str:
+        return re.sub(
+            rf"{re.escape(tempfile.gettempdir())}/tmp[\w-]+",
+            cls.TEMPDIR_PLACEHOLDER,
+            command,
+        )
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        result = self.backend.run(command, envs=envs, echo=echo)
+        entry = RecordingBackend.Entry(
+            command=self.normalize_command(command),
+            return_code=result.return_code,
+            output_tail=result.output_tail,
+        )
+        with self.fixture_file.open("a") as f:
+            f.write(entry.json() + "\n")
+        return result
+
+
+class ReplayBackend(InvokerBackend):
+    """
+    Replays a fixture file written by RecordingBackend without running
+    anything: commands must come in the recorded order, and get the recorded
+    results. After a mismatch every command fails with that same mismatch, so
+    cleanup commands (in finally blocks) don't hide it.
+    """
+
+    requires_root = False
+    executes = False
+
+    def __init__(self, fixture_file: Union[str, Path]) -> None:
+        self.fixture_file = Path(fixture_file)
+        self.entries = [
+            RecordingBackend.Entry.parse_raw(line)
+            for line in self.fixture_file.read_text().splitlines()
+            if line.strip()
+        ]
+        self.position = 0
+        self._mismatch: Optional[ReplayMismatch] = None
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        if self._mismatch is None:
+            if self.position >= len(self.entries):
+                self._mismatch = ReplayMismatch(
+                    f"{self.fixture_file}: unexpected command '{command}', "
+                    f"all {len(self.entries)} recorded commands were replayed"
+                )
+            elif (
+                RecordingBackend.normalize_command(command)
+                != self.entries[self.position].command
+            ):
+                self._mismatch = ReplayMismatch(
+                    f"{self.fixture_file}: command #{self.position + 1} is "
+                    f"'{command}' but '{self.entries[self.position].command}' was recorded"
+                )
+        if self._mismatch is not None:
+            raise self._mismatch
+
+        if echo:
+            print(f"\033[1;37m{command}\033[0m", flush=True)
+        entry = self.entries[self.position]
+        self.position += 1
+        return InvokerBackend.Result(
+            return_code=entry.return_code, output_tail=entry.output_tail
+        )
+
+    def assert_replayed(self) -> None:
+        if self._mismatch is not None:
+            raise self._mismatch
+        if self.position != len(self.entries):
+            raise ReplayMismatch(
+                f"{self.fixture_file}: only {self.position} of "
+                f"{len(self.entries)} recorded commands were replayed"
+            )
+
+
+class PlanBackend(InvokerBackend):
+    """
+    Prints the commands instead of running them, as if they all succeeded.
+    """
+
+    requires_root = False
+    executes = False
+
+    def __init__(self) -> None:
+        self.commands: List[str] = []
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        print(command, flush=True)
+        self.commands.append(command)
+        return InvokerBackend.Result(return_code=0)
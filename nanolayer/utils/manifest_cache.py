@@ -0,0 +1,94 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class ManifestCache:
+    """
+    On-disk cache of OCI manifests keyed by registry, repository and reference.
+    Alongside the manifest body it keeps the Docker-Content-Digest and ETag
+    response headers so tag references can be revalidated with a conditional
+    request rather than downloaded again.
+    """
+
+    MANIFESTS_DIR = "manifests"
+
+    class Entry(BaseModel):
+        reference: str
+        manifest: str
+        digest: str
+        etag: Optional[str] = None
+
+    def __init__(self, location: Union[str, Path]) -> None:
+        self.location = Path(location)
+
+    @classmethod
+    def from_settings(cls) -> Optional["ManifestCache"]:
+        settings = NanolayerSettings()
+        # opt-in, like the blob cache
+        if not settings.enable_cache or not settings.cache_dir:
+            return None
+        return cls(location=settings.cache_dir)
+
+    @staticmethod
+    def _reference(registry: str, repository: str, version: str) -> str:
+        separator = "@" if version.startswith("sha256:") else ":"
+        return f"{registry}/{repository}{separator}{version}"
+
+    def _entry_path(self, reference: str) -> Path:
+        key = hashlib.sha256(reference.encode()).hexdigest()
+        return self.location.joinpath(self.MANIFESTS_DIR, f"{key}.json")
+
+    def get(
+        self, registry: str, repository: str, version: str
+    ) -> Optional["ManifestCache.Entry"]:
+        reference = self._reference(registry, repository, version)
+        entry_path = self._entry_path(reference)
+        if not entry_path.is_file():
+            return None
+
+        try:
+            entry = ManifestCache.Entry.parse_file(entry_path)
+        except ValueError:
+            logger.warning("removing corrupted manifest cache entry %s", entry_path)
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        if entry.reference != reference:
+            return None
+
+        calculated_digest = (
+            f"sha256:{hashlib.sha256(entry.manifest.encode()).hexdigest()}"
+        )
+        if version.startswith("sha256:") and calculated_digest != version:
+            logger.warning("removing corrupted manifest cache entry %s", entry_path)
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        return entry
+
+    def put(
+        self,
+        registry: str,
+        repository: str,
+        version: str,
+        manifest: str,
+        digest: str,
+        etag: Optional[str] = None,
+    ) -> "ManifestCache.Entry":
+        reference = self._reference(registry, repository, version)
+        entry = ManifestCache.Entry(
+            reference=reference, manifest=manifest, digest=digest, etag=etag
+        )
+
+        AtomicFile.write_text(self._entry_path(reference), entry.json())
+
+        return entry
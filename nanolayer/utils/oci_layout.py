@@ -0,0 +1,144 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+from nanolayer.utils.atomic_file import AtomicFile
+
+
+class OCILayout:
+    """
+    Serves manifests and blobs of references such as
+    oci-layout:///path/to/dir:tag (or oci-layout:///path/to/dir@sha256:...)
+    from a standard OCI image layout on disk (index.json + blobs/<alg>/<hex>).
+    Blobs are hashed through mmap and copied with copyfile (sendfile on linux),
+    so their content never passes through python buffers.
+    """
+
+    SCHEME = "oci-layout://"
+    INDEX_FILE = "index.json"
+    BLOBS_DIR = "blobs"
+    REF_NAME_ANNOTATION = "org.opencontainers.image.ref.name"
+    INDEX_MEDIA_TYPES = (
+        "application/vnd.oci.image.index.v1+json",
+        "application/vnd.docker.distribution.manifest.list.v2+json",
+    )
+
+    class OCILayoutError(Exception):
+        pass
+
+    @staticmethod
+    def is_layout_ref(oci_input: str) -> bool:
+        return oci_input.startswith(OCILayout.SCHEME)
+
+    @staticmethod
+    def parse(oci_input: str) -> Tuple[Path, str]:
+        location = oci_input[len(OCILayout.SCHEME) :]
+
+        if "@" in location:
+            layout_dir, reference = location.split("@", 1)
+        elif location.rfind(":") > location.rfind("/"):
+            layout_dir, reference = location.rsplit(":", 1)
+        else:
+            layout_dir, reference = location, "latest"
+
+        return Path(layout_dir), reference
+
+    @staticmethod
+    def _blob_path(layout_dir: Path, digest: str) -> Path:
+        algorithm, _, hexdigest = digest.partition(":")
+        if not algorithm or not hexdigest or "/" in digest:
+            raise OCILayout.OCILayoutError(f"invalid digest: {digest}")
+        return layout_dir.joinpath(OCILayout.BLOBS_DIR, algorithm, hexdigest)
+
+    @staticmethod
+    def _verify_blob(blob_path: Path, digest: str) -> None:
+        # imported here to avoid a circular import (oci_registry dispatches
+        # oci-layout references to this module)
+        from nanolayer.utils.oci_registry import OCIRegistry
+
+        algorithm, _, hexdigest = digest.partition(":")
+        hasher = hashlib.new(algorithm)
+        with open(blob_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+
+        calculated_digest = f"{algorithm}:{hasher.hexdigest()}"
+        if calculated_digest != digest:
+            raise OCIRegistry.HashException(
+                f"bad calculated digest: {calculated_digest} (expected {digest})"
+            )
+
+    @staticmethod
+    def get_blob_path(oci_input: str, digest: str) -> Path:
+        layout_dir, _ = OCILayout.parse(oci_input)
+        blob_path = OCILayout._blob_path(layout_dir, digest)
+        if not blob_path.is_file():
+            raise OCILayout.OCILayoutError(f"blob {digest} not found in {layout_dir}")
+        OCILayout._verify_blob(blob_path, digest)
+        return blob_path
+
+    @staticmethod
+    def _resolve_manifest_descriptor(
+        layout_dir: Path, index: Dict[str, Any], reference: str
+    ) -> Dict[str, Any]:
+        descriptors = index.get("manifests", [])
+
+        for descriptor in descriptors:
+            if descriptor["digest"] == reference:
+                return descriptor
+
+        for descriptor in descriptors:
+            ref_name = descriptor.get("annotations", {}).get(
+                OCILayout.REF_NAME_ANNOTATION, ""
+            )
+            # ref names are either plain tags or fully qualified references
+            if ref_name == reference or ref_name.endswith(f":{reference}"):
+                return descriptor
+
+        if len(descriptors) == 1 and reference == "latest":
+            return descriptors[0]
+
+        raise OCILayout.OCILayoutError(f"{reference} was not found in {layout_dir}")
+
+    @staticmethod
+    def get_manifest(oci_input: str) -> Tuple[str, str]:
+        """
+        Returns the raw manifest of the given reference and its digest.
+        """
+        layout_dir, reference = OCILayout.parse(oci_input)
+
+        index_file = layout_dir.joinpath(OCILayout.INDEX_FILE)
+        if not index_file.is_file():
+            raise OCILayout.OCILayoutError(f"{layout_dir} is not an OCI image layout")
+
+        index = json.loads(index_file.read_text())
+        descriptor = OCILayout._resolve_manifest_descriptor(
+            layout_dir, index, reference
+        )
+
+        # nested image indexes resolve to their single manifest
+        while descriptor.get("mediaType") in OCILayout.INDEX_MEDIA_TYPES:
+            nested_index = json.loads(
+                OCILayout.get_blob_path(oci_input, descriptor["digest"]).read_text()
+            )
+            if len(nested_index.get("manifests", [])) != 1:
+                raise OCILayout.OCILayoutError(
+                    f"{reference} is an image index with multiple manifests"
+                )
+            descriptor = nested_index["manifests"][0]
+
+        manifest_path = OCILayout.get_blob_path(oci_input, descriptor["digest"])
+        return manifest_path.read_text(), descriptor["digest"]
+
+    @staticmethod
+    def copy_blob(oci_input: str, digest: str, output_file: Union[str, Path]) -> None:
+        output_file = Path(output_file)
+        blob_path = OCILayout.get_blob_path(oci_input, digest)
+
+        with AtomicFile.temp_path(output_file) as temp_file:
+            shutil.copyfile(blob_path, temp_file)
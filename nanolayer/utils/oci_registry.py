@@ -1,21 +1,39 @@
+import contextlib
 import hashlib
-import http.client
 import json
+import logging
+import os
 import re
+import shutil
 import tarfile
 import tempfile
+import time
 import urllib
-import urllib.request
+import urllib.error
+import urllib.parse
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
 from pydantic import BaseModel
 
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.blob_cache import BlobCache
+from nanolayer.utils.http_client import HttpClient
+from nanolayer.utils.manifest_cache import ManifestCache
+from nanolayer.utils.oci_layout import OCILayout
+from nanolayer.utils.phase_report import PhaseReport
+from nanolayer.utils.token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
+
 
 class OCIRegistry:
     class HashException(Exception):
         pass
 
+    class UnsafeLayerException(Exception):
+        pass
+
     ACCEPT_HEADER = {
         "Accept": ", ".join(
             (
@@ -42,7 +60,15 @@ class OCIRegistry:
         resource: str
         path: str
 
-    WWW_AUTHENTICATE_REGEX = r'.*[Ww]ww-[Aa]uthenticate:\sBearer\srealm="([\w:/\.]+)",service="([\w:/\.]+)",scope="([\w:/\-,]+)".*'
+    BLOB_CHUNK_SIZE = 1024 * 1024
+
+    _token_cache: Optional[TokenCache] = None
+
+    # registries served from the local machine are spoken to over plain http,
+    # same as docker treats them as insecure registries by default
+    INSECURE_REGISTRY_HOSTS = ("localhost", "127.0.0.1")
+
+    WWW_AUTHENTICATE_REGEX = r'.*[Ww][Ww][Ww]-[Aa]uthenticate:\sBearer\srealm="([\w:/\.]+)",service="([\w:/\.]+)",scope="([\w:/\-,]+)".*'
 
     @staticmethod
     def parse_oci(oci_input: str) -> "OCIRegistry.ParsedOCIRef":
@@ -55,7 +81,10 @@ class OCIRegistry:
 
         index_of_last_colon = oci_input.rfind(":")
 
-        if index_of_last_colon == -1 or index_of_last_colon < oci_input.index("/"):
+        if "@" in oci_input:
+            # digest pinned reference (eg. ghcr.io/owner/feature@sha256:...)
+            resource, version = oci_input.split("@", 1)
+        elif index_of_last_colon == -1 or index_of_last_colon < oci_input.index("/"):
             resource = oci_input
             version = "latest"
         else:
@@ -80,6 +109,51 @@ class OCIRegistry:
             path=path,
         )
 
+    class HashingReader:
+        """
+        File-like wrapper hashing (and optionally teeing) everything read
+        through it, with the algorithm of the digest it is verified against.
+        """
+
+        def __init__(
+            self, source: BinaryIO, digest: str, tee: Optional[BinaryIO] = None
+        ) -> None:
+            self.source = source
+            self.digest = digest
+            self.tee = tee
+            self.algorithm = digest.partition(":")[0]
+            self.hasher = hashlib.new(self.algorithm)
+            self.bytes_read = 0
+            # time spent waiting on the source, as opposed to processing
+            self.read_time = 0.0
+
+        def read(self, size: int = -1) -> bytes:
+            start = time.perf_counter()
+            chunk = self.source.read(size if size >= 0 else None)
+            self.read_time += time.perf_counter() - start
+            self.bytes_read += len(chunk)
+            self.hasher.update(chunk)
+            if self.tee is not None:
+                self.tee.write(chunk)
+            return chunk
+
+        def drain(self) -> None:
+            while self.read(OCIRegistry.BLOB_CHUNK_SIZE):
+                pass
+
+        def verify(self) -> None:
+            calculated_digest = f"{self.algorithm}:{self.hasher.hexdigest()}"
+            if not calculated_digest == self.digest:
+                raise OCIRegistry.HashException(
+                    f"bad calculated digest: {calculated_digest} (expected {self.digest})"
+                )
+
+    @staticmethod
+    def _registry_url(registry: str) -> str:
+        host = registry.split(":")[0]
+        scheme = "http" if host in OCIRegistry.INSECURE_REGISTRY_HOSTS else "https"
+        return f"{scheme}://{registry}"
+
     @staticmethod
     def _parse_www_authenticate(
         response_headers: Union[str, List[str], Dict[str, str]]
@@ -103,41 +177,88 @@ class OCIRegistry:
             f"failed to parse www-authenticate from the given string: {str(response_headers)}"
         )
 
+    @staticmethod
+    def token_cache() -> TokenCache:
+        if OCIRegistry._token_cache is None:
+            OCIRegistry._token_cache = TokenCache.from_settings()
+        return OCIRegistry._token_cache
+
+    @staticmethod
+    def _token_key(www_authenticate: "OCIRegistry.WWWAthenticate") -> str:
+        return f"{www_authenticate.realm}|{www_authenticate.service}|{www_authenticate.scope}"
+
+    @staticmethod
+    def _challenge_key(url: str) -> str:
+        # requests are grouped by registry and repository, which is what the
+        # token scope (eg. "repository:owner/feature:pull") is granted for
+        parsed_url = urllib.parse.urlparse(url)
+        repository = re.sub(r"/(manifests|blobs)/[^/]+$", "", parsed_url.path)
+        return f"{parsed_url.netloc}{repository}"
+
     @staticmethod
     def _generate_token(raw_response_header: str) -> str:
         www_authenticate = OCIRegistry._parse_www_authenticate(raw_response_header)
+        return OCIRegistry._get_token(www_authenticate)
+
+    @staticmethod
+    def _get_token(www_authenticate: "OCIRegistry.WWWAthenticate") -> str:
+        token_key = OCIRegistry._token_key(www_authenticate)
+        token = OCIRegistry.token_cache().get_token(token_key)
+        if token is not None:
+            return token
 
         token_request_link = f"{www_authenticate.realm}?service={www_authenticate.service}&scope={www_authenticate.scope}"
         if not token_request_link.startswith("http"):
             raise ValueError("only http/https links are permited")
 
-        response = urllib.request.urlopen(token_request_link)  # nosec
-        token = json.loads(response.read())["token"]
+        with PhaseReport.phase("token"):
+            token_response = HttpClient.get_json(token_request_link)
+        token = token_response["token"]
+        OCIRegistry.token_cache().set_token(
+            token_key, token, expires_in=token_response.get("expires_in")
+        )
         return token
 
     @staticmethod
     def _attempt_request(
-        url: str, headers: Optional[Dict[str, str]] = None
-    ) -> http.client.HTTPResponse:
+        url: str, headers: Optional[Dict[str, str]] = None, accept_gzip: bool = False
+    ) -> HttpClient.Response:
         if not url.startswith("http"):
             raise ValueError("only http/https links are permited")
 
-        if headers is None:
-            headers = {}
-
-        if "User-Agent" not in headers:
-            headers["User-Agent"] = "nanolayer"
+        headers = dict(headers or {})
 
-        request = urllib.request.Request(url=url, headers=headers)
+        # when the repository already challenged us before, a (possibly cached)
+        # token is sent right away instead of waiting for the 401
+        challenge_key = OCIRegistry._challenge_key(url)
+        known_challenge = OCIRegistry.token_cache().get_challenge(challenge_key)
+        if known_challenge is not None:
+            www_authenticate = OCIRegistry.WWWAthenticate.parse_obj(known_challenge)
+            token = OCIRegistry._get_token(www_authenticate)
+            headers["Authorization"] = f"Bearer {token}"
 
         try:
-            response = urllib.request.urlopen(request)  # nosec
-            return response
+            return HttpClient.request(url, headers=headers, accept_gzip=accept_gzip)
 
         except urllib.error.HTTPError as e:
-            token = OCIRegistry._generate_token(e.headers.as_string())
-            request.add_header("Authorization", f"Bearer {token}")
-            return urllib.request.urlopen(request)  # nosec
+            if e.code != 401:
+                raise
+
+            www_authenticate = OCIRegistry._parse_www_authenticate(
+                e.headers.as_string()
+            )
+            if known_challenge is not None:
+                # the token we sent was rejected, don't reuse it
+                OCIRegistry.token_cache().invalidate_token(
+                    OCIRegistry._token_key(www_authenticate)
+                )
+            OCIRegistry.token_cache().set_challenge(
+                challenge_key, www_authenticate.dict()
+            )
+
+            token = OCIRegistry._get_token(www_authenticate)
+            headers["Authorization"] = f"Bearer {token}"
+            return HttpClient.request(url, headers=headers, accept_gzip=accept_gzip)
 
     @staticmethod
     def download_layer(
@@ -155,13 +276,89 @@ class OCIRegistry:
 
         blob_digest = manifest["layers"][layer_num]["digest"]
 
-        with open(output_file, "wb") as f:
-            f.write(OCIRegistry.get_blob(oci_input, blob_digest))
+        OCIRegistry.download_blob(
+            oci_input=oci_input, digest=blob_digest, output_file=output_file
+        )
+
+    @staticmethod
+    def _is_within(path: str, directory: str) -> bool:
+        return os.path.commonpath([path, directory]) == directory
+
+    @staticmethod
+    def _safe_members(
+        tar: tarfile.TarFile, output_dir: Path
+    ) -> Iterator[tarfile.TarInfo]:
+        """
+        Yields the members of the layer, raising on the first one that would
+        be written, or link to, outside of output_dir. Members are checked
+        just before being extracted, so links already extracted are followed.
+        """
+        root = os.path.realpath(output_dir)
+        for member in tar:
+            if Path(member.name).is_absolute() or ".." in Path(member.name).parts:
+                raise OCIRegistry.UnsafeLayerException(
+                    f"layer member {member.name} is outside of the layer"
+                )
+            if member.isdev():
+                raise OCIRegistry.UnsafeLayerException(
+                    f"layer member {member.name} is a device"
+                )
+            destination = os.path.realpath(os.path.join(root, member.name))
+            if not OCIRegistry._is_within(destination, root):
+                raise OCIRegistry.UnsafeLayerException(
+                    f"layer member {member.name} is outside of the layer"
+                )
+            if member.issym() or member.islnk():
+                # symlinks are relative to their directory, hardlinks to the root
+                link_base = os.path.dirname(destination) if member.issym() else root
+                target = os.path.realpath(os.path.join(link_base, member.linkname))
+                if not OCIRegistry._is_within(target, root):
+                    raise OCIRegistry.UnsafeLayerException(
+                        f"layer member {member.name} links outside of the layer"
+                        f" ({member.linkname})"
+                    )
+            yield member
+
+    @staticmethod
+    def _clear_directory(directory: Path) -> None:
+        for child in directory.iterdir():
+            if child.is_dir() and not child.is_symlink():
+                shutil.rmtree(child)
+            else:
+                child.unlink()
+
+    @staticmethod
+    def _extract_layer(tar: tarfile.TarFile, output_dir: Path) -> None:
+        # members are checked by _safe_members on every python, rather than
+        # by the extraction filters only recent ones have
+        extract_options: Dict[str, Any] = {}
+        if hasattr(tarfile, "fully_trusted_filter"):
+            extract_options["filter"] = "fully_trusted"
+        try:
+            tar.extractall(
+                output_dir,
+                members=OCIRegistry._safe_members(tar, output_dir),
+                **extract_options,
+            )
+        except BaseException:
+            OCIRegistry._clear_directory(output_dir)
+            raise
 
     @staticmethod
     def download_and_extract_layer(
-        oci_input: str, output_dir: Union[str, Path], layer_num: int
+        oci_input: str,
+        output_dir: Union[str, Path],
+        layer_num: int,
+        stream: bool = True,
+        manifest: Optional[Dict[str, Any]] = None,
     ) -> None:
+        """
+        Extracts the given layer into output_dir (which must be empty).
+        By default the layer is extracted while it is being downloaded, without
+        writing the tarball to disk first; its digest is verified once the
+        stream ends and the extracted content is discarded if it does not match.
+        An already fetched manifest can be passed to avoid requesting it again.
+        """
         if isinstance(output_dir, str):
             output_dir = Path(output_dir)
 
@@ -173,32 +370,281 @@ class OCIRegistry:
         if any(output_dir.iterdir()):
             raise ValueError(f"{output_dir} is not empty ")
 
-        with tempfile.TemporaryDirectory() as download_dir:
-            layer_file = Path(download_dir).joinpath("layer_file.tgz")
-            OCIRegistry.download_layer(
-                oci_input=oci_input, layer_num=layer_num, output_file=layer_file
+        if not stream:
+            with tempfile.TemporaryDirectory() as download_dir:
+                layer_file = Path(download_dir).joinpath("layer_file.tgz")
+                OCIRegistry.download_layer(
+                    oci_input=oci_input, layer_num=layer_num, output_file=layer_file
+                )
+                with tarfile.open(layer_file, "r") as tar:
+                    OCIRegistry._extract_layer(tar, output_dir)
+            return
+
+        if manifest is None:
+            manifest = OCIRegistry.get_manifest(oci_input)
+
+        if OCILayout.is_layout_ref(oci_input):
+            blob_path = OCILayout.get_blob_path(
+                oci_input, manifest["layers"][layer_num]["digest"]
             )
-            with tarfile.open(layer_file, "r") as tar:
-                tar.extractall(output_dir)
+            with PhaseReport.phase("extraction"), tarfile.open(blob_path, "r") as tar:
+                OCIRegistry._extract_layer(tar, output_dir)
+            return
+
+        blob_digest = manifest["layers"][layer_num]["digest"]
+
+        blob_cache = BlobCache.from_settings()
+        if blob_cache is not None:
+            cached_blob = blob_cache.get(blob_digest)
+            if cached_blob is not None:
+                with PhaseReport.phase("extraction"), tarfile.open(
+                    cached_blob, "r"
+                ) as tar:
+                    OCIRegistry._extract_layer(tar, output_dir)
+                return
 
-    @staticmethod
-    def get_manifest(oci_input: str) -> Dict[str, Any]:
         parsed_oci = OCIRegistry.parse_oci(oci_input=oci_input)
-        url = f"https://{parsed_oci.registry}/v2/{parsed_oci.path}/manifests/{parsed_oci.version}"
-        response = OCIRegistry._attempt_request(url, headers=OCIRegistry.ACCEPT_HEADER)
-        return json.loads(response.read().decode())
+        url = f"{OCIRegistry._registry_url(parsed_oci.registry)}/v2/{parsed_oci.path}/blobs/{blob_digest}"
+
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            response = stack.enter_context(OCIRegistry._attempt_request(url))
+            # the compressed stream is teed into the blob cache as it is read
+            cache_writer = None
+            if blob_cache is not None:
+                try:
+                    cache_writer = stack.enter_context(blob_cache.writer(blob_digest))
+                except OSError as e:
+                    logger.warning("could not cache blob %s: %s", blob_digest, str(e))
+            reader = OCIRegistry.HashingReader(
+                response, digest=blob_digest, tee=cache_writer
+            )
+            try:
+                with tarfile.open(fileobj=reader, mode="r|*") as tar:
+                    OCIRegistry._extract_layer(tar, output_dir)
+                reader.drain()
+                reader.verify()
+                # both happen at once, time spent reading is the download's
+                PhaseReport.record(
+                    "blob_download",
+                    wall_time=reader.read_time,
+                    bytes_transferred=reader.bytes_read,
+                )
+                PhaseReport.record(
+                    "extraction",
+                    wall_time=time.perf_counter() - start - reader.read_time,
+                )
+            except BaseException:
+                # never leave the content of an unverified layer behind
+                OCIRegistry._clear_directory(output_dir)
+                raise
 
     @staticmethod
-    def get_blob(oci_input: str, digest: str) -> bytes:
+    def read_layer_member(
+        oci_input: str, layer_num: int, member_name: str
+    ) -> Optional[bytes]:
+        """
+        Returns the content of a single file inside the given layer, or None if
+        the layer has no such member.
+        The layer is streamed and reading stops as soon as the member was found,
+        nothing is written to disk. As the rest of the layer is never read, its
+        digest is not verified.
+        """
+        manifest = OCIRegistry.get_manifest(oci_input)
+        blob_digest = manifest["layers"][layer_num]["digest"]
+
+        with contextlib.ExitStack() as stack:
+            blob_cache = BlobCache.from_settings()
+            cached_blob = None
+            if blob_cache is not None and not OCILayout.is_layout_ref(oci_input):
+                cached_blob = blob_cache.get(blob_digest)
+
+            if OCILayout.is_layout_ref(oci_input):
+                source: BinaryIO = stack.enter_context(
+                    open(OCILayout.get_blob_path(oci_input, blob_digest), "rb")
+                )
+            elif cached_blob is not None:
+                source = stack.enter_context(open(cached_blob, "rb"))
+            else:
+                parsed_oci = OCIRegistry.parse_oci(oci_input=oci_input)
+                url = f"{OCIRegistry._registry_url(parsed_oci.registry)}/v2/{parsed_oci.path}/blobs/{blob_digest}"
+                source = stack.enter_context(OCIRegistry._attempt_request(url))
+
+            with tarfile.open(fileobj=source, mode="r|*") as tar:
+                for member in tar:
+                    if os.path.normpath(member.name) != os.path.normpath(member_name):
+                        continue
+                    extracted_file = tar.extractfile(member)
+                    if extracted_file is None:
+                        return None
+                    return extracted_file.read()
+        return None
+
+    @staticmethod
+    def _is_digest(version: str) -> bool:
+        return version.startswith("sha256:")
+
+    @staticmethod
+    def _get_manifest_entry(oci_input: str) -> ManifestCache.Entry:
+        with PhaseReport.phase("manifest"):
+            return OCIRegistry._resolve_manifest_entry(oci_input)
+
+    @staticmethod
+    def _resolve_manifest_entry(oci_input: str) -> ManifestCache.Entry:
+        if OCILayout.is_layout_ref(oci_input):
+            manifest, digest = OCILayout.get_manifest(oci_input)
+            return ManifestCache.Entry(
+                reference=oci_input, manifest=manifest, digest=digest
+            )
+
         parsed_oci = OCIRegistry.parse_oci(oci_input=oci_input)
-        url = f"https://{parsed_oci.registry}/v2/{parsed_oci.path}/blobs/{digest}"
-        response = OCIRegistry._attempt_request(url)
-        blob = response.read()
 
-        calculated_digest = f"sha256:{hashlib.sha256(blob).hexdigest()}"
+        manifest_cache = ManifestCache.from_settings()
+        cached_entry = None
+        if manifest_cache is not None:
+            cached_entry = manifest_cache.get(
+                parsed_oci.registry, parsed_oci.path, parsed_oci.version
+            )
+
+        # digest pinned manifests are immutable, no need to revalidate them
+        if cached_entry is not None and OCIRegistry._is_digest(parsed_oci.version):
+            return cached_entry
+
+        headers = dict(OCIRegistry.ACCEPT_HEADER)
+        if cached_entry is not None:
+            headers["If-None-Match"] = cached_entry.etag or f'"{cached_entry.digest}"'
+
+        url = f"{OCIRegistry._registry_url(parsed_oci.registry)}/v2/{parsed_oci.path}/manifests/{parsed_oci.version}"
+        try:
+            response = OCIRegistry._attempt_request(
+                url, headers=headers, accept_gzip=True
+            )
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached_entry is not None:
+                return cached_entry
+            raise
+
+        with response:
+            manifest = response.read().decode()
+        calculated_digest = f"sha256:{hashlib.sha256(manifest.encode()).hexdigest()}"
+        if OCIRegistry._is_digest(parsed_oci.version) and (
+            calculated_digest != parsed_oci.version
+        ):
+            raise OCIRegistry.HashException(
+                f"bad calculated digest: {calculated_digest} (expected {parsed_oci.version})"
+            )
+
+        digest = response.headers.get("Docker-Content-Digest") or calculated_digest
+        etag = response.headers.get("ETag")
+
+        if manifest_cache is None:
+            return ManifestCache.Entry(
+                reference=oci_input, manifest=manifest, digest=digest, etag=etag
+            )
+
+        try:
+            return manifest_cache.put(
+                parsed_oci.registry,
+                parsed_oci.path,
+                parsed_oci.version,
+                manifest=manifest,
+                digest=digest,
+                etag=etag,
+            )
+        except OSError as e:
+            logger.warning("could not cache manifest %s: %s", oci_input, str(e))
+            return ManifestCache.Entry(
+                reference=oci_input, manifest=manifest, digest=digest, etag=etag
+            )
+
+    @staticmethod
+    def get_manifest(oci_input: str) -> Dict[str, Any]:
+        return json.loads(OCIRegistry._get_manifest_entry(oci_input).manifest)
+
+    @staticmethod
+    def get_manifest_digest(oci_input: str) -> str:
+        return OCIRegistry._get_manifest_entry(oci_input).digest
+
+    @staticmethod
+    def get_manifest_and_digest(oci_input: str) -> Tuple[Dict[str, Any], str]:
+        entry = OCIRegistry._get_manifest_entry(oci_input)
+        return json.loads(entry.manifest), entry.digest
+
+    @staticmethod
+    def _copy_and_verify(source: BinaryIO, target: BinaryIO, digest: str) -> None:
+        algorithm, _, expected_hexdigest = digest.partition(":")
+        hasher = hashlib.new(algorithm)
+
+        while True:
+            chunk = source.read(OCIRegistry.BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            target.write(chunk)
+
+        calculated_digest = f"{algorithm}:{hasher.hexdigest()}"
         if not calculated_digest == digest:
             raise OCIRegistry.HashException(
                 f"bad calculated digest: {calculated_digest} (expected {digest})"
             )
 
-        return blob
+    @staticmethod
+    def _write_atomically(source: BinaryIO, digest: str, output_file: Path) -> None:
+        # the blob is streamed into a sibling temp file and only renamed into
+        # place once its digest has been verified, so a partial or corrupted
+        # download never shows up under the requested name
+        with AtomicFile.writer(output_file) as f:
+            OCIRegistry._copy_and_verify(source, f, digest)
+
+    @staticmethod
+    def download_blob(
+        oci_input: str, digest: str, output_file: Union[str, Path]
+    ) -> None:
+        if isinstance(output_file, str):
+            output_file = Path(output_file)
+
+        if output_file.exists():
+            raise ValueError(f"{output_file.as_posix()} already exists")
+
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+
+        if OCILayout.is_layout_ref(oci_input):
+            # already on local disk, not worth a copy in the blob cache
+            OCILayout.copy_blob(oci_input, digest, output_file)
+            return
+
+        blob_cache = BlobCache.from_settings()
+        if blob_cache is not None:
+            cached_blob = blob_cache.get(digest)
+            if cached_blob is not None:
+                with open(cached_blob, "rb") as source:
+                    OCIRegistry._write_atomically(
+                        source=source, digest=digest, output_file=output_file
+                    )
+                return
+
+        parsed_oci = OCIRegistry.parse_oci(oci_input=oci_input)
+        url = f"{OCIRegistry._registry_url(parsed_oci.registry)}/v2/{parsed_oci.path}/blobs/{digest}"
+        with PhaseReport.phase("blob_download"):
+            response = OCIRegistry._attempt_request(url)
+            try:
+                OCIRegistry._write_atomically(
+                    source=response, digest=digest, output_file=output_file
+                )
+            finally:
+                response.close()
+
+        if blob_cache is not None:
+            try:
+                blob_cache.put(digest, output_file)
+            except OSError as e:
+                logger.warning("could not cache blob %s: %s", digest, str(e))
+
+    @staticmethod
+    def get_blob(oci_input: str, digest: str) -> bytes:
+        with tempfile.TemporaryDirectory() as download_dir:
+            blob_file = Path(download_dir).joinpath("blob")
+            OCIRegistry.download_blob(
+                oci_input=oci_input, digest=digest, output_file=blob_file
+            )
+            return blob_file.read_bytes()
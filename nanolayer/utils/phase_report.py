@@ -0,0 +1,139 @@
+import contextlib
+import resource
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.http_client import HttpClient
+
+
+class PhaseReport:
+    """
+    Process wide record of how long each phase of an install took, how many
+    bytes it transferred and how much CPU time its child processes used.
+    Phases may run concurrently (features are downloaded in parallel) and may
+    nest (a token fetch is part of the manifest resolution it was needed for),
+    so their wall times are not meant to add up.
+    Phases are attributed to the feature set with `feature()` on the thread
+    they ran on.
+    """
+
+    class Phase(BaseModel):
+        name: str
+        feature: Optional[str] = None
+        wall_time: float
+        bytes_transferred: int = 0
+        children_user_time: float = 0.0
+        children_system_time: float = 0.0
+
+    class Report(BaseModel):
+        started_at: float
+        wall_time: float
+        phases: List["PhaseReport.Phase"]
+
+    _phases: List[Phase] = []
+    _started_at = time.time()
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._phases = []
+            cls._started_at = time.time()
+
+    @classmethod
+    def current_feature(cls) -> Optional[str]:
+        return getattr(cls._local, "feature", None)
+
+    @classmethod
+    @contextlib.contextmanager
+    def feature(cls, feature: str) -> Iterator[None]:
+        previous, cls._local.feature = cls.current_feature(), feature
+        try:
+            yield
+        finally:
+            cls._local.feature = previous
+
+    @classmethod
+    def record(
+        cls,
+        name: str,
+        wall_time: float,
+        bytes_transferred: int = 0,
+        children_user_time: float = 0.0,
+        children_system_time: float = 0.0,
+    ) -> None:
+        phase = PhaseReport.Phase(
+            name=name,
+            feature=cls.current_feature(),
+            wall_time=wall_time,
+            bytes_transferred=bytes_transferred,
+            children_user_time=children_user_time,
+            children_system_time=children_system_time,
+        )
+        with cls._lock:
+            cls._phases.append(phase)
+
+    @classmethod
+    @contextlib.contextmanager
+    def phase(cls, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        start_bytes = HttpClient.bytes_received()
+        start_rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            yield
+        finally:
+            end_rusage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cls.record(
+                name,
+                wall_time=time.perf_counter() - start,
+                bytes_transferred=HttpClient.bytes_received() - start_bytes,
+                children_user_time=end_rusage.ru_utime - start_rusage.ru_utime,
+                children_system_time=end_rusage.ru_stime - start_rusage.ru_stime,
+            )
+
+    @classmethod
+    def report(cls) -> "PhaseReport.Report":
+        with cls._lock:
+            return PhaseReport.Report(
+                started_at=cls._started_at,
+                wall_time=time.time() - cls._started_at,
+                phases=list(cls._phases),
+            )
+
+    @classmethod
+    def write_json(cls, report_file: Union[str, Path]) -> None:
+        Path(report_file).write_text(cls.report().json(indent=4))
+
+    @classmethod
+    def summary(cls) -> str:
+        report = cls.report()
+
+        totals: Dict[str, PhaseReport.Phase] = {}
+        counts: Dict[str, int] = {}
+        for phase in report.phases:
+            total = totals.setdefault(
+                phase.name, PhaseReport.Phase(name=phase.name, wall_time=0.0)
+            )
+            total.wall_time += phase.wall_time
+            total.bytes_transferred += phase.bytes_transferred
+            total.children_user_time += phase.children_user_time
+            total.children_system_time += phase.children_system_time
+            counts[phase.name] = counts.get(phase.name, 0) + 1
+
+        lines = [f"{'phase':<20}{'count':>7}{'wall':>11}{'bytes':>14}{'child cpu':>12}"]
+        for name, total in totals.items():
+            children_cpu = total.children_user_time + total.children_system_time
+            lines.append(
+                f"{name:<20}{counts[name]:>7}{total.wall_time:>10.2f}s"
+                f"{total.bytes_transferred:>14}{children_cpu:>11.2f}s"
+            )
+        lines.append(f"total wall time: {report.wall_time:.2f}s")
+        return "\n".join(lines)
+
+
+PhaseReport.Report.update_forward_refs()
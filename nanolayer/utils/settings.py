@@ -17,6 +17,27 @@ class NanolayerSettings(BaseSettings):
 
     verbose: str = ""
 
+    enable_cache: bool = True
+    cache_dir: str = ""  # nothing is cached unless set (eg. to a cache mount)
+    cache_max_size: int = 1024 * 1024 * 1024  # bytes
+    persist_registry_tokens: bool = False
+
+    state_dir: str = "/var/lib/nanolayer"
+
+    apt_lists_max_age: int = 0  # seconds, apt lists are never reused when 0
+    apt_prefetch_workers: int = 0  # concurrent .deb downloads, 0 lets apt download
+    apt_cache_dir: str = ""  # .deb files are kept there when set (eg. a cache mount)
+    apt_cache_max_size: int = 4 * 1024 * 1024 * 1024  # bytes
+
+    env_snapshot: bool = False
+
+    invoker_pty: bool = False
+    invoker_mode: str = ""  # plan, record or replay
+    invoker_fixture: str = ""
+
+    trace: bool = False
+    trace_file: str = ""  # json lines, one per command
+
 
 ENV_CLI_LOCATION = f"{NanolayerSettings.Config.env_prefix}CLI_LOCATION"
 
@@ -30,3 +51,22 @@ ENV_FORCE_CLI_INSTALLATION = (
     f"{NanolayerSettings.Config.env_prefix}FORCE_CLI_INSTALLATION"
 )
 ENV_VERBOSE = f"{NanolayerSettings.Config.env_prefix}VERBOSE"
+
+ENV_ENABLE_CACHE = f"{NanolayerSettings.Config.env_prefix}ENABLE_CACHE"
+ENV_CACHE_DIR = f"{NanolayerSettings.Config.env_prefix}CACHE_DIR"
+ENV_CACHE_MAX_SIZE = f"{NanolayerSettings.Config.env_prefix}CACHE_MAX_SIZE"
+ENV_PERSIST_REGISTRY_TOKENS = (
+    f"{NanolayerSettings.Config.env_prefix}PERSIST_REGISTRY_TOKENS"
+)
+
+ENV_STATE_DIR = f"{NanolayerSettings.Config.env_prefix}STATE_DIR"
+ENV_APT_LISTS_MAX_AGE = f"{NanolayerSettings.Config.env_prefix}APT_LISTS_MAX_AGE"
+ENV_APT_PREFETCH_WORKERS = f"{NanolayerSettings.Config.env_prefix}APT_PREFETCH_WORKERS"
+ENV_APT_CACHE_DIR = f"{NanolayerSettings.Config.env_prefix}APT_CACHE_DIR"
+ENV_APT_CACHE_MAX_SIZE = f"{NanolayerSettings.Config.env_prefix}APT_CACHE_MAX_SIZE"
+ENV_ENV_SNAPSHOT = f"{NanolayerSettings.Config.env_prefix}ENV_SNAPSHOT"
+ENV_INVOKER_PTY = f"{NanolayerSettings.Config.env_prefix}INVOKER_PTY"
+ENV_INVOKER_MODE = f"{NanolayerSettings.Config.env_prefix}INVOKER_MODE"
+ENV_INVOKER_FIXTURE = f"{NanolayerSettings.Config.env_prefix}INVOKER_FIXTURE"
+ENV_TRACE = f"{NanolayerSettings.Config.env_prefix}TRACE"
+ENV_TRACE_FILE = f"{NanolayerSettings.Config.env_prefix}TRACE_FILE"
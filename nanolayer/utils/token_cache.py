@@ -0,0 +1,124 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from pydantic import BaseModel
+
+from nanolayer.utils.atomic_file import AtomicFile
+from nanolayer.utils.settings import NanolayerSettings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Registry bearer tokens (keyed by the caller, eg. by realm, service and scope)
+    reused until they expire. It also remembers the authentication challenge
+    every repository answered with, so later requests to it can carry a token
+    on the first try.
+    Optionally persisted to <NANOLAYER_CACHE_DIR>/tokens.json (readable by owner
+    only).
+    """
+
+    TOKENS_FILE = "tokens.json"
+
+    # registries may omit expires_in, in which case the spec mandates 60 seconds
+    DEFAULT_EXPIRES_IN = 60
+    # tokens are considered expired a bit early to absorb clock skew and latency
+    EXPIRY_MARGIN = 10
+
+    class Token(BaseModel):
+        token: str
+        expires_at: float
+
+    class Stats(BaseModel):
+        fetches: int = 0
+        fetches_avoided: int = 0
+
+    def __init__(self, persist_location: Optional[Union[str, Path]] = None) -> None:
+        self.persist_location = (
+            Path(persist_location) if persist_location is not None else None
+        )
+        self.challenges: Dict[str, Dict[str, str]] = {}
+        self.tokens: Dict[str, TokenCache.Token] = {}
+        self.stats = TokenCache.Stats()
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_settings(cls) -> "TokenCache":
+        settings = NanolayerSettings()
+        if not (
+            settings.enable_cache
+            and settings.persist_registry_tokens
+            and settings.cache_dir
+        ):
+            return cls()
+        return cls(persist_location=settings.cache_dir)
+
+    def _tokens_file(self) -> Optional[Path]:
+        if self.persist_location is None:
+            return None
+        return self.persist_location.joinpath(self.TOKENS_FILE)
+
+    def _load(self) -> None:
+        tokens_file = self._tokens_file()
+        if tokens_file is None or not tokens_file.is_file():
+            return
+        try:
+            content = json.loads(tokens_file.read_text())
+            self.challenges = dict(content.get("challenges", {}))
+            self.tokens = {
+                key: TokenCache.Token.parse_obj(value)
+                for key, value in content.get("tokens", {}).items()
+                if value.get("expires_at", 0) > time.time()
+            }
+        except ValueError:
+            logger.warning("ignoring corrupted token cache %s", tokens_file)
+
+    def _save(self) -> None:
+        tokens_file = self._tokens_file()
+        if tokens_file is None:
+            return
+        content = {
+            "challenges": self.challenges,
+            "tokens": {key: value.dict() for key, value in self.tokens.items()},
+        }
+        try:
+            AtomicFile.write_text(tokens_file, json.dumps(content), mode=0o600)
+        except OSError as e:
+            logger.warning("could not persist registry tokens: %s", str(e))
+
+    def get_challenge(self, key: str) -> Optional[Dict[str, str]]:
+        return self.challenges.get(key)
+
+    def set_challenge(self, key: str, challenge: Dict[str, str]) -> None:
+        with self._lock:
+            self.challenges[key] = challenge
+            self._save()
+
+    def get_token(self, key: str) -> Optional[str]:
+        token = self.tokens.get(key)
+        if token is None or token.expires_at <= time.time():
+            return None
+        with self._lock:
+            self.stats.fetches_avoided += 1
+        return token.token
+
+    def set_token(self, key: str, token: str, expires_in: Optional[int] = None) -> None:
+        if expires_in is None:
+            expires_in = self.DEFAULT_EXPIRES_IN
+        with self._lock:
+            self.stats.fetches += 1
+            self.tokens[key] = TokenCache.Token(
+                token=token, expires_at=time.time() + expires_in - self.EXPIRY_MARGIN
+            )
+            self._save()
+
+    def invalidate_token(self, key: str) -> None:
+        with self._lock:
+            self.tokens.pop(key, None)
+            self._save()
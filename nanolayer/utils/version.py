@@ -1,9 +1,8 @@
-import json
-import urllib
-import urllib.request
 from importlib.metadata import version
 from typing import List, Optional
 
+from nanolayer.utils.http_client import HttpClient
+
 OWN_REPO = "devcontainers-contrib/nanolayer"
 OWN_PACKAGE = "nanolayer"
 
@@ -13,20 +12,17 @@ def _resolve_package_version(package: str) -> str:
 
 
 def _get_latest_release(repo: str) -> str:
-    response = urllib.request.urlopen(
+    response_json = HttpClient.get_json(
         f"https://api.github.com/repos/{repo}/releases/latest"
-    )  # nosec
-    response_json = json.loads(response.read())
+    )
     resolved_version = response_json["name"]
     return resolved_version
 
 
 def _get_github_tags(repo: str) -> List[str]:
     # todo: solve rate limitting issue
-    response = urllib.request.urlopen(
-        f"https://api.github.com/repos/{repo}/tags"
-    )  # nosec
-    return [tag["name"] for tag in json.loads(response.read())]
+    response_json = HttpClient.get_json(f"https://api.github.com/repos/{repo}/tags")
+    return [tag["name"] for tag in response_json]
 
 
 def resolve_own_package_version() -> str:
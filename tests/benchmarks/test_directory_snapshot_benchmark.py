@@ -0,0 +1,73 @@
+import os
+import pathlib
+import subprocess
+import time
+
+import pytest
+
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
+
+# roughly the lists of a debian image with a few extra repositories
+INDEX_FILES = int(os.getenv("NANOLAYER_BENCHMARK_INDEX_FILES", "40"))
+INDEX_FILE_SIZE = int(
+    os.getenv("NANOLAYER_BENCHMARK_INDEX_FILE_SIZE", str(5 * 1024 * 1024))
+)
+
+
+def _make_lists(path: pathlib.Path) -> None:
+    path.joinpath("partial").mkdir(parents=True)
+    path.joinpath("lock").write_bytes(b"")
+    content = os.urandom(INDEX_FILE_SIZE)
+    for idx in range(INDEX_FILES):
+        path.joinpath(
+            f"deb.debian.org_debian_dists_bookworm_{idx}_Packages"
+        ).write_bytes(content)
+
+
+def _modify(path: pathlib.Path) -> None:
+    # what an apt-get update touches
+    for idx in range(0, INDEX_FILES, 4):
+        new_index = path.joinpath("partial", f"{idx}_Packages")
+        new_index.write_bytes(b"updated")
+        new_index.rename(
+            path.joinpath(f"deb.debian.org_debian_dists_bookworm_{idx}_Packages")
+        )
+
+
+def _shell_snapshot(lists: pathlib.Path, tempdir: pathlib.Path) -> float:
+    # what the installers used to do
+    start = time.perf_counter()
+    subprocess.run(["cp", "-p", "-R", lists.as_posix(), tempdir.as_posix()], check=True)
+    _modify(lists)
+    subprocess.run(
+        f"rm -r {lists} && mv {tempdir}/lists {lists}", shell=True, check=True
+    )
+    return time.perf_counter() - start
+
+
+def _python_snapshot(lists: pathlib.Path) -> float:
+    start = time.perf_counter()
+    with DirectorySnapshot.preserved(lists):
+        _modify(lists)
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize("rounds", [5])
+def test_lists_snapshot(tmp_path: pathlib.Path, rounds: int) -> None:
+    lists = tmp_path / "lists"
+    _make_lists(lists)
+    tempdir = tmp_path / "tempdir"
+    tempdir.mkdir()
+    before = sorted((path.name, path.stat().st_size) for path in lists.iterdir())
+
+    shell = min(_shell_snapshot(lists, tempdir) for _ in range(rounds))
+    python = min(_python_snapshot(lists) for _ in range(rounds))
+
+    size_mb = INDEX_FILES * INDEX_FILE_SIZE / 1024 / 1024
+    print(
+        f"\n{INDEX_FILES} index files, {size_mb:.0f}MB: cp/rm/mv {shell * 1000:.1f}ms, "
+        f"hardlink snapshot {python * 1000:.1f}ms"
+    )
+    assert (
+        sorted((path.name, path.stat().st_size) for path in lists.iterdir()) == before
+    )
@@ -0,0 +1,71 @@
+import os
+import pathlib
+import subprocess
+import time
+
+import pytest
+
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+
+PACKAGES = int(os.getenv("NANOLAYER_BENCHMARK_DPKG_PACKAGES", "3000"))
+LOOKUPS = int(os.getenv("NANOLAYER_BENCHMARK_DPKG_LOOKUPS", "20"))
+
+
+def _write_status(admin_dir: pathlib.Path) -> None:
+    admin_dir.joinpath("info").mkdir(parents=True)
+    admin_dir.joinpath("updates").mkdir()
+    stanzas = []
+    for idx in range(PACKAGES):
+        stanzas.append(
+            f"Package: package-{idx}\n"
+            "Status: install ok installed\n"
+            "Priority: optional\n"
+            "Section: libs\n"
+            "Installed-Size: 1024\n"
+            "Maintainer: Debian Maintainers <maintainers@debian.org>\n"
+            "Architecture: amd64\n"
+            "Multi-Arch: same\n"
+            f"Version: 1.{idx}-1\n"
+            "Depends: libc6 (>= 2.34), libgcc-s1 (>= 3.0)\n"
+            f"Description: package number {idx}\n"
+            " A long description\n"
+            " spanning a few lines\n"
+            " .\n"
+            " like most packages have.\n"
+        )
+    admin_dir.joinpath("status").write_text("\n".join(stanzas))
+
+
+@pytest.mark.skipif(
+    subprocess.run(["which", "dpkg-query"], capture_output=True).returncode != 0,
+    reason="dpkg-query is not available",
+)
+def test_dpkg_status_lookups(tmp_path: pathlib.Path) -> None:
+    _write_status(tmp_path)
+    status_file = tmp_path / "status"
+    packages = [f"package-{idx}" for idx in range(0, PACKAGES, PACKAGES // LOOKUPS)]
+
+    start = time.perf_counter()
+    for package in packages:
+        subprocess.run(
+            ["dpkg-query", f"--admindir={tmp_path}", "-s", package],
+            check=True,
+            capture_output=True,
+        )
+    dpkg_query = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = DpkgStatus.installed(status_file)
+    parse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    missing = DpkgStatus.missing(packages + ["not-installed"], status_file=status_file)
+    lookups = time.perf_counter() - start
+
+    print(
+        f"\n{PACKAGES} packages, {len(packages)} lookups: dpkg-query -s "
+        f"{dpkg_query * 1000:.1f}ms, status index built in {parse * 1000:.1f}ms "
+        f"then looked up in {lookups * 1000:.3f}ms"
+    )
+    assert len(index) == 2 * PACKAGES
+    assert missing == ["not-installed"]
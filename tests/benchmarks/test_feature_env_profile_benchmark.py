@@ -0,0 +1,83 @@
+import os
+import pathlib
+import subprocess
+import time
+from typing import Dict
+
+import pytest
+
+from nanolayer.installers.devcontainer_feature.feature_env_profile import (
+    FeatureEnvProfile,
+)
+
+SHELL_STARTUPS = int(os.getenv("NANOLAYER_BENCHMARK_SHELL_STARTUPS", "50"))
+
+# what /etc/profile does with /etc/profile.d
+SOURCE_PROFILE_DIR = 'for i in "$PROFILE_DIR"/*.sh; do [ -r "$i" ] && . "$i"; done'
+
+
+def _container_env(idx: int) -> Dict[str, str]:
+    # most features prepend to PATH, several of them the same directories
+    return {
+        f"FEATURE_{idx}_HOME": f"/usr/local/feature-{idx}",
+        "PATH": f"/usr/local/feature-{idx}/bin:/usr/local/bin:${{PATH}}",
+    }
+
+
+def _write_legacy_profiles(profile_dir: pathlib.Path, features: int) -> None:
+    # one file per feature, the way nanolayer wrote them before
+    for idx in range(features):
+        profile_dir.joinpath(f"nanolayer-feature-{idx}.sh").write_text(
+            "\n".join(
+                f"export {name}={value}" for name, value in _container_env(idx).items()
+            )
+        )
+
+
+def _time_shell_startups(profile_dir: pathlib.Path) -> float:
+    env = {"PATH": "/usr/bin:/bin", "PROFILE_DIR": profile_dir.as_posix()}
+    start = time.perf_counter()
+    for _ in range(SHELL_STARTUPS):
+        subprocess.run(
+            ["bash", "--noprofile", "--norc", "-c", SOURCE_PROFILE_DIR],
+            env=env,
+            check=True,
+        )
+    return (time.perf_counter() - start) / SHELL_STARTUPS
+
+
+def _path_entries(profile_dir: pathlib.Path) -> int:
+    output = subprocess.run(
+        ["bash", "--noprofile", "--norc", "-c", f'{SOURCE_PROFILE_DIR}; echo "$PATH"'],
+        env={"PATH": "/usr/bin:/bin", "PROFILE_DIR": profile_dir.as_posix()},
+        check=True,
+        capture_output=True,
+    ).stdout
+    return len(output.decode().strip().split(":"))
+
+
+@pytest.mark.parametrize("features", [1, 20, 100])
+def test_shell_startup_with_installed_features(
+    tmp_path: pathlib.Path, features: int
+) -> None:
+    legacy_dir = tmp_path.joinpath("legacy")
+    legacy_dir.mkdir()
+    _write_legacy_profiles(legacy_dir, features)
+
+    profile = FeatureEnvProfile(tmp_path.joinpath("consolidated"), tmp_path)
+    for idx in range(features):
+        profile.update(f"feature-{idx}", _container_env(idx))
+
+    legacy = _time_shell_startups(legacy_dir)
+    consolidated = _time_shell_startups(profile.profile_dir)
+    legacy_entries = _path_entries(legacy_dir)
+    consolidated_entries = _path_entries(profile.profile_dir)
+
+    print(
+        f"\n{features} features: shell startup {legacy * 1000:.2f}ms with a file "
+        f"per feature ({legacy_entries} PATH entries), {consolidated * 1000:.2f}ms "
+        f"consolidated ({consolidated_entries} PATH entries)"
+    )
+    # /usr/local/bin is prepended by every feature but kept once
+    assert consolidated_entries == features + 3
+    assert legacy_entries == 2 * features + 2
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import pathlib
+import time
+import tracemalloc
+from typing import Iterator
+
+import pytest
+from local_registry import LocalOCIRegistry
+
+from nanolayer.utils.oci_registry import OCIRegistry
+
+BLOB_SIZE_MB = int(os.getenv("NANOLAYER_BENCHMARK_BLOB_SIZE_MB", "500"))
+BLOCK = hashlib.sha256(b"nanolayer").digest() * (1024 * 1024 // 32)  # 1MB
+
+
+def _generate_blob() -> Iterator[bytes]:
+    for _ in range(BLOB_SIZE_MB):
+        yield BLOCK
+
+
+def test_download_blob_memory_is_flat(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", "false")
+
+    hasher = hashlib.sha256()
+    for chunk in _generate_blob():
+        hasher.update(chunk)
+    digest = f"sha256:{hasher.hexdigest()}"
+
+    with LocalOCIRegistry() as registry:
+        registry.add_streamed_blob(
+            _generate_blob, digest=digest, size=BLOB_SIZE_MB * len(BLOCK)
+        )
+        oci_ref = registry.ref("devcontainers-contrib/features/large", "1.0.0")
+        output_file = tmp_path.joinpath("blob")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        OCIRegistry.download_blob(
+            oci_input=oci_ref, digest=digest, output_file=output_file
+        )
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(
+        f"\ndownload_blob: {BLOB_SIZE_MB}MB blob in {elapsed:.2f}s, "
+        f"peak traced memory {peak / 1024 / 1024:.2f}MB"
+    )
+    assert output_file.stat().st_size == BLOB_SIZE_MB * len(BLOCK)
+    # memory must stay in the order of the read chunk size, not the blob size
+    assert peak < 8 * OCIRegistry.BLOB_CHUNK_SIZE
@@ -1,7 +1,19 @@
+import contextlib
 import os
+from pathlib import Path
+from typing import Callable, ContextManager, Iterator
 
 import pytest
 
+from nanolayer.installers.apk.apk_installer import ApkInstaller
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import ReplayBackend
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+INVOKER_FIXTURES_DIR = Path(__file__).parent / "resources" / "invoker"
+
 print(f"_PYTEST_RAISE: {os.getenv('_PYTEST_RAISE', '0')}", flush=True)
 if os.getenv("_PYTEST_RAISE", "0") != "0":
 
@@ -12,3 +24,58 @@ if os.getenv("_PYTEST_RAISE", "0") != "0":
     @pytest.hookimpl(tryfirst=True)
     def pytest_internalerror(excinfo):
         raise excinfo.value
+
+
+@pytest.fixture(autouse=True)
+def isolated_nanolayer_cache(
+    tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # keep tests from reading or polluting the user's nanolayer cache and
+    # the machine's install state
+    monkeypatch.setenv(
+        "NANOLAYER_CACHE_DIR", tmp_path_factory.mktemp("nanolayer_cache").as_posix()
+    )
+    monkeypatch.setenv(
+        "NANOLAYER_STATE_DIR", tmp_path_factory.mktemp("nanolayer_state").as_posix()
+    )
+
+
+@pytest.fixture
+def replay_commands(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> Callable[[str, LinuxInformationDesk.LinuxReleaseID], ContextManager]:
+    """
+    Replays tests/resources/invoker/<name>.jsonl on a pretended distro,
+    failing if the commands invoked within the block differ from the ones
+    listed there. These are hand-written expectations in the format of
+    NANOLAYER_INVOKER_MODE=record, not recordings of actual runs, so the
+    output tails they carry are made up (mostly empty).
+    """
+
+    @contextlib.contextmanager
+    def _replay_commands(
+        name: str, release_id: LinuxInformationDesk.LinuxReleaseID
+    ) -> Iterator[ReplayBackend]:
+        def _get_release_id(
+            id_like: bool = False,
+        ) -> LinuxInformationDesk.LinuxReleaseID:
+            if id_like and release_id == LinuxInformationDesk.LinuxReleaseID.ubuntu:
+                return LinuxInformationDesk.LinuxReleaseID.debian
+            return release_id
+
+        monkeypatch.setattr(
+            LinuxInformationDesk, "get_release_id", staticmethod(_get_release_id)
+        )
+        # the caches preserved around the commands
+        monkeypatch.setattr(AptGetInstaller, "LISTS_DIR", tmp_path / "lists")
+        monkeypatch.setattr(ApkInstaller, "CACHE_DIR", tmp_path / "apk")
+        # nothing is installed
+        monkeypatch.setattr(DpkgStatus, "STATUS_FILE", tmp_path / "status")
+        backend = ReplayBackend(INVOKER_FIXTURES_DIR / f"{name}.jsonl")
+        with Invoker.use_backend(backend):
+            try:
+                yield backend
+            finally:
+                backend.assert_replayed()
+
+    return _replay_commands
@@ -0,0 +1,7 @@
+from nanolayer.installers.apk.apk_installer import ApkInstaller
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+
+def test_install_on_alpine(replay_commands) -> None:
+    with replay_commands("apk_alpine", LinuxInformationDesk.LinuxReleaseID.alpine):
+        ApkInstaller.install(packages=["neovim"])
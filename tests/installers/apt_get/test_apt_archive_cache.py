@@ -0,0 +1,110 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from nanolayer.installers.apt_get.apt_archive_cache import AptArchiveCache
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import InvokerBackend
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+DEBS = {f"package-{idx}_1.{idx}-1_amd64.deb": 1000 + idx for idx in range(4)}
+# apt sets the modification time of the files it downloads to Last-Modified
+LAST_MODIFIED = 1_000_000_000
+
+
+class _AptGet(InvokerBackend):
+    # pretends to be apt-get, downloading into the archives it is pointed at
+    ARCHIVES_PATTERN = re.compile(r"-o Dir::Cache::archives=(\S+)")
+
+    def __init__(self) -> None:
+        self.commands: List[str] = []
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        self.commands.append(command)
+        archives = self.ARCHIVES_PATTERN.search(command)
+        if "--print-uris" in command:
+            Path(command.rsplit("> ", 1)[1].strip("'")).write_text(
+                "".join(
+                    f"'http://deb.debian.org/debian/pool/{filename}' {filename} {size} SHA256:{'0' * 64}\n"
+                    for filename, size in DEBS.items()
+                )
+            )
+        elif command.startswith("apt-get install") and archives is not None:
+            for filename, size in DEBS.items():
+                deb = Path(archives.group(1), filename)
+                if not deb.exists() or deb.stat().st_size != size:
+                    deb.write_bytes(b"\0" * size)
+                    os.utime(deb, (LAST_MODIFIED, LAST_MODIFIED))
+        return InvokerBackend.Result(return_code=0)
+
+
+@pytest.fixture
+def apt_get(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[_AptGet]:
+    monkeypatch.setattr(AptGetInstaller, "LISTS_DIR", tmp_path / "lists")
+    monkeypatch.setattr(DpkgStatus, "STATUS_FILE", tmp_path / "status")
+    monkeypatch.setattr(
+        LinuxInformationDesk,
+        "get_release_id",
+        staticmethod(lambda id_like=False: LinuxInformationDesk.LinuxReleaseID.debian),
+    )
+    with Invoker.use_backend(_AptGet()) as backend:
+        yield backend
+
+
+def test_install_uses_cache(
+    tmp_path: Path,
+    apt_get: _AptGet,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    cache_dir = tmp_path / "apt-cache"
+    monkeypatch.setenv("NANOLAYER_APT_CACHE_DIR", cache_dir.as_posix())
+
+    AptGetInstaller.install(packages=["package-0", "package-1"])
+
+    assert apt_get.commands[-2] == (
+        "apt-get install -y --no-install-recommends "
+        f"-o Dir::Cache::archives={cache_dir.as_posix()}/ "
+        "-o APT::Keep-Downloaded-Packages=true package-0 package-1"
+    )
+    # the cache is left out of the clean up
+    assert apt_get.commands[-1] == "apt-get clean"
+    assert sorted(path.name for path in cache_dir.glob("*.deb")) == sorted(DEBS)
+    # touched once used
+    assert all(path.stat().st_mtime > LAST_MODIFIED for path in cache_dir.glob("*.deb"))
+    assert "0 hits (0 bytes), 4 misses (4006 bytes), 0 evicted" in caplog.text
+
+    caplog.clear()
+    AptGetInstaller.install(packages=["package-0", "package-1"])
+    assert "4 hits (4006 bytes), 0 misses (0 bytes), 0 evicted" in caplog.text
+
+
+def test_install_without_cache(apt_get: _AptGet) -> None:
+    AptGetInstaller.install(packages=["package-0"])
+
+    assert apt_get.commands == [
+        "apt-get update -y",
+        "apt-get install -y --no-install-recommends package-0",
+        "apt-get clean",
+    ]
+
+
+def test_prune_evicts_least_recently_used(tmp_path: Path) -> None:
+    for idx, (filename, size) in enumerate(DEBS.items()):
+        deb = tmp_path.joinpath(filename)
+        deb.write_bytes(b"\0" * size)
+        os.utime(deb, (LAST_MODIFIED + idx, LAST_MODIFIED + idx))
+    tmp_path.joinpath("lock").touch()
+
+    cache = AptArchiveCache(location=tmp_path, max_size=2100)
+    assert cache.prune() == (2, 2001)
+
+    assert sorted(path.name for path in tmp_path.glob("*.deb")) == list(DEBS)[2:]
+    assert tmp_path.joinpath("lock").exists()
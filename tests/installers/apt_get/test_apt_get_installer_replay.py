@@ -0,0 +1,107 @@
+import tempfile
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pytest
+
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.installers.apt_get.ppa_source import PpaSource
+from nanolayer.utils.http_client import HttpClient
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import PlanBackend
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+
+def test_install_with_ppa_on_ubuntu(
+    replay_commands, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with tempfile.TemporaryDirectory() as etc_apt:
+        sources_file = Path(etc_apt, "sources.list.d", "nanolayer-ppas.list")
+        monkeypatch.setattr(PpaSource, "SOURCES_FILE", sources_file.as_posix())
+        monkeypatch.setattr(PpaSource, "KEYRINGS_DIR", Path(etc_apt, "keyrings"))
+        monkeypatch.setattr(PpaSource, "codename", staticmethod(lambda: "jammy"))
+        monkeypatch.setattr(
+            PpaSource,
+            "signing_key_fingerprint",
+            staticmethod(
+                lambda owner, name: "9DBB0BE9366964F134855E2255F96FCF8231B6DD"
+            ),
+        )
+        monkeypatch.setattr(
+            PpaSource, "fetch_key", staticmethod(lambda fingerprint: b"key")
+        )
+
+        with replay_commands(
+            "apt_get_ubuntu_ppa", LinuxInformationDesk.LinuxReleaseID.ubuntu
+        ):
+            AptGetInstaller.install(packages=["neovim"], ppas=["neovim-ppa/stable"])
+
+        # the ppa was removed afterwards
+        assert [path for path in Path(etc_apt).rglob("*") if path.is_file()] == []
+
+
+def test_missing_package_still_restores_lists(replay_commands) -> None:
+    with pytest.raises(Invoker.InvokerException) as exception_info:
+        with replay_commands(
+            "apt_get_missing_package", LinuxInformationDesk.LinuxReleaseID.debian
+        ):
+            AptGetInstaller.install(packages=["nosuchpackage"])
+
+    assert "Unable to locate package nosuchpackage" in str(exception_info.value)
+
+
+def _files(root: Path) -> Dict[str, Tuple[int, int]]:
+    # directories included, which a snapshot would replace
+    return {
+        path.relative_to(root).as_posix(): (
+            path.stat().st_ino,
+            path.stat().st_mtime_ns,
+        )
+        for path in [root, *root.rglob("*")]
+    }
+
+
+def test_plan_leaves_the_system_untouched(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capfd: pytest.CaptureFixture
+) -> None:
+    sources_file = tmp_path.joinpath("etc", "sources.list.d", "nanolayer-ppas.list")
+    monkeypatch.setattr(PpaSource, "SOURCES_FILE", sources_file.as_posix())
+    monkeypatch.setattr(PpaSource, "KEYRINGS_DIR", tmp_path.joinpath("etc", "keyrings"))
+    monkeypatch.setattr(AptGetInstaller, "LISTS_DIR", tmp_path / "lists")
+    monkeypatch.setattr(DpkgStatus, "STATUS_FILE", tmp_path / "status")
+    monkeypatch.setattr(
+        LinuxInformationDesk,
+        "get_release_id",
+        staticmethod(
+            lambda id_like=False: (
+                LinuxInformationDesk.LinuxReleaseID.debian
+                if id_like
+                else LinuxInformationDesk.LinuxReleaseID.ubuntu
+            )
+        ),
+    )
+
+    def _request(*args, **kwargs):
+        raise AssertionError("no request is expected in plan mode")
+
+    monkeypatch.setattr(HttpClient, "request", staticmethod(_request))
+    monkeypatch.setenv("NANOLAYER_STATE_DIR", tmp_path.joinpath("state").as_posix())
+    monkeypatch.setenv("NANOLAYER_APT_LISTS_MAX_AGE", "600")
+    tmp_path.joinpath("lists").mkdir()
+    tmp_path.joinpath(
+        "lists", "deb.debian.org_debian_dists_bookworm_InRelease"
+    ).write_text("lists")
+    before = _files(tmp_path)
+
+    with Invoker.use_backend(PlanBackend()) as plan:
+        AptGetInstaller.install(packages=["neovim"], ppas=["neovim-ppa/stable"])
+
+    assert plan.commands == [
+        "apt-get update -y",
+        PpaSource.update_command(),
+        "apt-get install -y --no-install-recommends neovim",
+        "apt-get clean",
+    ]
+    assert _files(tmp_path) == before
+    assert not tmp_path.joinpath("state").exists()
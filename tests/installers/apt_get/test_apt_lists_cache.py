@@ -0,0 +1,111 @@
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.apt_lists_cache import AptListsCache
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import InvokerBackend, PlanBackend
+
+
+class _AptGet(InvokerBackend):
+    # records the commands as if they succeeded, without running them
+    def __init__(self) -> None:
+        self.commands: List[str] = []
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        self.commands.append(command)
+        return InvokerBackend.Result(return_code=0)
+
+
+@pytest.fixture
+def lists_cache(tmp_path: Path) -> AptListsCache:
+    sources_dir = tmp_path.joinpath("sources.list.d")
+    sources_dir.mkdir()
+    tmp_path.joinpath("sources.list").write_text(
+        "deb http://deb.debian.org/debian bookworm main\n"
+    )
+    lists_dir = tmp_path.joinpath("lists")
+    lists_dir.mkdir()
+    # what apt-get update leaves behind (the fake backend doesn't run it)
+    lists_dir.joinpath("deb.debian.org_debian_dists_bookworm_InRelease").write_text(
+        "fresh"
+    )
+    return AptListsCache(
+        location=tmp_path.joinpath("state"),
+        lists_dir=lists_dir,
+        max_age=600,
+        sources=[tmp_path.joinpath("sources.list"), sources_dir],
+    )
+
+
+def test_reuses_recent_lists_of_same_sources(
+    lists_cache: AptListsCache, capfd: pytest.CaptureFixture
+) -> None:
+    with Invoker.use_backend(_AptGet()) as apt_get:
+        lists_cache.update()
+        # the installer restored the lists it found
+        shutil.rmtree(lists_cache.lists_dir)
+        lists_cache.update()
+
+    assert apt_get.commands == ["apt-get update -y"]
+    assert [path.read_text() for path in lists_cache.lists_dir.iterdir()] == ["fresh"]
+
+
+def test_updates_when_sources_change(
+    lists_cache: AptListsCache, capfd: pytest.CaptureFixture
+) -> None:
+    with Invoker.use_backend(_AptGet()) as apt_get:
+        lists_cache.update()
+        lists_cache.sources[1].joinpath("neovim-ppa.list").write_text(
+            "deb https://ppa.launchpadcontent.net/neovim-ppa/stable/ubuntu jammy main\n"
+        )
+        lists_cache.update()
+        lists_cache.sources[1].joinpath("neovim-ppa.list").unlink()
+        lists_cache.update()
+
+    assert apt_get.commands == ["apt-get update -y", "apt-get update -y"]
+
+
+def test_updates_when_lists_are_too_old(
+    lists_cache: AptListsCache,
+    monkeypatch: pytest.MonkeyPatch,
+    capfd: pytest.CaptureFixture,
+) -> None:
+    with Invoker.use_backend(_AptGet()) as apt_get:
+        lists_cache.update()
+        later = time.time() + 601
+        monkeypatch.setattr(time, "time", lambda: later)
+        lists_cache.update()
+
+    assert apt_get.commands == ["apt-get update -y", "apt-get update -y"]
+    # only the lists of the last update are kept
+    assert len([path for path in lists_cache.location.iterdir() if path.is_dir()]) == 1
+
+
+def test_reuse_is_opt_in(
+    monkeypatch: pytest.MonkeyPatch, capfd: pytest.CaptureFixture
+) -> None:
+    with Invoker.use_backend(PlanBackend()) as plan:
+        AptGetInstaller.update()
+        AptGetInstaller.update()
+    assert plan.commands == ["apt-get update -y", "apt-get update -y"]
+
+    monkeypatch.setenv("NANOLAYER_APT_LISTS_MAX_AGE", "600")
+    assert AptListsCache.from_settings(AptGetInstaller.LISTS_DIR) is not None
+
+
+def test_lists_are_left_alone_when_commands_are_not_run(
+    lists_cache: AptListsCache, capfd: pytest.CaptureFixture
+) -> None:
+    with Invoker.use_backend(PlanBackend()) as plan:
+        lists_cache.update()
+        lists_cache.update()
+
+    assert plan.commands == ["apt-get update -y", "apt-get update -y"]
+    assert not lists_cache.location.exists()
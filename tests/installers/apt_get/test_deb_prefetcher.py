@@ -0,0 +1,143 @@
+import hashlib
+import http.server
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.deb_prefetcher import DebPrefetcher
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.http_client import HttpClient
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import InvokerBackend
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+DEBS = {
+    f"/debian/pool/main/p/package-{idx}/package-{idx}_1.{idx}-1_amd64.deb": bytes([idx])
+    * (100_000 + idx)
+    for idx in range(8)
+}
+MIRROR_LATENCY = 0.2
+
+
+class _Mirror(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        time.sleep(MIRROR_LATENCY)
+        body = DEBS.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+
+@pytest.fixture
+def mirror_url() -> Iterator[str]:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Mirror)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    HttpClient.close_connections()
+    server.shutdown()
+    server.server_close()
+
+
+def _print_uris(mirror_url: str, corrupted: str = "") -> str:
+    lines = []
+    for path, content in DEBS.items():
+        sha256 = hashlib.sha256(content).hexdigest()
+        if path == corrupted:
+            sha256 = "0" * 64
+        lines.append(
+            f"'{mirror_url}{path}' {path.rsplit('/', 1)[1]} {len(content)} SHA256:{sha256}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def test_parse_uris() -> None:
+    assert DebPrefetcher.parse_uris(
+        "'http://deb.debian.org/debian/pool/main/v/vim/vim_2%3a9.0.1378-2_amd64.deb' "
+        "vim_2%3a9.0.1378-2_amd64.deb 1567752 SHA256:abc\n"
+        "'file:/var/local/repo/tool_1.0_all.deb' tool_1.0_all.deb 10 MD5Sum:def\n"
+        "Reading package lists...\n"
+    ) == [
+        DebPrefetcher.Download(
+            uri="http://deb.debian.org/debian/pool/main/v/vim/vim_2%3a9.0.1378-2_amd64.deb",
+            filename="vim_2%3a9.0.1378-2_amd64.deb",
+            size=1567752,
+            hash_algorithm="sha256",
+            hash_value="abc",
+        ),
+        DebPrefetcher.Download(
+            uri="file:/var/local/repo/tool_1.0_all.deb",
+            filename="tool_1.0_all.deb",
+            size=10,
+            hash_algorithm="md5",
+            hash_value="def",
+        ),
+    ]
+
+
+def test_fetch_concurrently_and_verified(tmp_path: Path, mirror_url: str) -> None:
+    corrupted = next(iter(DEBS))
+    downloads = DebPrefetcher.parse_uris(_print_uris(mirror_url, corrupted=corrupted))
+
+    start = time.perf_counter()
+    fetched = DebPrefetcher.fetch(downloads, archives_dir=tmp_path, max_workers=8)
+    elapsed = time.perf_counter() - start
+
+    assert fetched == len(DEBS) - 1
+    # one file with a wrong hash is left for apt, and nothing partial remains
+    assert not tmp_path.joinpath(corrupted.rsplit("/", 1)[1]).exists()
+    assert list(tmp_path.joinpath("partial").iterdir()) == []
+    for path, content in list(DEBS.items())[1:]:
+        assert tmp_path.joinpath(path.rsplit("/", 1)[1]).read_bytes() == content
+    # serially, that would take len(DEBS) * MIRROR_LATENCY
+    assert elapsed < len(DEBS) * MIRROR_LATENCY / 2
+
+
+class _AptGet(InvokerBackend):
+    # pretends to be apt-get, printing the uris of the mirror
+    def __init__(self, uris: str) -> None:
+        self.uris = uris
+        self.commands: List[str] = []
+
+    def run(
+        self, command: str, envs: Dict[str, str], echo: bool = True
+    ) -> InvokerBackend.Result:
+        self.commands.append(command)
+        if "--print-uris" in command:
+            Path(command.rsplit("> ", 1)[1].strip("'")).write_text(self.uris)
+        return InvokerBackend.Result(return_code=0)
+
+
+def test_install_prefetches_into_archives(
+    tmp_path: Path, mirror_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("NANOLAYER_APT_PREFETCH_WORKERS", "4")
+    monkeypatch.setattr(DebPrefetcher, "ARCHIVES_DIR", tmp_path / "archives")
+    monkeypatch.setattr(AptGetInstaller, "LISTS_DIR", tmp_path / "lists")
+    monkeypatch.setattr(DpkgStatus, "STATUS_FILE", tmp_path / "status")
+    monkeypatch.setattr(
+        LinuxInformationDesk,
+        "get_release_id",
+        staticmethod(lambda id_like=False: LinuxInformationDesk.LinuxReleaseID.debian),
+    )
+
+    with Invoker.use_backend(_AptGet(_print_uris(mirror_url))) as apt_get:
+        AptGetInstaller.install(packages=["package-0", "package-1"])
+
+    assert [command.split(" >")[0] for command in apt_get.commands] == [
+        "apt-get update -y",
+        "apt-get install -y -qq --no-install-recommends --print-uris package-0 package-1",
+        "apt-get install -y --no-install-recommends package-0 package-1",
+        "apt-get clean",
+    ]
+    assert len(list(tmp_path.joinpath("archives").glob("*.deb"))) == len(DEBS)
@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import pytest
+
+from nanolayer.installers.apt_get.apt_get_installer import AptGetInstaller
+from nanolayer.installers.apt_get.dpkg_status import DpkgStatus
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import PlanBackend
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+STATUS = """\
+Package: bash
+Essential: yes
+Status: install ok installed
+Priority: required
+Architecture: amd64
+Version: 5.2.15-2+b2
+Description: GNU Bourne Again SHell
+ Bash is an sh-compatible command language interpreter.
+ .
+ Version: not a field
+
+Package: libc6
+Status: install ok installed
+Architecture: amd64
+Multi-Arch: same
+Version: 2.36-9+deb12u4
+
+Package: vim
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 2:9.0.1378-2
+
+Package: g++
+Status: install ok installed
+Architecture: amd64
+Version: 4:12.2.0-3
+"""
+
+
+@pytest.fixture
+def status_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    status_file = tmp_path / "status"
+    status_file.write_text(STATUS)
+    monkeypatch.setattr(DpkgStatus, "STATUS_FILE", status_file.as_posix())
+    return status_file
+
+
+def test_parse() -> None:
+    assert DpkgStatus.parse(STATUS) == {
+        "bash": "5.2.15-2+b2",
+        "bash:amd64": "5.2.15-2+b2",
+        "libc6": "2.36-9+deb12u4",
+        "libc6:amd64": "2.36-9+deb12u4",
+        "g++": "4:12.2.0-3",
+        "g++:amd64": "4:12.2.0-3",
+    }
+
+
+def test_missing(status_file: Path) -> None:
+    assert DpkgStatus.missing(
+        [
+            "bash",
+            "libc6:amd64",
+            "g++",
+            "bash=5.2.15-2+b2",
+            "libc6:i386",
+            "vim",
+            "bash=5.1",
+            "neovim",
+            "bash/bookworm-backports",
+            "bash-",
+            "awk",
+        ]
+    ) == [
+        "libc6:i386",
+        "vim",
+        "bash=5.1",
+        "neovim",
+        "bash/bookworm-backports",
+        "bash-",
+        "awk",
+    ]
+
+
+def test_index_follows_status_file(status_file: Path) -> None:
+    assert not DpkgStatus.is_installed("neovim")
+    status_file.write_text(
+        STATUS + "\nPackage: neovim\nStatus: install ok installed\nVersion: 0.7.2-7\n"
+    )
+    assert DpkgStatus.is_installed("neovim")
+    assert DpkgStatus.installed(status_file.parent / "missing") == {}
+
+
+def test_install_skipped_when_nothing_is_missing(
+    status_file: Path, monkeypatch: pytest.MonkeyPatch, capfd: pytest.CaptureFixture
+) -> None:
+    monkeypatch.setattr(
+        LinuxInformationDesk,
+        "get_release_id",
+        staticmethod(lambda id_like=False: LinuxInformationDesk.LinuxReleaseID.debian),
+    )
+    with Invoker.use_backend(PlanBackend()) as plan:
+        AptGetInstaller.install(packages=["bash", "g++"], ppas=["neovim-ppa/stable"])
+        assert plan.commands == []
+
+        AptGetInstaller.install(packages=["bash", "neovim"])
+        assert "apt-get install -y --no-install-recommends neovim" in plan.commands
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import http.server
+import json
+import threading
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+from nanolayer.installers.apt_get.ppa_source import PpaSource
+from nanolayer.utils.http_client import HttpClient
+
+# a v4 rsa public key packet (old format, 2 bytes length), made up
+KEY_BODY = (
+    b"\x04"
+    + (1_600_000_000).to_bytes(4, "big")
+    + b"\x01"
+    + (2048).to_bytes(2, "big")
+    + bytes(range(256))
+    + (17).to_bytes(2, "big")
+    + b"\x01\x00\x01"
+)
+KEY = b"\x99" + len(KEY_BODY).to_bytes(2, "big") + KEY_BODY
+FINGERPRINT = hashlib.sha1(KEY).hexdigest().upper()  # nosec
+
+
+def _armor(key: bytes) -> str:
+    body = base64.b64encode(key).decode()
+    checksum = base64.b64encode(PpaSource._crc24(key).to_bytes(3, "big")).decode()
+    lines = [body[idx : idx + 64] for idx in range(0, len(body), 64)]
+    return "\n".join(
+        [PpaSource.ARMOR_BEGIN, "Comment: Hostname:", ""]
+        + lines
+        + [f"={checksum}", PpaSource.ARMOR_END, ""]
+    )
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    served_key = KEY
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/~neovim-ppa/+archive/ubuntu/stable":
+            self._send(json.dumps({"signing_key_fingerprint": FINGERPRINT}).encode())
+        elif self.path == f"/pks/lookup?op=get&options=mr&search=0x{FINGERPRINT}":
+            self._send(_armor(_Handler.served_key).encode())
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+@pytest.fixture
+def launchpad(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    _Handler.served_key = KEY
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    monkeypatch.setattr(PpaSource, "LAUNCHPAD_API", url)
+    monkeypatch.setattr(PpaSource, "KEYSERVER", url)
+    monkeypatch.setattr(PpaSource, "KEYRINGS_DIR", tmp_path / "keyrings")
+    monkeypatch.setattr(
+        PpaSource, "SOURCES_FILE", tmp_path / "sources.list.d" / "nanolayer-ppas.list"
+    )
+    monkeypatch.setattr(PpaSource, "codename", staticmethod(lambda: "jammy"))
+    yield tmp_path
+
+    HttpClient.close_connections()
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse() -> None:
+    assert PpaSource.parse("ppa:neovim-ppa/stable") == ("neovim-ppa", "stable")
+    assert PpaSource.parse("ppa:git-core") == ("git-core", "ppa")
+    with pytest.raises(PpaSource.PpaSourceError):
+        PpaSource.parse("neovim-ppa/stable")
+
+
+def test_dearmor_checks_crc() -> None:
+    assert PpaSource.dearmor(_armor(KEY)) == KEY
+    assert PpaSource.primary_key_fingerprint(KEY) == FINGERPRINT
+
+    corrupted = _armor(KEY).replace(base64.b64encode(KEY)[:8].decode(), "AAAAAAAA", 1)
+    with pytest.raises(PpaSource.PpaSourceError):
+        PpaSource.dearmor(corrupted)
+
+
+def test_add_and_remove(launchpad: Path) -> None:
+    PpaSource.add(["ppa:neovim-ppa/stable"])
+
+    keyring = launchpad / "keyrings" / "nanolayer-ppa-neovim-ppa-stable.gpg"
+    assert keyring.read_bytes() == KEY
+    assert Path(PpaSource.SOURCES_FILE).read_text() == (
+        f"deb [signed-by={keyring}] https://ppa.launchpadcontent.net/neovim-ppa/stable/ubuntu jammy main\n"
+    )
+    assert f"Dir::Etc::sourcelist={PpaSource.SOURCES_FILE} " in (
+        PpaSource.update_command()
+    )
+
+    PpaSource.remove(["ppa:neovim-ppa/stable"])
+    assert not keyring.exists() and not Path(PpaSource.SOURCES_FILE).exists()
+
+
+def test_rejects_key_of_another_fingerprint(launchpad: Path) -> None:
+    _Handler.served_key = KEY[:-1] + b"\x03"
+    with pytest.raises(PpaSource.PpaSourceError, match="instead of"):
+        PpaSource.add(["ppa:neovim-ppa/stable"])
+
+
+@pytest.mark.parametrize(
+    "served_key",
+    [
+        # a v3 key, whose fingerprint can't be compared
+        KEY[:3] + b"\x03" + KEY[4:],
+        # a public key packet cut short
+        KEY[: len(KEY) // 2],
+        # not a public key packet
+        b"\xb4\x04name",
+    ],
+    ids=["v3", "truncated", "user-id"],
+)
+def test_rejects_key_which_cant_be_checked(launchpad: Path, served_key: bytes) -> None:
+    _Handler.served_key = served_key
+    with pytest.raises(PpaSource.PpaSourceError):
+        PpaSource.add(["ppa:neovim-ppa/stable"])
+    assert not (launchpad / "keyrings").exists()
@@ -0,0 +1,8 @@
+from nanolayer.installers.aptitude.aptitude_installer import AptitudeInstaller
+from nanolayer.utils.linux_information_desk import LinuxInformationDesk
+
+
+def test_install_without_aptitude_on_debian(replay_commands) -> None:
+    # aptitude is installed with apt-get first, then purged
+    with replay_commands("aptitude_debian", LinuxInformationDesk.LinuxReleaseID.debian):
+        AptitudeInstaller.install(packages=["neovim"])
@@ -0,0 +1,52 @@
+import pytest
+
+from nanolayer.installers.devcontainer_feature.devcontainer_json import (
+    DevcontainerJson,
+)
+
+DEVCONTAINER_JSON = """
+// comments are allowed
+{
+    "name": "example // not a comment",
+    /* neither are block comments */
+    "features": {
+        "ghcr.io/devcontainers/features/node:1": {
+            "version": "18",
+            "nodeGypDependencies": false,
+            "pnpmVersion": 8,
+        },
+        "ghcr.io/devcontainers/features/python:1": "3.11",
+        "ghcr.io/devcontainers/features/common-utils:2": {},
+    },
+    "overrideFeatureInstallOrder": ["ghcr.io/devcontainers/features/common-utils"],
+    "remoteUser": "vscode",
+}
+"""
+
+
+def test_devcontainer_json_features() -> None:
+    config = DevcontainerJson.parse(DEVCONTAINER_JSON)
+
+    assert config["name"] == "example // not a comment"
+    assert DevcontainerJson.remote_user(config) == "vscode"
+    assert DevcontainerJson.features(config) == [
+        ("ghcr.io/devcontainers/features/common-utils:2", {}),
+        (
+            "ghcr.io/devcontainers/features/node:1",
+            {"version": "18", "nodeGypDependencies": False, "pnpmVersion": "8"},
+        ),
+        ("ghcr.io/devcontainers/features/python:1", {"version": "3.11"}),
+    ]
+    assert DevcontainerJson.install_order(config) == [
+        "ghcr.io/devcontainers/features/common-utils"
+    ]
+
+
+@pytest.mark.parametrize(
+    "feature_ref", ["./local-feature", "https://example.com/feature.tgz", "node"]
+)
+def test_devcontainer_json_rejects_non_oci_features(feature_ref: str) -> None:
+    config = DevcontainerJson.parse(f'{{"features": {{"{feature_ref}": {{}}}}}}')
+
+    with pytest.raises(DevcontainerJson.DevcontainerJsonError):
+        DevcontainerJson.features(config)
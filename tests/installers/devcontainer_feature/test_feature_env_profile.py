@@ -0,0 +1,62 @@
+import pathlib
+import subprocess
+
+from nanolayer.installers.devcontainer_feature.feature_env_profile import (
+    FeatureEnvProfile,
+)
+
+
+def _source(profile_file: pathlib.Path, times: int = 1) -> dict:
+    script = f". {profile_file}\n" * times + "env -0"
+    output = subprocess.run(
+        ["bash", "--noprofile", "--norc", "-c", script],
+        env={"PATH": "/usr/bin:/bin", "EXISTING": "value"},
+        check=True,
+        capture_output=True,
+    ).stdout
+    return dict(
+        line.split("=", 1) for line in output.decode().split("\0") if "=" in line
+    )
+
+
+def test_feature_env_profile_merges_path_style_variables(
+    tmp_path: pathlib.Path,
+) -> None:
+    profile = FeatureEnvProfile(tmp_path.joinpath("profile.d"), tmp_path)
+    profile.update(
+        "go", {"GOPATH": "/go", "PATH": "/usr/local/go/bin:${GOPATH}/bin:${PATH}"}
+    )
+    profile.update("node", {"PATH": "/usr/local/node/bin:$PATH:/opt/node"})
+    profile.update(
+        "python", {"PATH": "/usr/local/node/bin:/usr/local/python/bin:${PATH}"}
+    )
+    profile.update("quoted", {"GREETING": 'hello "world" ${EXISTING}'})
+
+    env = _source(profile.profile_file, times=2)
+
+    assert env["PATH"] == (
+        "/usr/local/node/bin:/usr/local/python/bin:/usr/local/go/bin:/go/bin"
+        ":/usr/bin:/bin:/opt/node"
+    )
+    assert env["GOPATH"] == "/go"
+    assert env["GREETING"] == 'hello "world" value'
+
+
+def test_feature_env_profile_replaces_feature_entries(tmp_path: pathlib.Path) -> None:
+    profile_dir = tmp_path.joinpath("profile.d")
+    profile_dir.mkdir()
+    legacy_profile = profile_dir.joinpath("nanolayer-go.sh")
+    legacy_profile.write_text("export GOPATH=/old")
+
+    profile = FeatureEnvProfile(profile_dir, tmp_path)
+    profile.update("go", {"GOPATH": "/old", "PATH": "/old/bin:${PATH}"})
+    profile.update("go", {"GOPATH": "/go"})
+
+    assert not legacy_profile.exists()
+    assert list(profile.load_index()) == ["go"]
+    env = _source(profile.profile_file)
+    assert env["GOPATH"] == "/go"
+    assert env["PATH"] == "/usr/bin:/bin"
+
+    profile.update("go", {})
+    assert profile.load_index() == {}
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from local_registry import LocalOCIRegistry
+
+from nanolayer.installers.devcontainer_feature.oci_feature import OCIFeature
+
+TEST_FEATURE = {
+    "id": "local",
+    "version": "1.0.0",
+    "options": {"version": {"type": "string", "default": "latest", "proposals": []}},
+    "installsAfter": ["ghcr.io/devcontainers/features/common-utils"],
+}
+
+
+def test_oci_feature_inspect_reads_manifest_annotations() -> None:
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local",
+            "1.0.0",
+            TEST_FEATURE,
+            annotations={
+                OCIFeature.DEVCONTAINER_METADATA_ANNOTATION: json.dumps(TEST_FEATURE)
+            },
+        )
+
+        feature = OCIFeature.inspect(feature_ref)
+
+        assert feature.id == "local"
+        assert feature.installsAfter == TEST_FEATURE["installsAfter"]
+        assert registry.requests["blobs"] == 0
+
+
+@pytest.mark.parametrize("enable_cache", ["true", "false"])
+def test_oci_feature_inspect_reads_layer_stream(
+    monkeypatch: pytest.MonkeyPatch, enable_cache: str
+) -> None:
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", enable_cache)
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local", "1.0.0", TEST_FEATURE
+        )
+
+        feature = OCIFeature.inspect(feature_ref)
+
+        assert feature.id == "local"
+        assert feature.options["version"].__root__.default == "latest"
+        assert registry.requests["blobs"] == 1
+
+
+def test_oci_feature_inspect_raises_without_metadata() -> None:
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        layer = LocalOCIRegistry.make_layer({"./install.sh": b"echo hi"})
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(layer)])
+
+        with pytest.raises(OCIFeature.FeatureMetadataNotFound):
+            OCIFeature.inspect(registry.ref(path, "1.0.0"))
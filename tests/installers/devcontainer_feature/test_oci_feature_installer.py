@@ -0,0 +1,277 @@
+import json
+import pathlib
+from typing import List
+
+import pytest
+from local_registry import LocalOCIRegistry
+
+from nanolayer.installers.devcontainer_feature.oci_feature_installer import (
+    OCIFeatureInstaller,
+)
+from nanolayer.utils.env_snapshot import EnvSnapshot
+from nanolayer.utils.invoker import Invoker
+
+TEST_FEATURE = {
+    "id": "local",
+    "version": "1.0.0",
+    "options": {"version": {"type": "string", "default": "latest", "proposals": []}},
+    "containerEnv": {"LOCAL_HOME": "/usr/local/local"},
+}
+
+
+@pytest.fixture
+def invoked_commands(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> List[str]:
+    commands: List[str] = []
+
+    def _invoke(command: str, *args, **kwargs) -> int:
+        commands.append(command)
+        return 0
+
+    monkeypatch.setattr(Invoker, "invoke", _invoke)
+    monkeypatch.setattr(
+        OCIFeatureInstaller, "_PROFILE_DIR", tmp_path.joinpath("profile.d").as_posix()
+    )
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", "false")
+    return commands
+
+
+def test_oci_feature_installer_fetches_feature_once(
+    invoked_commands: List[str], tmp_path: pathlib.Path
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local", "1.0.0", TEST_FEATURE
+        )
+
+        OCIFeatureInstaller.install(feature_ref=feature_ref, options={})
+
+        assert registry.requests["manifests"] == 1
+        assert registry.requests["blobs"] == 1
+
+    assert len(invoked_commands) == 1
+    assert 'VERSION="latest"' in invoked_commands[0]
+    assert invoked_commands[0].endswith("./install.sh")
+    assert (
+        "LOCAL_HOME"
+        in tmp_path.joinpath("profile.d", "nanolayer-features.sh").read_text()
+    )
+
+
+def test_oci_feature_installer_installs_from_oci_layout(
+    invoked_commands: List[str], tmp_path: pathlib.Path
+) -> None:
+    registry = LocalOCIRegistry()
+    path = "devcontainers-contrib/features/local"
+    registry.add_feature_manifest(path, "1.0.0", TEST_FEATURE)
+    registry.export_layout(path, ["1.0.0"], tmp_path.joinpath("layout"))
+
+    OCIFeatureInstaller.install(
+        feature_ref=f"oci-layout://{tmp_path.joinpath('layout')}:1.0.0", options={}
+    )
+
+    assert len(invoked_commands) == 1
+    assert invoked_commands[0].endswith("./install.sh")
+
+
+def _ordered_feature(feature_id: str, installs_after: List[str]) -> dict:
+    return {
+        "id": feature_id,
+        "version": "1.0.0",
+        "options": {"name": {"type": "string", "default": feature_id}},
+        "installsAfter": installs_after,
+    }
+
+
+def test_oci_feature_installer_install_many_follows_installs_after(
+    invoked_commands: List[str],
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_refs = [
+            registry.add_feature(
+                "devcontainers/features/node",
+                "1",
+                _ordered_feature("node", ["ghcr.io/devcontainers/features/common"]),
+            ),
+            registry.add_feature(
+                "devcontainers/features/python",
+                "1",
+                _ordered_feature("python", [f"{registry.registry}/other/node"]),
+            ),
+            registry.add_feature(
+                "devcontainers/features/common", "1", _ordered_feature("common", [])
+            ),
+        ]
+
+        OCIFeatureInstaller.install_many(
+            features=[(feature_ref, {}) for feature_ref in feature_refs]
+        )
+
+        assert registry.requests["blobs"] == 3
+
+    installed = [
+        command.split('NAME="')[1].split('"')[0] for command in invoked_commands
+    ]
+    assert installed == ["common", "node", "python"]
+
+
+def test_oci_feature_installer_install_order_overrides_installs_after(
+    invoked_commands: List[str],
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_refs = [
+            registry.add_feature(
+                "devcontainers/features/node",
+                "1",
+                _ordered_feature("node", ["ghcr.io/devcontainers/features/common"]),
+            ),
+            registry.add_feature(
+                "devcontainers/features/python", "1", _ordered_feature("python", [])
+            ),
+            registry.add_feature(
+                "devcontainers/features/common", "1", _ordered_feature("common", [])
+            ),
+        ]
+
+        OCIFeatureInstaller.install_many(
+            features=[(feature_ref, {}) for feature_ref in feature_refs],
+            install_order=[f"{registry.registry}/devcontainers/features/node"],
+        )
+
+    installed = [
+        command.split('NAME="')[1].split('"')[0] for command in invoked_commands
+    ]
+    # node goes first although it is to be installed after common
+    assert installed == ["node", "python", "common"]
+
+
+def test_oci_feature_installer_install_many_detects_cycles(
+    invoked_commands: List[str],
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_refs = [
+            registry.add_feature(
+                "devcontainers/features/a", "1", _ordered_feature("a", ["b"])
+            ),
+            registry.add_feature(
+                "devcontainers/features/b", "1", _ordered_feature("b", ["a"])
+            ),
+        ]
+
+        with pytest.raises(OCIFeatureInstaller.OCIFeatureInstallerError):
+            OCIFeatureInstaller.install_many(
+                features=[(feature_ref, {}) for feature_ref in feature_refs]
+            )
+
+    assert invoked_commands == []
+
+
+def test_oci_feature_installer_skips_installed_features(
+    invoked_commands: List[str],
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local", "1.0.0", TEST_FEATURE
+        )
+
+        OCIFeatureInstaller.install(feature_ref=feature_ref, options={})
+        # same options once resolved against their defaults
+        OCIFeatureInstaller.install(
+            feature_ref=feature_ref, options={"version": "latest"}
+        )
+        assert len(invoked_commands) == 1
+        assert registry.requests["blobs"] == 1
+
+        OCIFeatureInstaller.install(feature_ref=feature_ref, options={"version": "2"})
+        assert len(invoked_commands) == 2
+
+        OCIFeatureInstaller.install(
+            feature_ref=feature_ref, options={"version": "2"}, reinstall=True
+        )
+        assert len(invoked_commands) == 3
+
+
+def test_oci_feature_installer_invokes_entrypoints_of_installed_features_only(
+    invoked_commands: List[str],
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_refs = [
+            registry.add_feature(
+                f"devcontainers-contrib/features/{feature_id}",
+                "1.0.0",
+                {
+                    **_ordered_feature(feature_id, []),
+                    "entrypoint": f"/usr/local/share/{feature_id}-init.sh",
+                },
+            )
+            for feature_id in ("first", "second")
+        ]
+
+        OCIFeatureInstaller.install(
+            feature_ref=feature_refs[0], options={}, invoke_entrypoint=True
+        )
+        invoked_commands.clear()
+        OCIFeatureInstaller.install_many(
+            features=[(feature_ref, {}) for feature_ref in feature_refs],
+            invoke_entrypoint=True,
+        )
+
+    # the first feature was skipped, its script and entrypoint are not run
+    assert len(invoked_commands) == 2
+    assert 'NAME="second"' in invoked_commands[0]
+    assert invoked_commands[1] == "/usr/local/share/second-init.sh"
+
+
+def test_oci_feature_installer_env_snapshot(
+    invoked_commands: List[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    invoked_envs = []
+
+    def _invoke(command: str, *args, envs=None, **kwargs) -> int:
+        invoked_commands.append(command)
+        invoked_envs.append(envs)
+        return 0
+
+    monkeypatch.setattr(Invoker, "invoke", _invoke)
+    monkeypatch.setattr(
+        EnvSnapshot, "capture", staticmethod(lambda: {"FROM_RC_FILES": "1"})
+    )
+
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local", "1.0.0", TEST_FEATURE
+        )
+        OCIFeatureInstaller.install(
+            feature_ref=feature_ref, options={}, env_snapshot=True
+        )
+
+    assert " -i " not in invoked_commands[0]
+    assert invoked_envs[0] == {"FROM_RC_FILES": "1"}
+
+
+def test_oci_feature_installer_writes_report(
+    invoked_commands: List[str], tmp_path: pathlib.Path
+) -> None:
+    with LocalOCIRegistry() as registry:
+        feature_ref = registry.add_feature(
+            "devcontainers-contrib/features/local", "1.0.0", TEST_FEATURE
+        )
+        OCIFeatureInstaller.install(
+            feature_ref=feature_ref,
+            options={},
+            report_file=tmp_path.joinpath("report.json"),
+        )
+
+    phases = json.loads(tmp_path.joinpath("report.json").read_text())["phases"]
+    assert {phase["name"] for phase in phases} == {
+        "manifest",
+        "blob_download",
+        "extraction",
+        "options",
+        "install_script",
+        "set_envs",
+    }
+    assert all(phase["feature"] == feature_ref for phase in phases)
+    blob_download = next(phase for phase in phases if phase["name"] == "blob_download")
+    assert blob_download["bytes_transferred"] > 0
@@ -0,0 +1,281 @@
+import hashlib
+import http.server
+import io
+import json
+import tarfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+BlobContent = Union[bytes, Callable[[], Iterator[bytes]]]
+
+
+class LocalOCIRegistry:
+    """
+    Minimal stand-in for an OCI distribution registry, served over plain http
+    on 127.0.0.1 so tests can exercise OCIRegistry without network access.
+    Every request is counted per kind ("manifests" / "blobs" / "token" /
+    "unauthorized") in `requests`.
+    With require_token, it challenges anonymous requests the way ghcr.io does.
+    """
+
+    TOKEN = "local-registry-token"
+
+    def __init__(
+        self, require_token: bool = False, token_expires_in: int = 300
+    ) -> None:
+        self.require_token = require_token
+        self.token_expires_in = token_expires_in
+        self.manifests: Dict[str, Dict[str, Any]] = {}
+        self.blobs: Dict[str, BlobContent] = {}
+        self.blob_sizes: Dict[str, int] = {}
+        self.requests: Counter = Counter()
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def registry(self) -> str:
+        assert self._server is not None, "registry is not running"
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    def ref(self, path: str, tag: str) -> str:
+        return f"{self.registry}/{path}:{tag}"
+
+    def add_blob(self, content: bytes) -> str:
+        digest = f"sha256:{hashlib.sha256(content).hexdigest()}"
+        self.blobs[digest] = content
+        self.blob_sizes[digest] = len(content)
+        return digest
+
+    @staticmethod
+    def make_layer(files: Dict[str, bytes]) -> bytes:
+        layer = io.BytesIO()
+        with tarfile.open(fileobj=layer, mode="w:gz") as tar:
+            for name, content in files.items():
+                member = tarfile.TarInfo(name)
+                member.size = len(content)
+                member.mode = 0o755
+                tar.addfile(member, io.BytesIO(content))
+        return layer.getvalue()
+
+    def add_feature(
+        self,
+        path: str,
+        tag: str,
+        feature: Dict[str, Any],
+        install_script: str = "#!/bin/bash\necho installed\n",
+        annotations: Optional[Dict[str, str]] = None,
+    ) -> str:
+        self.add_feature_manifest(path, tag, feature, install_script, annotations)
+        return self.ref(path, tag)
+
+    def replace_blob(self, digest: str, content: bytes) -> None:
+        # serves different content under an existing digest
+        self.blobs[digest] = content
+        self.blob_sizes[digest] = len(content)
+
+    def add_streamed_blob(
+        self, generator: Callable[[], Iterator[bytes]], digest: str, size: int
+    ) -> str:
+        self.blobs[digest] = generator
+        self.blob_sizes[digest] = size
+        return digest
+
+    def add_manifest(
+        self,
+        path: str,
+        tag: str,
+        layer_digests: list,
+        annotations: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        manifest: Dict[str, Any] = {
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.oci.image.manifest.v1+json",
+            "config": {
+                "mediaType": "application/vnd.devcontainers",
+                "digest": self.add_blob(b"{}"),
+                "size": 2,
+            },
+            "layers": [
+                {
+                    "mediaType": "application/vnd.devcontainers.layer.v1+tar",
+                    "digest": digest,
+                    "size": self.blob_sizes[digest],
+                    "annotations": {
+                        "org.opencontainers.image.title": f"layer-{idx}.tgz"
+                    },
+                }
+                for idx, digest in enumerate(layer_digests)
+            ],
+        }
+        if annotations is not None:
+            manifest["annotations"] = annotations
+        self.manifests[f"{path}:{tag}"] = manifest
+        self.manifests[f"{path}:{self.manifest_digest(path, tag)}"] = manifest
+        return manifest
+
+    def add_feature_manifest(
+        self,
+        path: str,
+        tag: str,
+        feature: Dict[str, Any],
+        install_script: str = "#!/bin/bash\necho installed\n",
+        annotations: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        # same as add_feature, but usable without a running server
+        layer = self.make_layer(
+            {
+                "./devcontainer-feature.json": json.dumps(feature).encode(),
+                "./install.sh": install_script.encode(),
+            }
+        )
+        return self.add_manifest(
+            path, tag, [self.add_blob(layer)], annotations=annotations
+        )
+
+    def export_layout(self, path: str, tags: List[str], directory: Path) -> None:
+        """
+        Writes the given tags of a repository as an OCI image layout
+        (index.json + blobs/sha256/...) to directory.
+        """
+        descriptors = []
+        for tag in tags:
+            manifest = self.manifests[f"{path}:{tag}"]
+            body = json.dumps(manifest).encode()
+            digest = self.add_blob(body)
+            descriptors.append(
+                {
+                    "mediaType": manifest["mediaType"],
+                    "digest": digest,
+                    "size": len(body),
+                    "annotations": {"org.opencontainers.image.ref.name": tag},
+                }
+            )
+
+        blobs_dir = directory.joinpath("blobs", "sha256")
+        blobs_dir.mkdir(parents=True, exist_ok=True)
+        for digest, content in self.blobs.items():
+            if isinstance(content, bytes):
+                blobs_dir.joinpath(digest.split(":")[1]).write_bytes(content)
+
+        directory.joinpath("oci-layout").write_text(
+            json.dumps({"imageLayoutVersion": "1.0.0"})
+        )
+        directory.joinpath("index.json").write_text(
+            json.dumps({"schemaVersion": 2, "manifests": descriptors})
+        )
+
+    def manifest_digest(self, path: str, tag: str) -> str:
+        body = json.dumps(self.manifests[f"{path}:{tag}"]).encode()
+        return f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+    def _make_handler(self) -> type:
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                path = self.path.split("?")[0]
+                if path == "/token":
+                    self._send_token()
+                    return
+
+                if not path.startswith("/v2/"):
+                    self.send_error(404)
+                    return
+
+                repository, _, reference = path[len("/v2/") :].rpartition("/")
+                repository, _, kind = repository.rpartition("/")
+
+                if registry.require_token and (
+                    self.headers.get("Authorization") != f"Bearer {registry.TOKEN}"
+                ):
+                    registry.requests["unauthorized"] += 1
+                    self.send_response(401)
+                    self.send_header(
+                        "WWW-Authenticate",
+                        f'Bearer realm="http://{registry.registry}/token",'
+                        f'service="{registry.registry.split(":")[0]}",'
+                        f'scope="repository:{repository}:pull"',
+                    )
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                registry.requests[kind] += 1
+
+                if kind == "manifests":
+                    self._send_manifest(repository, reference)
+                elif kind == "blobs":
+                    self._send_blob(reference)
+                else:
+                    self.send_error(404)
+
+            def _send_token(self) -> None:
+                registry.requests["token"] += 1
+                body = json.dumps(
+                    {"token": registry.TOKEN, "expires_in": registry.token_expires_in}
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_manifest(self, repository: str, reference: str) -> None:
+                manifest = registry.manifests.get(f"{repository}:{reference}")
+                if manifest is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(manifest).encode()
+                digest = f"sha256:{hashlib.sha256(body).hexdigest()}"
+                etag = f'"{digest}"'
+                if self.headers.get("If-None-Match") == etag:
+                    registry.requests["manifests_not_modified"] += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", manifest["mediaType"])
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Docker-Content-Digest", digest)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_blob(self, digest: str) -> None:
+                content = registry.blobs.get(digest)
+                if content is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(registry.blob_sizes[digest]))
+                self.end_headers()
+                if isinstance(content, bytes):
+                    self.wfile.write(content)
+                else:
+                    for chunk in content():
+                        self.wfile.write(chunk)
+
+        return Handler
+
+    def __enter__(self) -> "LocalOCIRegistry":
+        self._server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._make_handler()
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        assert self._server is not None
+        self._server.shutdown()
+        self._server.server_close()
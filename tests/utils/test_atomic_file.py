@@ -0,0 +1,39 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from nanolayer.utils.atomic_file import AtomicFile
+
+
+def test_write_replaces_file(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("missing", "dir", "file")
+    AtomicFile.write_text(target, "first")
+    AtomicFile.write_text(target, "second")
+
+    assert target.read_text() == "second"
+    assert os.listdir(target.parent) == ["file"]
+
+
+def test_write_sets_mode_regardless_of_umask(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("file")
+    umask = os.umask(0o077)
+    try:
+        AtomicFile.write_bytes(target, b"content", mode=0o644)
+    finally:
+        os.umask(umask)
+
+    assert target.stat().st_mode & 0o777 == 0o644
+
+
+def test_failed_write_leaves_target_alone(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("file")
+    target.write_text("original")
+
+    with pytest.raises(RuntimeError):
+        with AtomicFile.writer(target) as f:
+            f.write(b"partial")
+            raise RuntimeError()
+
+    assert target.read_text() == "original"
+    assert os.listdir(tmp_path) == ["file"]
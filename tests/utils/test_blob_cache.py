@@ -0,0 +1,64 @@
+import hashlib
+import os
+import pathlib
+
+import pytest
+
+from nanolayer.utils.blob_cache import BlobCache
+
+
+def _put(cache: BlobCache, tmp_path: pathlib.Path, content: bytes) -> str:
+    digest = f"sha256:{hashlib.sha256(content).hexdigest()}"
+    source = tmp_path.joinpath(digest.replace(":", "_"))
+    source.write_bytes(content)
+    cache.put(digest, source)
+    return digest
+
+
+def test_blob_cache_get_verifies_entries(tmp_path: pathlib.Path) -> None:
+    cache = BlobCache(location=tmp_path.joinpath("cache"), max_size=1024)
+    digest = _put(cache, tmp_path, b"some blob")
+
+    entry = cache.get(digest)
+    assert entry is not None
+    assert entry.read_bytes() == b"some blob"
+
+    # a corrupted entry is dropped instead of being served
+    os.remove(entry)
+    entry.write_bytes(b"corrupted")
+    assert cache.get(digest) is None
+    assert not entry.exists()
+
+
+def test_blob_cache_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    cache = BlobCache(location=tmp_path.joinpath("cache"), max_size=250)
+    first = _put(cache, tmp_path, b"a" * 100)
+    second = _put(cache, tmp_path, b"b" * 100)
+
+    # mark the first entry as the most recently used one
+    os.utime(cache._entry_path(second), (1, 1))
+    assert cache.get(first) is not None
+
+    third = _put(cache, tmp_path, b"c" * 100)
+
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+    assert cache.stats().entries == 2
+    assert cache.stats().size == 200
+
+    assert cache.prune(max_size=0) == (2, 200)
+    assert cache.stats().entries == 0
+
+
+def test_blob_cache_is_opt_in(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("NANOLAYER_CACHE_DIR")
+    assert BlobCache.from_settings() is None
+
+    monkeypatch.setenv("NANOLAYER_CACHE_DIR", tmp_path.as_posix())
+    assert BlobCache.from_settings().location == tmp_path
+
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", "false")
+    assert BlobCache.from_settings() is None
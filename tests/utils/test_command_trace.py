@@ -0,0 +1,75 @@
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+from nanolayer.utils.command_trace import CommandTrace
+from nanolayer.utils.invoker import Invoker
+
+
+@pytest.fixture
+def trace_file(tmp_path: Path):
+    trace_file = tmp_path / "trace.jsonl"
+    CommandTrace.reset(enabled=True, trace_file=trace_file)
+    yield trace_file
+    CommandTrace.reset()
+
+
+def test_invoked_commands_are_traced(
+    trace_file: Path, capfd: pytest.CaptureFixture
+) -> None:
+    Invoker.invoke("python3 -c 'bytearray(50 * 1024 * 1024)'", pty=False)
+    Invoker.invoke("sleep 0.2; exit 2", raise_on_failure=False, pty=False)
+    with Invoker.session():
+        Invoker.invoke("true", pty=False)
+
+    allocating, sleeping, in_session = CommandTrace.commands()
+    assert allocating.return_code == 0
+    assert allocating.max_rss is not None and allocating.max_rss > 50 * 1024
+    assert allocating.user_time is not None
+    assert sleeping.return_code == 2 and sleeping.wall_time >= 0.2
+    assert sleeping.ended_at - sleeping.started_at >= 0.2
+    assert in_session.user_time is not None and in_session.max_rss is None
+
+    lines = trace_file.read_text().splitlines()
+    assert [json.loads(line)["command"] for line in lines] == [
+        allocating.command,
+        sleeping.command,
+        "true",
+    ]
+
+
+def test_summary_is_sorted_by_duration(
+    trace_file: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    for command, wall_time in (("fast", 0.1), ("slow", 3.0), ("medium", 1.0)):
+        CommandTrace.record(
+            CommandTrace.Command(
+                command=command,
+                started_at=0.0,
+                ended_at=wall_time,
+                wall_time=wall_time,
+                return_code=0,
+            )
+        )
+
+    with caplog.at_level(logging.WARNING):
+        CommandTrace.log_summary()
+
+    rows = caplog.text.splitlines()
+    assert [
+        row.split()[0] for row in rows if row.split()[0] in ("fast", "slow", "medium")
+    ] == [
+        "slow",
+        "medium",
+        "fast",
+    ]
+    assert "3 commands, 4.10s" in caplog.text
+
+
+def test_nothing_is_recorded_when_disabled(capfd: pytest.CaptureFixture) -> None:
+    CommandTrace.reset()
+    Invoker.invoke("true", pty=False)
+
+    assert CommandTrace.commands() == []
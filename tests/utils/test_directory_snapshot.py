@@ -0,0 +1,113 @@
+import os
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from nanolayer.utils.directory_snapshot import DirectorySnapshot
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import PlanBackend
+
+
+def _make_lists(path: Path) -> None:
+    path.joinpath("partial").mkdir(parents=True)
+    path.joinpath("partial").chmod(0o700)
+    path.joinpath("lock").write_text("")
+    path.joinpath("deb.debian.org_debian_dists_bookworm_InRelease").write_text("old")
+    path.joinpath(
+        "deb.debian.org_debian_dists_bookworm_main_binary-amd64_Packages"
+    ).write_text("Package: bash\n")
+    path.joinpath("current").symlink_to("lock")
+
+
+def _tree(path: Path) -> Dict[str, str]:
+    tree = {}
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            full_path = Path(root, name)
+            key = full_path.relative_to(path).as_posix()
+            if full_path.is_symlink():
+                tree[key] = f"-> {os.readlink(full_path)}"
+            elif full_path.is_dir():
+                tree[key] = oct(full_path.stat().st_mode)
+            else:
+                tree[key] = full_path.read_text()
+    return tree
+
+
+def _update(path: Path) -> None:
+    # the way apt-get update replaces its indexes
+    new_release = path.joinpath(
+        "partial", "deb.debian.org_debian_dists_bookworm_InRelease"
+    )
+    new_release.write_text("new")
+    new_release.rename(path.joinpath("deb.debian.org_debian_dists_bookworm_InRelease"))
+    path.joinpath("ppa.launchpadcontent.net_InRelease").write_text("ppa")
+    path.joinpath(
+        "deb.debian.org_debian_dists_bookworm_main_binary-amd64_Packages"
+    ).unlink()
+
+
+def test_restores_with_hardlinks(tmp_path: Path) -> None:
+    lists = tmp_path / "lists"
+    _make_lists(lists)
+    before = _tree(lists)
+
+    with DirectorySnapshot.preserved(lists) as snapshot:
+        _update(lists)
+        assert _tree(lists) != before
+
+    assert _tree(lists) == before
+    assert (snapshot.linked_files, snapshot.copied_files) == (3, 0)
+    assert [path.name for path in tmp_path.iterdir()] == ["lists"]
+
+
+def test_falls_back_to_copying(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def _cross_device_link(*args, **kwargs) -> None:
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", _cross_device_link)
+    lists = tmp_path / "lists"
+    _make_lists(lists)
+    before = _tree(lists)
+
+    with DirectorySnapshot.preserved(lists) as snapshot:
+        _update(lists)
+
+    assert _tree(lists) == before
+    assert (snapshot.linked_files, snapshot.copied_files) == (0, 3)
+
+
+def test_removes_directory_created_meanwhile(tmp_path: Path) -> None:
+    lists = tmp_path / "lists"
+
+    with DirectorySnapshot.preserved(lists):
+        _make_lists(lists)
+
+    assert not lists.exists()
+
+
+def test_restores_after_failure(tmp_path: Path) -> None:
+    lists = tmp_path / "lists"
+    _make_lists(lists)
+    before = _tree(lists)
+
+    with pytest.raises(RuntimeError):
+        with DirectorySnapshot.preserved(lists):
+            _update(lists)
+            raise RuntimeError("apt-get install failed")
+
+    assert _tree(lists) == before
+
+
+def test_nothing_is_taken_when_commands_are_not_run(tmp_path: Path) -> None:
+    lists = tmp_path / "lists"
+    _make_lists(lists)
+    inode = lists.stat().st_ino
+
+    with Invoker.use_backend(PlanBackend()):
+        with DirectorySnapshot.preserved(lists) as snapshot:
+            assert snapshot.snapshot_path is None
+            assert [path.name for path in tmp_path.iterdir()] == ["lists"]
+
+    assert lists.stat().st_ino == inode
@@ -0,0 +1,40 @@
+import pathlib
+
+import pytest
+
+from nanolayer.utils.env_snapshot import EnvSnapshot
+
+
+def test_env_snapshot_captures_rc_files(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("HOME", tmp_path.as_posix())
+    bashrc = tmp_path.joinpath(".bashrc")
+    bashrc.write_text("export FROM_BASHRC=1\n")
+
+    snapshot = EnvSnapshot(watched_paths=[bashrc])
+    env = snapshot.get()
+
+    assert env["FROM_BASHRC"] == "1"
+    assert "SHLVL" not in env
+
+
+def test_env_snapshot_is_taken_again_when_watched_files_change(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    captures = []
+
+    def _capture() -> dict:
+        captures.append(1)
+        return {"CAPTURE": str(len(captures))}
+
+    monkeypatch.setattr(EnvSnapshot, "capture", staticmethod(_capture))
+    profile_dir = tmp_path.joinpath("profile.d")
+    profile_dir.mkdir()
+
+    snapshot = EnvSnapshot.for_profile_dir(profile_dir)
+    assert snapshot.get() == {"CAPTURE": "1"}
+    assert snapshot.get() == {"CAPTURE": "1"}
+
+    profile_dir.joinpath("nanolayer-features.sh").write_text("export A=1")
+    assert snapshot.get() == {"CAPTURE": "2"}
@@ -0,0 +1,95 @@
+import gzip
+import http.server
+import json
+import threading
+import urllib.error
+from collections import Counter
+from typing import Any, Iterator
+
+import pytest
+
+from nanolayer.utils.http_client import HttpClient
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections: Counter = Counter()
+    failures_left = 0
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        _Handler.connections["opened"] += 1
+
+    def _send(self, status: int, body: bytes, **headers: str) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/json":
+            body = json.dumps({"user_agent": self.headers["User-Agent"]}).encode()
+            if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                self._send(200, gzip.compress(body), Content_Encoding="gzip")
+            else:
+                self._send(200, body)
+        elif self.path == "/redirect":
+            self._send(302, b"", Location="/json")
+        elif self.path == "/flaky":
+            if _Handler.failures_left > 0:
+                _Handler.failures_left -= 1
+                self._send(503, b"try again")
+            else:
+                self._send(200, b"ok")
+        else:
+            self._send(404, b"not found")
+
+
+@pytest.fixture
+def server_url() -> Iterator[str]:
+    _Handler.connections = Counter()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    HttpClient.close_connections()
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_client_reuses_connections(server_url: str) -> None:
+    for _ in range(5):
+        assert HttpClient.get_json(f"{server_url}/json") == {
+            "user_agent": HttpClient.USER_AGENT
+        }
+    assert _Handler.connections["opened"] == 1
+
+
+def test_http_client_follows_redirects(server_url: str) -> None:
+    with HttpClient.request(f"{server_url}/redirect") as response:
+        assert json.loads(response.read())["user_agent"] == HttpClient.USER_AGENT
+
+
+def test_http_client_retries_and_raises_http_errors(
+    server_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(HttpClient, "RETRY_BACKOFF", 0)
+
+    _Handler.failures_left = 2
+    with HttpClient.request(f"{server_url}/flaky") as response:
+        assert response.read() == b"ok"
+
+    _Handler.failures_left = 2
+    with pytest.raises(urllib.error.HTTPError) as e:
+        HttpClient.request(f"{server_url}/flaky", retries=1)
+    assert e.value.code == 503
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        HttpClient.request(f"{server_url}/missing")
+    assert e.value.code == 404
+    assert e.value.read() == b"not found"
@@ -0,0 +1,167 @@
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from nanolayer.utils.invoker import Invoker
+from nanolayer.utils.invoker_backends import (
+    OutputTail,
+    RecordingBackend,
+    ReplayBackend,
+    ReplayMismatch,
+    ShellSessionBackend,
+    SubprocessBackend,
+)
+
+
+def test_output_tail_keeps_last_bytes() -> None:
+    tail = OutputTail(max_size=8)
+    tail.write(b"0123")
+    tail.write(b"456789")
+    assert tail.getvalue() == "23456789"
+    tail.write(b"x" * 100)
+    assert tail.getvalue() == "x" * 8
+
+
+def test_subprocess_backend_streams_output(capfd: pytest.CaptureFixture) -> None:
+    result = SubprocessBackend(tail_size=1024).run(
+        'echo "out $GREETING"; echo err >&2; exit 3', envs={"GREETING": "hello"}
+    )
+
+    assert result.return_code == 3
+    assert "out hello" in result.output_tail and "err" in result.output_tail
+    captured = capfd.readouterr()
+    assert "out hello" in captured.out
+    assert "err" in captured.err
+
+
+def test_subprocess_backend_retains_bounded_output(
+    capfd: pytest.CaptureFixture,
+) -> None:
+    tracemalloc.start()
+    # 20MB of output
+    result = SubprocessBackend(tail_size=4096).run(
+        "head -c 20000000 /dev/zero | tr '\\0' 'x'; echo; echo done", envs={}
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    capfd.readouterr()
+
+    assert result.return_code == 0
+    assert len(result.output_tail) == 4096
+    assert result.output_tail.endswith("done\n")
+    assert peak < 2 * 1024 * 1024
+
+
+def test_subprocess_backend_does_not_wait_for_background_processes(
+    capfd: pytest.CaptureFixture,
+) -> None:
+    # the sleep inherits the output pipes, and keeps them open
+    start = time.monotonic()
+    result = SubprocessBackend(tail_size=1024).run(
+        "sleep 30 & echo started; exit 2", envs={}
+    )
+    capfd.readouterr()
+
+    assert time.monotonic() - start < 10
+    assert result.return_code == 2
+    assert result.output_tail == "started\n"
+
+
+def test_invoker_error_carries_output_tail(capfd: pytest.CaptureFixture) -> None:
+    with pytest.raises(Invoker.InvokerException) as exception_info:
+        Invoker.invoke("echo something went wrong; exit 1", pty=False)
+
+    assert "something went wrong" in str(exception_info.value)
+
+
+def test_shell_session_reports_each_command(capfd: pytest.CaptureFixture) -> None:
+    session = ShellSessionBackend(tail_size=1024)
+    try:
+        first = session.run("echo first; exit 3", envs={})
+        # no trailing newline, and a syntax error, don't break the session
+        second = session.run("printf 'no newline'; echo err >&2", envs={})
+        third = session.run("if then", envs={})
+        fourth = session.run('echo "$GREETING"; cat', envs={"GREETING": "hello"})
+        fifth = session.run('echo "[$GREETING]"', envs={})
+    finally:
+        session.close()
+
+    assert (first.return_code, first.output_tail) == (3, "first\n")
+    assert second.return_code == 0
+    assert second.output_tail == "no newlineerr\n"
+    assert third.return_code != 0
+    # commands don't read the session's stdin, nor leak envs to the next one
+    assert (fourth.return_code, fourth.output_tail) == (0, "hello\n")
+    assert fifth.output_tail == "[]\n"
+
+    captured = capfd.readouterr()
+    assert "__nanolayer_" not in captured.out + captured.err
+    assert "no newline" in captured.out and "err" in captured.err
+
+
+def test_invoker_session_runs_commands_in_one_shell(
+    tmp_path: Path, capfd: pytest.CaptureFixture
+) -> None:
+    shell_pids = tmp_path / "shell_pids"
+    with Invoker.session():
+        Invoker.invoke(f"echo $$ >> {shell_pids}", pty=False)
+        Invoker.invoke(f"echo $$ >> {shell_pids}", pty=False)
+        with pytest.raises(Invoker.InvokerException) as exception_info:
+            Invoker.invoke("echo session failure; exit 4", pty=False)
+        assert Invoker.invoke("exit 5", raise_on_failure=False, pty=False) == 5
+
+    Invoker.invoke(f"echo $$ >> {shell_pids}", pty=False)
+
+    first, second, outside = shell_pids.read_text().split()
+    assert first == second != outside
+    assert "Return Code: 4" in str(exception_info.value)
+    assert "session failure" in str(exception_info.value)
+
+
+def test_record_then_replay(tmp_path: Path, capfd: pytest.CaptureFixture) -> None:
+    fixture_file = tmp_path / "fixture.jsonl"
+    recording = RecordingBackend(SubprocessBackend(tail_size=1024), fixture_file)
+    with Invoker.use_backend(recording), tempfile.TemporaryDirectory() as tempdir:
+        Invoker.invoke(f"ls {tempdir}")
+        Invoker.invoke("echo not found; exit 2", raise_on_failure=False)
+
+    replay = ReplayBackend(fixture_file)
+    with Invoker.use_backend(replay), tempfile.TemporaryDirectory() as tempdir:
+        # a different temporary directory is still the same command
+        assert Invoker.invoke(f"ls {tempdir}") == 0
+        with pytest.raises(Invoker.InvokerException) as exception_info:
+            Invoker.invoke("echo not found; exit 2")
+        replay.assert_replayed()
+        assert "not found" in str(exception_info.value)
+
+        with pytest.raises(ReplayMismatch):
+            Invoker.invoke("echo one more")
+
+
+def test_replay_mismatch_sticks(tmp_path: Path, capfd: pytest.CaptureFixture) -> None:
+    fixture_file = tmp_path / "fixture.jsonl"
+    fixture_file.write_text(
+        '{"command": "apt-get update -y", "return_code": 0}\n'
+        '{"command": "apt-get clean", "return_code": 0}\n'
+    )
+
+    with Invoker.use_backend(ReplayBackend(fixture_file)) as replay:
+        with pytest.raises(ReplayMismatch) as exception_info:
+            Invoker.invoke("apt update -y")
+        # cleanup commands don't hide the first mismatch
+        with pytest.raises(ReplayMismatch) as cleanup_exception_info:
+            Invoker.invoke("apt-get clean")
+
+    assert cleanup_exception_info.value is exception_info.value
+    assert "command #1 is 'apt update -y'" in str(exception_info.value)
+
+
+def test_plan_prints_commands(capfd: pytest.CaptureFixture) -> None:
+    with Invoker.use_backend(Invoker.mode_backend("plan")) as plan:
+        assert Invoker.invoke("rm -rf /") == 0
+
+    assert plan.commands == ["rm -rf /"]
+    assert capfd.readouterr().out == "rm -rf /\n"
@@ -0,0 +1,75 @@
+import json
+import pathlib
+
+import pytest
+from local_registry import LocalOCIRegistry
+
+from nanolayer.utils.oci_layout import OCILayout
+from nanolayer.utils.oci_registry import OCIRegistry
+
+FEATURE_PATH = "devcontainers-contrib/features/local"
+TEST_FEATURE = {"id": "local", "version": "1.0.0"}
+
+
+@pytest.fixture
+def layout_dir(tmp_path: pathlib.Path) -> pathlib.Path:
+    registry = LocalOCIRegistry()
+    registry.add_feature_manifest(FEATURE_PATH, "1.0.0", TEST_FEATURE)
+    registry.add_feature_manifest(FEATURE_PATH, "2.0.0", {"id": "local"})
+    registry.export_layout(FEATURE_PATH, ["1.0.0", "2.0.0"], tmp_path.joinpath("l"))
+    return tmp_path.joinpath("l")
+
+
+@pytest.mark.parametrize(
+    "oci_input,layout_dir,reference",
+    [
+        ("oci-layout:///tmp/layout:1.0.0", "/tmp/layout", "1.0.0"),
+        ("oci-layout:///tmp/layout", "/tmp/layout", "latest"),
+        ("oci-layout://relative/dir:2", "relative/dir", "2"),
+        ("oci-layout:///tmp/layout@sha256:abc", "/tmp/layout", "sha256:abc"),
+    ],
+)
+def test_oci_layout_parse(oci_input: str, layout_dir: str, reference: str) -> None:
+    assert OCILayout.parse(oci_input) == (pathlib.Path(layout_dir), reference)
+
+
+def test_oci_layout_serves_manifest_and_layer(
+    layout_dir: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    oci_input = f"oci-layout://{layout_dir}:1.0.0"
+
+    manifest = OCIRegistry.get_manifest(oci_input)
+    digest = OCIRegistry.get_manifest_digest(oci_input)
+    assert OCIRegistry.get_manifest(f"oci-layout://{layout_dir}@{digest}") == manifest
+
+    OCIRegistry.download_and_extract_layer(oci_input, tmp_path.joinpath("out"), 0)
+    extracted_feature = tmp_path.joinpath("out", "devcontainer-feature.json")
+    assert json.loads(extracted_feature.read_text()) == TEST_FEATURE
+
+    member = OCIRegistry.read_layer_member(oci_input, 0, "devcontainer-feature.json")
+    assert member is not None and json.loads(member) == TEST_FEATURE
+
+    layer_digest = manifest["layers"][0]["digest"]
+    OCIRegistry.download_blob(oci_input, layer_digest, tmp_path.joinpath("blob"))
+    assert tmp_path.joinpath("blob").read_bytes() == (
+        layout_dir.joinpath("blobs", "sha256", layer_digest.split(":")[1]).read_bytes()
+    )
+
+
+def test_oci_layout_rejects_corrupted_blob(
+    layout_dir: pathlib.Path, tmp_path: pathlib.Path
+) -> None:
+    oci_input = f"oci-layout://{layout_dir}:1.0.0"
+    layer_digest = OCIRegistry.get_manifest(oci_input)["layers"][0]["digest"]
+    layout_dir.joinpath("blobs", "sha256", layer_digest.split(":")[1]).write_bytes(
+        b"tampered"
+    )
+
+    with pytest.raises(OCIRegistry.HashException):
+        OCIRegistry.download_blob(oci_input, layer_digest, tmp_path.joinpath("blob"))
+    assert not tmp_path.joinpath("blob").exists()
+
+
+def test_oci_layout_unknown_tag(layout_dir: pathlib.Path) -> None:
+    with pytest.raises(OCILayout.OCILayoutError):
+        OCIRegistry.get_manifest(f"oci-layout://{layout_dir}:3.0.0")
@@ -1,7 +1,12 @@
+import hashlib
+import io
 import pathlib
+import tarfile
 
 import pytest
+from local_registry import LocalOCIRegistry
 
+from nanolayer.utils.blob_cache import BlobCache
 from nanolayer.utils.oci_registry import OCIRegistry
 
 TEST_OCI_OBJECT = "ghcr.io/devcontainers-contrib/features/bash-command:1.0.0"
@@ -46,3 +51,236 @@ def test_oci_registry_download_and_extract_layer(
     )
     assert output_location.exists()
     assert len(list(output_location.iterdir())) == 2
+
+
+def test_oci_registry_download_blob_verifies_digest(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", "false")
+    with LocalOCIRegistry() as registry:
+        digest = registry.add_blob(b"feature layer content")
+        oci_ref = registry.ref("devcontainers-contrib/features/local", "1.0.0")
+
+        output_file = tmp_path.joinpath("blob")
+        OCIRegistry.download_blob(
+            oci_input=oci_ref, digest=digest, output_file=output_file
+        )
+        assert output_file.read_bytes() == b"feature layer content"
+        assert OCIRegistry.get_blob(oci_ref, digest) == b"feature layer content"
+
+        # serve wrong content under the same digest
+        registry.replace_blob(digest, b"tampered layer content")
+        bad_output_file = tmp_path.joinpath("bad_blob")
+        with pytest.raises(OCIRegistry.HashException):
+            OCIRegistry.download_blob(
+                oci_input=oci_ref, digest=digest, output_file=bad_output_file
+            )
+        assert not bad_output_file.exists()
+        assert list(tmp_path.iterdir()) == [output_file]
+
+
+def test_oci_registry_download_blob_uses_cache(tmp_path: pathlib.Path) -> None:
+    with LocalOCIRegistry() as registry:
+        digest = registry.add_blob(b"cached feature layer content")
+        oci_ref = registry.ref("devcontainers-contrib/features/local", "1.0.0")
+
+        for attempt in range(3):
+            output_file = tmp_path.joinpath(f"blob_{attempt}")
+            OCIRegistry.download_blob(
+                oci_input=oci_ref, digest=digest, output_file=output_file
+            )
+            assert output_file.read_bytes() == b"cached feature layer content"
+
+        assert registry.requests["blobs"] == 1
+
+
+def test_oci_registry_get_manifest_revalidates_cached_tags() -> None:
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"layer")])
+        oci_ref = registry.ref(path, "1.0.0")
+
+        manifest = OCIRegistry.get_manifest(oci_ref)
+        assert OCIRegistry.get_manifest(oci_ref) == manifest
+        assert OCIRegistry.get_manifest_digest(oci_ref) == registry.manifest_digest(
+            path, "1.0.0"
+        )
+
+        assert registry.requests["manifests"] == 3
+        assert registry.requests["manifests_not_modified"] == 2
+
+        # a moved tag is picked up on revalidation
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"new layer")])
+        assert OCIRegistry.get_manifest(oci_ref) != manifest
+
+
+def test_oci_registry_get_manifest_serves_digest_refs_from_cache() -> None:
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"layer")])
+        digest = registry.manifest_digest(path, "1.0.0")
+        oci_ref = f"{registry.registry}/{path}@{digest}"
+
+        manifest = OCIRegistry.get_manifest(oci_ref)
+        for _ in range(3):
+            assert OCIRegistry.get_manifest(oci_ref) == manifest
+            assert OCIRegistry.get_manifest_digest(oci_ref) == digest
+
+        assert registry.requests["manifests"] == 1
+
+
+def test_oci_registry_writes_no_cache_by_default(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("NANOLAYER_CACHE_DIR")
+    monkeypatch.setenv("NANOLAYER_PERSIST_REGISTRY_TOKENS", "true")
+    monkeypatch.setenv("HOME", tmp_path.as_posix())
+    monkeypatch.setenv("XDG_CACHE_HOME", tmp_path.joinpath(".cache").as_posix())
+    monkeypatch.setattr(OCIRegistry, "_token_cache", None)
+    with LocalOCIRegistry(require_token=True) as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"layer")])
+        oci_ref = registry.ref(path, "1.0.0")
+
+        OCIRegistry.get_manifest(oci_ref)
+        OCIRegistry.get_manifest(oci_ref)
+        OCIRegistry.download_layer(oci_ref, 0, tmp_path.joinpath("layer.tgz"))
+
+        assert registry.requests["manifests_not_modified"] == 0
+    assert OCIRegistry.token_cache().persist_location is None
+    # nothing but the downloaded layer, in particular no ~/.cache/nanolayer
+    assert [path.name for path in tmp_path.iterdir()] == ["layer.tgz"]
+
+
+def test_oci_registry_reuses_registry_tokens(tmp_path: pathlib.Path) -> None:
+    with LocalOCIRegistry(require_token=True) as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"layer")])
+        oci_ref = registry.ref(path, "1.0.0")
+        fetches_avoided = OCIRegistry.token_cache().stats.fetches_avoided
+
+        OCIRegistry.get_manifest(oci_ref)
+        OCIRegistry.download_layer(oci_ref, 0, tmp_path.joinpath("layer.tgz"))
+        OCIRegistry.get_manifest(oci_ref)
+
+        # only the very first request goes out anonymously
+        assert registry.requests["unauthorized"] == 1
+        assert registry.requests["token"] == 1
+        assert OCIRegistry.token_cache().stats.fetches_avoided - fetches_avoided == 3
+
+
+def test_oci_registry_refetches_expired_registry_tokens() -> None:
+    # tokens living less than the expiry margin are never reused
+    with LocalOCIRegistry(require_token=True, token_expires_in=1) as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(b"layer")])
+        oci_ref = registry.ref(path, "1.0.0")
+
+        OCIRegistry.get_manifest(oci_ref)
+        OCIRegistry.get_manifest(oci_ref)
+
+        assert registry.requests["unauthorized"] == 1
+        assert registry.requests["token"] == 2
+
+
+@pytest.mark.parametrize("enable_cache", ["true", "false"])
+def test_oci_registry_download_and_extract_layer_streams_layer(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, enable_cache: str
+) -> None:
+    monkeypatch.setenv("NANOLAYER_ENABLE_CACHE", enable_cache)
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        files = {"./install.sh": b"echo hi", "./devcontainer-feature.json": b"{}"}
+        registry.add_manifest(
+            path, "1.0.0", [registry.add_blob(LocalOCIRegistry.make_layer(files))]
+        )
+        oci_ref = registry.ref(path, "1.0.0")
+
+        for attempt in range(2):
+            output_dir = tmp_path.joinpath(f"extracted_{attempt}")
+            OCIRegistry.download_and_extract_layer(
+                oci_input=oci_ref, output_dir=output_dir, layer_num=0
+            )
+            assert output_dir.joinpath("install.sh").read_bytes() == b"echo hi"
+            assert len(list(output_dir.iterdir())) == 2
+
+        assert registry.requests["blobs"] == (1 if enable_cache == "true" else 2)
+
+
+def test_oci_registry_download_and_extract_layer_discards_bad_layer(
+    tmp_path: pathlib.Path,
+) -> None:
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        digest = registry.add_blob(
+            LocalOCIRegistry.make_layer({"./install.sh": b"echo hi"})
+        )
+        registry.add_manifest(path, "1.0.0", [digest])
+        registry.replace_blob(
+            digest, LocalOCIRegistry.make_layer({"./install.sh": b"echo pwned"})
+        )
+
+        output_dir = tmp_path.joinpath("extracted")
+        with pytest.raises(OCIRegistry.HashException):
+            OCIRegistry.download_and_extract_layer(
+                oci_input=registry.ref(path, "1.0.0"),
+                output_dir=output_dir,
+                layer_num=0,
+            )
+        assert list(output_dir.iterdir()) == []
+        assert BlobCache.from_settings().get(digest) is None
+
+
+def test_oci_registry_download_and_extract_layer_verifies_other_algorithms(
+    tmp_path: pathlib.Path,
+) -> None:
+    layer = LocalOCIRegistry.make_layer({"./install.sh": b"echo hi"})
+    digest = f"sha512:{hashlib.sha512(layer).hexdigest()}"
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_streamed_blob(lambda: iter([layer]), digest, len(layer))
+        registry.add_manifest(path, "1.0.0", [digest])
+
+        output_dir = tmp_path.joinpath("extracted")
+        OCIRegistry.download_and_extract_layer(
+            oci_input=registry.ref(path, "1.0.0"), output_dir=output_dir, layer_num=0
+        )
+        assert output_dir.joinpath("install.sh").read_bytes() == b"echo hi"
+
+
+@pytest.mark.parametrize("stream", [True, False])
+@pytest.mark.parametrize(
+    "member_type, name, linkname",
+    [
+        (tarfile.REGTYPE, "../escape", ""),
+        (tarfile.REGTYPE, "/escape", ""),
+        (tarfile.SYMTYPE, "./escape", "../escape"),
+        (tarfile.LNKTYPE, "./escape", "../escape"),
+        (tarfile.CHRTYPE, "./escape", ""),
+    ],
+)
+def test_oci_registry_download_and_extract_layer_rejects_escaping_members(
+    tmp_path: pathlib.Path, stream: bool, member_type: bytes, name: str, linkname: str
+) -> None:
+    layer = io.BytesIO()
+    with tarfile.open(fileobj=layer, mode="w:gz") as tar:
+        tar.addfile(tarfile.TarInfo("./install.sh"), io.BytesIO(b""))
+        member = tarfile.TarInfo(name)
+        member.type = member_type
+        member.linkname = linkname
+        tar.addfile(member, io.BytesIO(b""))
+
+    with LocalOCIRegistry() as registry:
+        path = "devcontainers-contrib/features/local"
+        registry.add_manifest(path, "1.0.0", [registry.add_blob(layer.getvalue())])
+
+        output_dir = tmp_path.joinpath("layers", "extracted")
+        with pytest.raises(OCIRegistry.UnsafeLayerException):
+            OCIRegistry.download_and_extract_layer(
+                oci_input=registry.ref(path, "1.0.0"),
+                output_dir=output_dir,
+                layer_num=0,
+                stream=stream,
+            )
+        assert list(output_dir.iterdir()) == []
+        assert not tmp_path.joinpath("layers", "escape").exists()
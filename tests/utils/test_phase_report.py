@@ -0,0 +1,31 @@
+import json
+import pathlib
+import subprocess
+
+from nanolayer.utils.phase_report import PhaseReport
+
+
+def test_phase_report_records_phases(tmp_path: pathlib.Path) -> None:
+    PhaseReport.reset()
+
+    with PhaseReport.feature("ghcr.io/devcontainers/features/node:1"):
+        with PhaseReport.phase("install_script"):
+            subprocess.run(["python3", "-c", "sum(range(3_000_000))"], check=True)
+    PhaseReport.record("blob_download", wall_time=1.5, bytes_transferred=1024)
+
+    report = PhaseReport.report()
+    assert [phase.name for phase in report.phases] == [
+        "install_script",
+        "blob_download",
+    ]
+    install_script = report.phases[0]
+    assert install_script.feature == "ghcr.io/devcontainers/features/node:1"
+    assert install_script.children_user_time + install_script.children_system_time > 0
+    assert report.phases[1].feature is None
+
+    summary = PhaseReport.summary()
+    assert "install_script" in summary and "1024" in summary
+
+    PhaseReport.write_json(tmp_path.joinpath("report.json"))
+    content = json.loads(tmp_path.joinpath("report.json").read_text())
+    assert content["phases"][1]["bytes_transferred"] == 1024